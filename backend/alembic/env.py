@@ -0,0 +1,59 @@
+from logging.config import fileConfig
+
+from alembic import context
+from sqlalchemy import engine_from_config, pool
+
+from app.database import SYNC_DATABASE_URL, Base
+from app.models import appointment, appointment_rollup, doctor, notification, patient, scheduler, sequence, specialization, stat_counter, user  # noqa: F401  (register tables)
+
+config = context.config
+
+# Migrations run from the app at startup pass in a connection; don't reset its logging then
+connection = config.attributes.get("connection")
+if connection is None and config.config_file_name is not None:
+    fileConfig(config.config_file_name)
+
+if not config.get_main_option("sqlalchemy.url"):
+    config.set_main_option("sqlalchemy.url", SYNC_DATABASE_URL)
+
+target_metadata = Base.metadata
+
+
+def run_migrations_offline() -> None:
+    context.configure(
+        url=config.get_main_option("sqlalchemy.url"),
+        target_metadata=target_metadata,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+        render_as_batch=True,
+    )
+
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_with_connection(conn) -> None:
+    context.configure(connection=conn, target_metadata=target_metadata, render_as_batch=True)
+
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online() -> None:
+    if connection is not None:
+        run_migrations_with_connection(connection)
+        return
+
+    connectable = engine_from_config(
+        config.get_section(config.config_ini_section, {}),
+        prefix="sqlalchemy.",
+        poolclass=pool.NullPool,
+    )
+    with connectable.connect() as conn:
+        run_migrations_with_connection(conn)
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
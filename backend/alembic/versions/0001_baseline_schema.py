@@ -0,0 +1,131 @@
+"""baseline schema
+
+The four tables as they stood when the app still used Base.metadata.create_all.
+Databases created that way are stamped at this revision on first startup.
+
+Revision ID: 0001
+Revises: 
+Create Date: 2026-10-17 06:10:46.976406
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0001'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('users',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('email', sa.String(), nullable=False),
+    sa.Column('username', sa.String(), nullable=False),
+    sa.Column('hashed_password', sa.String(), nullable=False),
+    sa.Column('full_name', sa.String(), nullable=False),
+    sa.Column('role', sa.Enum('ADMIN', 'DOCTOR', 'PATIENT', 'NURSE', 'RECEPTIONIST', name='userrole'), nullable=False),
+    sa.Column('is_active', sa.Boolean(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_users_email'), ['email'], unique=True)
+        batch_op.create_index(batch_op.f('ix_users_id'), ['id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_users_username'), ['username'], unique=True)
+
+    op.create_table('doctors',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.Column('doctor_id', sa.String(), nullable=True),
+    sa.Column('specialization', sa.String(), nullable=False),
+    sa.Column('qualification', sa.String(), nullable=False),
+    sa.Column('experience_years', sa.Integer(), nullable=True),
+    sa.Column('license_number', sa.String(), nullable=True),
+    sa.Column('phone', sa.String(), nullable=False),
+    sa.Column('consultation_fee', sa.Float(), nullable=True),
+    sa.Column('about', sa.Text(), nullable=True),
+    sa.Column('available_days', sa.String(), nullable=True),
+    sa.Column('available_time_start', sa.String(), nullable=True),
+    sa.Column('available_time_end', sa.String(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('license_number'),
+    sa.UniqueConstraint('user_id')
+    )
+    with op.batch_alter_table('doctors', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_doctors_doctor_id'), ['doctor_id'], unique=True)
+        batch_op.create_index(batch_op.f('ix_doctors_id'), ['id'], unique=False)
+
+    op.create_table('patients',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.Column('patient_id', sa.String(), nullable=True),
+    sa.Column('date_of_birth', sa.Date(), nullable=False),
+    sa.Column('gender', sa.Enum('MALE', 'FEMALE', 'OTHER', name='gender'), nullable=False),
+    sa.Column('blood_group', sa.Enum('A_POSITIVE', 'A_NEGATIVE', 'B_POSITIVE', 'B_NEGATIVE', 'AB_POSITIVE', 'AB_NEGATIVE', 'O_POSITIVE', 'O_NEGATIVE', name='bloodgroup'), nullable=True),
+    sa.Column('phone', sa.String(), nullable=False),
+    sa.Column('address', sa.Text(), nullable=True),
+    sa.Column('emergency_contact', sa.String(), nullable=True),
+    sa.Column('emergency_contact_name', sa.String(), nullable=True),
+    sa.Column('medical_history', sa.Text(), nullable=True),
+    sa.Column('allergies', sa.Text(), nullable=True),
+    sa.Column('current_medications', sa.Text(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('user_id')
+    )
+    with op.batch_alter_table('patients', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_patients_id'), ['id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_patients_patient_id'), ['patient_id'], unique=True)
+
+    op.create_table('appointments',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('appointment_number', sa.String(), nullable=True),
+    sa.Column('patient_id', sa.Integer(), nullable=True),
+    sa.Column('doctor_id', sa.Integer(), nullable=True),
+    sa.Column('appointment_date', sa.DateTime(), nullable=False),
+    sa.Column('status', sa.Enum('PENDING', 'CONFIRMED', 'COMPLETED', 'CANCELLED', 'NO_SHOW', name='appointmentstatus'), nullable=True),
+    sa.Column('reason', sa.Text(), nullable=True),
+    sa.Column('notes', sa.Text(), nullable=True),
+    sa.Column('prescription', sa.Text(), nullable=True),
+    sa.Column('diagnosis', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['doctor_id'], ['doctors.id'], ),
+    sa.ForeignKeyConstraint(['patient_id'], ['patients.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('appointments', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_appointments_appointment_number'), ['appointment_number'], unique=True)
+        batch_op.create_index(batch_op.f('ix_appointments_id'), ['id'], unique=False)
+
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('appointments', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_appointments_id'))
+        batch_op.drop_index(batch_op.f('ix_appointments_appointment_number'))
+
+    op.drop_table('appointments')
+    with op.batch_alter_table('patients', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_patients_patient_id'))
+        batch_op.drop_index(batch_op.f('ix_patients_id'))
+
+    op.drop_table('patients')
+    with op.batch_alter_table('doctors', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_doctors_id'))
+        batch_op.drop_index(batch_op.f('ix_doctors_doctor_id'))
+
+    op.drop_table('doctors')
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_users_username'))
+        batch_op.drop_index(batch_op.f('ix_users_id'))
+        batch_op.drop_index(batch_op.f('ix_users_email'))
+
+    op.drop_table('users')
@@ -0,0 +1,36 @@
+"""add id_counters
+
+Backs block allocation of APT-/PAT-/DOC- numbers on databases without native
+sequences (see app.utils.sequences).
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 06:12:03.118240
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0002'
+down_revision: Union[str, None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Databases created by create_all after the allocator landed already have it
+    if sa.inspect(op.get_bind()).has_table('id_counters'):
+        return
+    op.create_table('id_counters',
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('next_value', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('id_counters')
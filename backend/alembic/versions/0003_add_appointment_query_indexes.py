@@ -0,0 +1,48 @@
+"""add appointment query indexes
+
+Composite indexes matching how the appointment endpoints filter and sort:
+
+* doctor views, conflict checks and free slots: doctor_id = ? ORDER BY appointment_date
+* patient views: patient_id = ? [AND status = ?] ORDER BY appointment_date
+* admin views filtered by status: status = ? ORDER BY appointment_date
+* admin views unfiltered: ORDER BY appointment_date
+
+All list endpoints sort appointment_date DESC; ascending b-tree indexes are
+walked backwards for that on both SQLite and PostgreSQL. patients.user_id and
+doctors.user_id already have the index behind their unique constraints.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17 06:14:37.502114
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0003'
+down_revision: Union[str, None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = [
+    ('ix_appointments_doctor_id_appointment_date', ['doctor_id', 'appointment_date']),
+    ('ix_appointments_patient_id_status_appointment_date', ['patient_id', 'status', 'appointment_date']),
+    ('ix_appointments_status_appointment_date', ['status', 'appointment_date']),
+    ('ix_appointments_appointment_date', ['appointment_date']),
+]
+
+
+def upgrade() -> None:
+    existing = {index['name'] for index in sa.inspect(op.get_bind()).get_indexes('appointments')}
+    for name, columns in INDEXES:
+        if name not in existing:
+            op.create_index(name, 'appointments', columns, unique=False)
+
+
+def downgrade() -> None:
+    for name, _ in reversed(INDEXES):
+        op.drop_index(name, table_name='appointments')
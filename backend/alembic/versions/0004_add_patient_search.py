@@ -0,0 +1,57 @@
+"""add patient_search
+
+Full-text index behind GET /api/patients/search (see app.utils.patient_search):
+an FTS5 table on SQLite, weighted tsvectors with a GIN index on PostgreSQL.
+Existing patients are indexed here; `python -m app.cli rebuild-search-index`
+does the same later on.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17 09:02:51.640318
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0004'
+down_revision: Union[str, None] = '0003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    from app.utils.patient_search import rebuild_patient_search
+
+    bind = op.get_bind()
+    if bind.dialect.name == 'sqlite':
+        # prefix= keeps the prefix queries the search endpoint issues on the index
+        op.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS patient_search USING fts5("
+            "full_name, patient_number, phone, allergies, medical_history, "
+            "tokenize = 'unicode61', prefix = '2 3 4')"
+        )
+    elif bind.dialect.name == 'postgresql':
+        op.create_table('patient_search',
+        sa.Column('patient_id', sa.Integer(), nullable=False),
+        sa.Column('document', postgresql.TSVECTOR(), nullable=False),
+        sa.ForeignKeyConstraint(['patient_id'], ['patients.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('patient_id')
+        )
+        op.create_index('ix_patient_search_document', 'patient_search', ['document'], postgresql_using='gin')
+    else:
+        return
+    rebuild_patient_search(bind)
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    if bind.dialect.name == 'sqlite':
+        op.execute("DROP TABLE IF EXISTS patient_search")
+    elif bind.dialect.name == 'postgresql':
+        op.drop_index('ix_patient_search_document', table_name='patient_search')
+        op.drop_table('patient_search')
@@ -0,0 +1,52 @@
+"""add specialization catalog
+
+Normalized specializations and a doctor link table, so the doctor directory
+filters through an index instead of ILIKE '%x%' on doctors.specialization.
+Existing free-text values are split on , ; / and linked here.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17 09:48:12.207713
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0005'
+down_revision: Union[str, None] = '0004'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    from app.utils.specializations import rebuild_specializations
+
+    op.create_table('specializations',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('key', sa.String(), nullable=False),
+    sa.Column('name', sa.String(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_specializations_id'), 'specializations', ['id'], unique=False)
+    op.create_index(op.f('ix_specializations_key'), 'specializations', ['key'], unique=True)
+    op.create_table('doctor_specializations',
+    sa.Column('doctor_id', sa.Integer(), nullable=False),
+    sa.Column('specialization_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['doctor_id'], ['doctors.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['specialization_id'], ['specializations.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('doctor_id', 'specialization_id')
+    )
+    op.create_index('ix_doctor_specializations_specialization_id_doctor_id', 'doctor_specializations', ['specialization_id', 'doctor_id'], unique=False)
+    rebuild_specializations(op.get_bind())
+
+
+def downgrade() -> None:
+    op.drop_index('ix_doctor_specializations_specialization_id_doctor_id', table_name='doctor_specializations')
+    op.drop_table('doctor_specializations')
+    op.drop_index(op.f('ix_specializations_key'), table_name='specializations')
+    op.drop_index(op.f('ix_specializations_id'), table_name='specializations')
+    op.drop_table('specializations')
@@ -0,0 +1,38 @@
+"""add stat_counters
+
+Running counts behind GET /api/stats/summary (see app.utils.stats), kept in
+step by the writing transactions. Seeded here from the existing rows;
+`python -m app.cli reconcile-stats` recounts them later on.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17 10:31:45.918204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0006'
+down_revision: Union[str, None] = '0005'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    from app.utils.stats import reconcile_counters
+
+    op.create_table('stat_counters',
+    sa.Column('scope', sa.String(), nullable=False),
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('value', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('scope', 'name')
+    )
+    reconcile_counters(op.get_bind())
+
+
+def downgrade() -> None:
+    op.drop_table('stat_counters')
@@ -0,0 +1,61 @@
+"""add appointment rollups
+
+Per-doctor appointment counts by status behind /api/analytics (see
+app.utils.rollups): per day and hour, and per month, weekday and hour. Existing appointments are rolled up
+by revision 0011, once the tables have a column for every status; `python -m app.cli backfill-rollups`
+rebuilds any range later on.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-17 11:12:06.340517
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0007'
+down_revision: Union[str, None] = '0006'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('appointment_daily_rollups',
+    sa.Column('doctor_id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('hour', sa.Integer(), nullable=False),
+    sa.Column('weekday', sa.Integer(), nullable=False),
+    sa.Column('pending', sa.Integer(), nullable=False),
+    sa.Column('confirmed', sa.Integer(), nullable=False),
+    sa.Column('completed', sa.Integer(), nullable=False),
+    sa.Column('cancelled', sa.Integer(), nullable=False),
+    sa.Column('no_show', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['doctor_id'], ['doctors.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('doctor_id', 'day', 'hour')
+    )
+    op.create_index('ix_appointment_daily_rollups_day', 'appointment_daily_rollups', ['day'], unique=False)
+    op.create_table('appointment_monthly_rollups',
+    sa.Column('doctor_id', sa.Integer(), nullable=False),
+    sa.Column('month', sa.Date(), nullable=False),
+    sa.Column('weekday', sa.Integer(), nullable=False),
+    sa.Column('hour', sa.Integer(), nullable=False),
+    sa.Column('pending', sa.Integer(), nullable=False),
+    sa.Column('confirmed', sa.Integer(), nullable=False),
+    sa.Column('completed', sa.Integer(), nullable=False),
+    sa.Column('cancelled', sa.Integer(), nullable=False),
+    sa.Column('no_show', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['doctor_id'], ['doctors.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('doctor_id', 'month', 'weekday', 'hour')
+    )
+    op.create_index('ix_appointment_monthly_rollups_month', 'appointment_monthly_rollups', ['month'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_appointment_monthly_rollups_month', table_name='appointment_monthly_rollups')
+    op.drop_table('appointment_monthly_rollups')
+    op.drop_index('ix_appointment_daily_rollups_day', table_name='appointment_daily_rollups')
+    op.drop_table('appointment_daily_rollups')
@@ -0,0 +1,32 @@
+"""add users.token_version
+
+Stamped into stateless access tokens (STATELESS_AUTH) and bumped whenever a user
+is deactivated or changes password; see app.utils.revocations. Existing users
+start at 0.
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-17 16:12:08.402913
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0008'
+down_revision: Union[str, None] = '0007'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('token_version', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_column('token_version')
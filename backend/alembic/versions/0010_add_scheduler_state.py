@@ -0,0 +1,42 @@
+"""add scheduler state
+
+The lease that lets one process run the appointment scheduler, and the
+checkpoints its reminder jobs resume from after a restart.
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-17 21:05:12.804113
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0010'
+down_revision: Union[str, None] = '0009'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('scheduler_leases',
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('holder', sa.String(), nullable=True),
+    sa.Column('expires_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+    op.create_table('scheduler_checkpoints',
+    sa.Column('job', sa.String(), nullable=False),
+    sa.Column('appointment_date', sa.DateTime(), nullable=False),
+    sa.Column('appointment_id', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('job')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('scheduler_checkpoints')
+    op.drop_table('scheduler_leases')
@@ -0,0 +1,53 @@
+"""add expired appointment status
+
+Pending appointments the scheduler expires get their own status, and a count
+column in the rollups, instead of passing for cancellations. The rollup backfill
+moved here from revision 0007: it writes a column for every status, so it runs
+once they all exist, and only on databases whose rollups were never filled.
+
+PostgreSQL cannot drop an enum value, so a downgrade there leaves EXPIRED in the
+type, unused.
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-17 23:14:37.552081
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0011'
+down_revision: Union[str, None] = '0010'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+ROLLUP_TABLES = ('appointment_daily_rollups', 'appointment_monthly_rollups')
+
+
+def upgrade() -> None:
+    from app.utils.rollups import appointment_date_range, recompute_rollups
+
+    bind = op.get_bind()
+    if bind.dialect.name == 'postgresql':
+        op.execute("ALTER TYPE appointmentstatus ADD VALUE IF NOT EXISTS 'EXPIRED'")
+    for table in ROLLUP_TABLES:
+        op.add_column(table, sa.Column('expired', sa.Integer(), nullable=False, server_default='0'))
+    if bind.scalar(sa.text('SELECT 1 FROM appointment_daily_rollups LIMIT 1')) is None:
+        bounds = appointment_date_range(bind)
+        if bounds is not None:
+            recompute_rollups(bind, *bounds)
+
+
+def downgrade() -> None:
+    from app.utils.stats import reconcile_counters
+
+    op.execute("UPDATE appointments SET status = 'CANCELLED' WHERE status = 'EXPIRED'")
+    for table in ROLLUP_TABLES:
+        op.execute(f'UPDATE {table} SET cancelled = cancelled + expired')
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column('expired')
+    reconcile_counters(op.get_bind())
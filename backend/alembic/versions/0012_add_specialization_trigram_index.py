@@ -0,0 +1,49 @@
+"""add specialization trigram index
+
+The directory's specialization filter matches anywhere in a catalog name, as
+the free-text ILIKE did before the catalog. On PostgreSQL a pg_trgm GIN index
+on specializations.key serves that LIKE '%x%'. Creating the extension needs the
+CREATE privilege; without it the index is skipped and the filter scans the
+catalog, which holds one row per distinct specialization. SQLite has no
+equivalent and always scans the catalog.
+
+Revision ID: 0012
+Revises: 0011
+Create Date: 2026-10-17 23:52:08.316540
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0012'
+down_revision: Union[str, None] = '0011'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        return
+    # A savepoint, so a refused CREATE EXTENSION does not abort the rest of the upgrade
+    savepoint = bind.begin_nested()
+    try:
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    except sa.exc.DBAPIError:
+        savepoint.rollback()
+        return
+    savepoint.commit()
+    op.create_index(
+        'ix_specializations_key_trgm', 'specializations', ['key'],
+        postgresql_using='gin', postgresql_ops={'key': 'gin_trgm_ops'}
+    )
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == 'postgresql':
+        # The extension stays: other objects may use it
+        op.execute('DROP INDEX IF EXISTS ix_specializations_key_trgm')
@@ -0,0 +1,81 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional, Tuple
+from datetime import date, datetime, timedelta
+from ..config import settings
+from ..database import get_db
+from ..models.user import User, UserRole
+from ..models.doctor import Doctor
+from ..schemas import DoctorUtilization, SlotOutcomes
+from ..utils.security import get_current_active_user
+from ..utils.exports import check_range
+from ..utils.rollups import doctor_totals_query, outcomes, slot_capacity, slot_totals_query
+
+router = APIRouter(prefix="/analytics", tags=["Analytics"])
+
+def _require_admin(current_user: User) -> None:
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions"
+        )
+
+def _date_range(date_from: Optional[date], date_to: Optional[date]) -> Tuple[date, date]:
+    # [date_from, date_to); defaults to the last ANALYTICS_DEFAULT_RANGE_DAYS days up to today
+    end = date_to or datetime.utcnow().date() + timedelta(days=1)
+    start = date_from or end - timedelta(days=settings.ANALYTICS_DEFAULT_RANGE_DAYS)
+    check_range(start, end)
+    return start, end
+
+@router.get("/doctors", response_model=List[DoctorUtilization])
+async def get_doctor_utilization(
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    doctor_id: Optional[int] = None,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Per-doctor outcomes and utilization of working hours, from the daily rollups."""
+    _require_admin(current_user)
+    start, end = _date_range(date_from, date_to)
+    
+    totals = {row.doctor_id: row._mapping for row in await db.execute(doctor_totals_query(start, end, doctor_id))}
+    query = select(
+        Doctor.id, Doctor.doctor_id, User.full_name,
+        Doctor.available_days, Doctor.available_time_start, Doctor.available_time_end
+    ).join(User, Doctor.user_id == User.id).order_by(Doctor.id)
+    if doctor_id is not None:
+        query = query.where(Doctor.id == doctor_id)
+    
+    report = []
+    for row in await db.execute(query):
+        counts = outcomes(totals.get(row.id, {}))
+        capacity = slot_capacity(row.available_days, row.available_time_start, row.available_time_end, start, end)
+        report.append(DoctorUtilization(
+            doctor_id=row.id,
+            doctor_number=row.doctor_id,
+            full_name=row.full_name,
+            capacity=capacity,
+            utilization=counts["booked"] / capacity if capacity else None,
+            **counts
+        ))
+    return report
+
+@router.get("/slots", response_model=List[SlotOutcomes])
+async def get_slot_outcomes(
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    doctor_id: Optional[int] = None,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Completion and no-show rates by weekday and starting hour, from the daily rollups."""
+    _require_admin(current_user)
+    start, end = _date_range(date_from, date_to)
+    
+    result = await db.execute(slot_totals_query(start, end, doctor_id))
+    return [
+        SlotOutcomes(weekday=row.weekday, hour=row.hour, **outcomes(row._mapping))
+        for row in result
+    ]
@@ -1,37 +1,83 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List, Optional, cast
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import Select, and_, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional, Tuple, cast
 from datetime import datetime
 from ..database import get_db
-from ..models.user import User, UserRole
-from ..models.appointment import Appointment, AppointmentStatus
-from ..models.patient import Patient
+from ..models.user import UserRole
+from ..models.appointment import RELEASED_STATUSES, Appointment, AppointmentStatus
 from ..models.doctor import Doctor
-from ..schemas import AppointmentCreate, AppointmentResponse, AppointmentUpdate
-from ..utils.security import get_current_active_user
+from ..schemas import AppointmentCreate, AppointmentResponse, AppointmentSummary, AppointmentUpdate
+from ..utils.security import Actor, get_current_active_actor
+from ..utils.scheduling import find_conflicting_appointment, lock_doctor_schedule
+from ..utils.sequences import appointment_numbers
+from ..utils.pagination import cursor_headers, decode_cursor
+from ..utils.fast_json import RowSerializer, json_response
+from ..utils.fieldsets import FIELDS_DESCRIPTION, FieldSets
+from ..utils.expansions import EXPAND_DESCRIPTION, Expansions, Relation
+from .doctors import doctor_rows, doctors_by_id
+from .patients import patient_summary_rows, patients_by_id
+from ..utils.exports import ExportFormat, appointments_query, check_range, export_response
 
 router = APIRouter(prefix="/appointments", tags=["Appointments"])
 
-def generate_appointment_number(db: Session) -> str:
-    last_appointment = db.query(Appointment).order_by(Appointment.id.desc()).first()
-    if last_appointment is not None:
-        # static analyzers can treat ORM attributes as Column[...] types; cast to Optional[str]
-        last_num_str = cast(Optional[str], getattr(last_appointment, "appointment_number", None))
-        if last_num_str:
-            last_num = int(last_num_str.split("-")[1])
-            return f"APT-{last_num + 1:06d}"
-    return "APT-000001"
+appointment_rows = RowSerializer(Appointment, AppointmentResponse)
+
+def _filled(column):
+    return and_(column.isnot(None), column != "")
+
+# The list's default view; the flag is computed in SQL, so the text itself stays in the database
+appointment_summary_rows = RowSerializer(Appointment, AppointmentSummary, {
+    "has_clinical_notes": or_(
+        _filled(Appointment.notes), _filled(Appointment.prescription), _filled(Appointment.diagnosis)
+    ).label("has_clinical_notes")
+})
+appointment_fields = FieldSets(
+    Appointment, AppointmentResponse,
+    keys=[Appointment.appointment_date, Appointment.id, Appointment.patient_id, Appointment.doctor_id]
+)
+# Patients come as summaries: no clinical text, whoever's appointment it is
+appointment_expansions = Expansions(
+    Relation("doctor", Appointment.doctor_id, doctor_rows, doctors_by_id),
+    Relation("patient", Appointment.patient_id, patient_summary_rows, patients_by_id),
+)
+
+def appointments_page(
+    rows_for: RowSerializer,
+    skip: int,
+    limit: int,
+    after: Optional[Tuple[datetime, int]] = None,
+    patient_id: Optional[int] = None,
+    doctor_id: Optional[int] = None,
+    status: Optional[AppointmentStatus] = None
+) -> Select:
+    """A page of appointments, newest first: by offset, or keyset after the (appointment_date, id) `after`."""
+    query = rows_for.select()
+    if patient_id is not None:
+        query = query.where(Appointment.patient_id == patient_id)
+    if doctor_id is not None:
+        query = query.where(Appointment.doctor_id == doctor_id)
+    if status:
+        query = query.where(Appointment.status == status)
+    if after is not None:
+        last_date, last_id = after
+        query = query.where(or_(
+            Appointment.appointment_date < last_date,
+            and_(Appointment.appointment_date == last_date, Appointment.id < last_id)
+        ))
+        skip = 0
+    return query.order_by(Appointment.appointment_date.desc(), Appointment.id.desc()).offset(skip).limit(limit)
 
 @router.post("/", response_model=AppointmentResponse, status_code=status.HTTP_201_CREATED)
-def create_appointment(
+async def create_appointment(
     appointment_data: AppointmentCreate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    db: AsyncSession = Depends(get_db),
+    actor: Actor = Depends(get_current_active_actor)
 ):
     # Get patient
-    user_role = cast(UserRole, current_user.role)
-    if user_role == UserRole.PATIENT:
-        patient = cast(Optional[Patient], db.query(Patient).filter(Patient.user_id == current_user.id).first())
+    if actor.role == UserRole.PATIENT:
+        patient = actor.patient
         if not patient:
             raise HTTPException(status_code=404, detail="Patient profile not found")
     else:
@@ -41,7 +87,7 @@ def create_appointment(
         )
     
     # Verify doctor exists
-    doctor = db.query(Doctor).filter(Doctor.id == appointment_data.doctor_id).first()
+    doctor = await db.scalar(select(Doctor.id).where(Doctor.id == appointment_data.doctor_id))
     if not doctor:
         raise HTTPException(status_code=404, detail="Doctor not found")
     
@@ -52,9 +98,20 @@ def create_appointment(
             detail="Appointment date must be in the future"
         )
     
-    # Create appointment
+    # Taken before the schedule lock: a new ID block is a write on another connection,
+    # which on SQLite would wait for the lock this transaction is about to hold
+    appointment_number = await run_in_threadpool(appointment_numbers.next_id)
+    
+    # Reject overlapping bookings for the same doctor; concurrent bookings serialize on the lock
+    await lock_doctor_schedule(db, appointment_data.doctor_id)
+    if await find_conflicting_appointment(db, appointment_data.doctor_id, appointment_data.appointment_date) is not None:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Doctor already has an appointment at this time"
+        )
+    
     appointment = Appointment(
-        appointment_number=generate_appointment_number(db),
+        appointment_number=appointment_number,
         patient_id=patient.id,
         doctor_id=appointment_data.doctor_id,
         appointment_date=appointment_data.appointment_date,
@@ -62,86 +119,125 @@ def create_appointment(
         status=AppointmentStatus.PENDING
     )
     db.add(appointment)
-    db.commit()
-    db.refresh(appointment)
+    await db.commit()
+    await db.refresh(appointment)
     
     return appointment
 
-@router.get("/", response_model=List[AppointmentResponse])
-def get_appointments(
+@router.get("/", response_model=List[AppointmentSummary])
+async def get_appointments(
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
     status: Optional[AppointmentStatus] = None,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+    expand: Optional[str] = Query(None, description=EXPAND_DESCRIPTION),
+    db: AsyncSession = Depends(get_db),
+    actor: Actor = Depends(get_current_active_actor)
 ):
-    query = db.query(Appointment)
+    requested = appointment_fields.parse(fields)
+    expanded = appointment_expansions.parse(expand)
+    rows_for = appointment_summary_rows if requested is None else appointment_fields.rows(requested)
+    patient_id = doctor_id = None
 
     # Filter based on user role
-    user_role = cast(UserRole, current_user.role)
-    if user_role == UserRole.PATIENT:
-        patient = cast(Optional[Patient], db.query(Patient).filter(Patient.user_id == current_user.id).first())
-        if patient is not None:
-            query = query.filter(Appointment.patient_id == patient.id)
-    elif user_role == UserRole.DOCTOR:
-        doctor = cast(Optional[Doctor], db.query(Doctor).filter(Doctor.user_id == current_user.id).first())
-        if doctor is not None:
-            query = query.filter(Appointment.doctor_id == doctor.id)
-    
-    # Filter by status if provided
+    if actor.role == UserRole.PATIENT:
+        if actor.patient is not None:
+            patient_id = actor.patient.id
+    elif actor.role == UserRole.DOCTOR:
+        if actor.doctor is not None:
+            doctor_id = actor.doctor.id
+    
+    # Keyset mode resumes after the (appointment_date, id) of the previous page's last row
+    after = None
+    if cursor:
+        last_date, last_id = decode_cursor(cursor, (datetime, int))
+        after = (last_date, last_id)
+    
+    result = await db.execute(appointments_page(rows_for, skip, limit, after, patient_id, doctor_id, status))
+    rows = result.all()
+    body = await appointment_expansions.dump(db, expanded, rows_for, rows)
+    return json_response(body, cursor_headers(rows, limit, lambda a: (a.appointment_date, a.id)))
+
+@router.get("/export")
+async def export_appointments(
+    format: ExportFormat = ExportFormat.CSV,
+    date_from: Optional[datetime] = Query(None),
+    date_to: Optional[datetime] = Query(None),
+    status: Optional[AppointmentStatus] = None,
+    actor: Actor = Depends(get_current_active_actor)
+):
+    """Stream every matching appointment as CSV or NDJSON, with the same visibility as the list."""
+    date_from, date_to = check_range(date_from, date_to)
+    query = appointments_query(date_from, date_to)
+    
+    # Filter based on user role
+    if actor.role == UserRole.PATIENT:
+        if actor.patient is not None:
+            query = query.where(Appointment.patient_id == actor.patient.id)
+    elif actor.role == UserRole.DOCTOR:
+        if actor.doctor is not None:
+            query = query.where(Appointment.doctor_id == actor.doctor.id)
+    
     if status:
-        query = query.filter(Appointment.status == status)
+        query = query.where(Appointment.status == status)
     
-    appointments = query.order_by(Appointment.appointment_date.desc()).offset(skip).limit(limit).all()
-    return appointments
+    return export_response(query, format, "appointments")
 
 @router.get("/{appointment_id}", response_model=AppointmentResponse)
-def get_appointment(
+async def get_appointment(
     appointment_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+    expand: Optional[str] = Query(None, description=EXPAND_DESCRIPTION),
+    db: AsyncSession = Depends(get_db),
+    actor: Actor = Depends(get_current_active_actor)
 ):
-    appointment = db.query(Appointment).filter(Appointment.id == appointment_id).first()
+    requested = appointment_fields.parse(fields)
+    expanded = appointment_expansions.parse(expand)
+    if requested is None:
+        appointment = await db.get(Appointment, appointment_id)
+    else:
+        appointment = await db.scalar(
+            select(Appointment).options(*appointment_fields.load_options(requested)).where(Appointment.id == appointment_id)
+        )
     if not appointment:
         raise HTTPException(status_code=404, detail="Appointment not found")
     
     # Check permissions
-    user_role = cast(UserRole, current_user.role)
-    if user_role == UserRole.PATIENT:
-        patient = cast(Optional[Patient], db.query(Patient).filter(Patient.user_id == current_user.id).first())
-        if patient is not None:
-            if cast(int, getattr(appointment, "patient_id", None)) != patient.id:
+    if actor.role == UserRole.PATIENT:
+        if actor.patient is not None:
+            if cast(int, getattr(appointment, "patient_id", None)) != actor.patient.id:
                 raise HTTPException(
                     status_code=status.HTTP_403_FORBIDDEN,
                     detail="Not enough permissions"
                 )
-    elif user_role == UserRole.DOCTOR:
-        doctor = cast(Optional[Doctor], db.query(Doctor).filter(Doctor.user_id == current_user.id).first())
-        if doctor is not None:
-            if cast(int, getattr(appointment, "doctor_id", None)) != doctor.id:
+    elif actor.role == UserRole.DOCTOR:
+        if actor.doctor is not None:
+            if cast(int, getattr(appointment, "doctor_id", None)) != actor.doctor.id:
                 raise HTTPException(
                     status_code=status.HTTP_403_FORBIDDEN,
                     detail="Not enough permissions"
                 )
     
-    return appointment
+    if requested is None and not expanded:
+        return appointment
+    schema = AppointmentResponse if requested is None else appointment_fields.model(requested)
+    return json_response(await appointment_expansions.dump_one(db, expanded, schema.model_validate(appointment), appointment))
 
 @router.put("/{appointment_id}", response_model=AppointmentResponse)
-def update_appointment(
+async def update_appointment(
     appointment_id: int,
     appointment_update: AppointmentUpdate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    db: AsyncSession = Depends(get_db),
+    actor: Actor = Depends(get_current_active_actor)
 ):
-    appointment = db.query(Appointment).filter(Appointment.id == appointment_id).first()
+    appointment = await db.get(Appointment, appointment_id)
     if not appointment:
         raise HTTPException(status_code=404, detail="Appointment not found")
     
     # Check permissions
-    user_role = cast(UserRole, current_user.role)
-    if user_role == UserRole.PATIENT:
-        patient = cast(Optional[Patient], db.query(Patient).filter(Patient.user_id == current_user.id).first())
-        if patient is not None and cast(int, getattr(appointment, "patient_id", None)) != patient.id:
+    if actor.role == UserRole.PATIENT:
+        if actor.patient is not None and cast(int, getattr(appointment, "patient_id", None)) != actor.patient.id:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="Not enough permissions"
@@ -154,9 +250,8 @@ def update_appointment(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="Patients can only cancel appointments"
             )
-    elif user_role == UserRole.DOCTOR:
-        doctor = cast(Optional[Doctor], db.query(Doctor).filter(Doctor.user_id == current_user.id).first())
-        if doctor is not None and cast(int, getattr(appointment, "doctor_id", None)) != doctor.id:
+    elif actor.role == UserRole.DOCTOR:
+        if actor.doctor is not None and cast(int, getattr(appointment, "doctor_id", None)) != actor.doctor.id:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="Not enough permissions"
@@ -164,38 +259,51 @@ def update_appointment(
     
     # Update fields
     update_data = appointment_update.dict(exclude_unset=True)
+    
+    # Moving a booking, or reviving a cancelled or expired one, must not collide with the doctor's other bookings
+    current_status = cast(AppointmentStatus, appointment.status)
+    new_status = update_data.get("status") or current_status
+    new_date = update_data.get("appointment_date") or cast(datetime, appointment.appointment_date)
+    occupies_new_slot = new_date != appointment.appointment_date or current_status in RELEASED_STATUSES
+    if new_status not in RELEASED_STATUSES and occupies_new_slot:
+        doctor_id = cast(int, getattr(appointment, "doctor_id", None))
+        await lock_doctor_schedule(db, doctor_id)
+        if await find_conflicting_appointment(db, doctor_id, new_date, exclude_id=appointment_id) is not None:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Doctor already has an appointment at this time"
+            )
+    
     for field, value in update_data.items():
         setattr(appointment, field, value)
     
-    db.commit()
-    db.refresh(appointment)
+    await db.commit()
+    await db.refresh(appointment)
     return appointment
 
 @router.delete("/{appointment_id}")
-def delete_appointment(
+async def delete_appointment(
     appointment_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    db: AsyncSession = Depends(get_db),
+    actor: Actor = Depends(get_current_active_actor)
 ):
-    appointment = db.query(Appointment).filter(Appointment.id == appointment_id).first()
+    appointment = await db.get(Appointment, appointment_id)
     if not appointment:
         raise HTTPException(status_code=404, detail="Appointment not found")
     
     # Only admin or the patient who booked can delete
-    user_role = cast(UserRole, current_user.role)
-    if user_role == UserRole.PATIENT:
-        patient = cast(Optional[Patient], db.query(Patient).filter(Patient.user_id == current_user.id).first())
-        if patient is not None and cast(int, getattr(appointment, "patient_id", None)) != patient.id:
+    if actor.role == UserRole.PATIENT:
+        if actor.patient is not None and cast(int, getattr(appointment, "patient_id", None)) != actor.patient.id:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="Not enough permissions"
             )
-    elif user_role != UserRole.ADMIN:
+    elif actor.role != UserRole.ADMIN:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not enough permissions"
         )
     
-    db.delete(appointment)
-    db.commit()
+    await db.delete(appointment)
+    await db.commit()
     return {"message": "Appointment deleted successfully"}
\ No newline at end of file
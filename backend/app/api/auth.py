@@ -1,33 +1,82 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import timedelta
-from ..database import get_db
-from ..models.user import User
-from ..schemas import Token, UserLogin
-from ..utils.security import verify_password, create_access_token, get_current_active_user
+from ..database import get_db, get_pool_stats
+from ..models.user import User, UserRole
+from ..models.patient import Patient
+from ..models.doctor import Doctor
+from ..schemas import RefreshRequest, Token, UserLogin
+from ..utils.security import (
+    REFRESH_TOKEN, check_token_version, create_access_token, create_token_pair, decode_token,
+    get_current_active_user, verify_and_update_password_async
+)
+from ..utils.revocations import token_revocations
+from ..utils.principal_cache import principal_cache
 from ..config import settings
 
 router = APIRouter(prefix="/auth", tags=["Authentication"])
 
 @router.post("/login", response_model=Token)
-def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.email == form_data.username).first()
-    if not user or not verify_password(form_data.password, user.hashed_password):
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_db)):
+    user = await db.scalar(select(User).where(User.email == form_data.username))
+    verified, new_hash = await verify_and_update_password_async(form_data.password, user.hashed_password) if user else (False, None)
+    if not user or not verified:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
     
+    # Stored hash uses an outdated bcrypt cost; replace it while we have the password.
+    # Same password, so a bulk UPDATE: the mapper event that revokes tokens on credential changes must not fire
+    if new_hash:
+        await db.execute(
+            update(User).where(User.id == user.id).values(hashed_password=new_hash)
+        )
+        await db.commit()
+    
+    if settings.STATELESS_AUTH:
+        return await _token_pair(db, user)
+    
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
         data={"sub": user.email}, expires_delta=access_token_expires
     )
     return {"access_token": access_token, "token_type": "bearer"}
 
+async def _token_pair(db: AsyncSession, user: User) -> dict:
+    profile_ids = (await db.execute(
+        select(Patient.id, Doctor.id)
+        .select_from(User)
+        .outerjoin(Patient, Patient.user_id == User.id)
+        .outerjoin(Doctor, Doctor.user_id == User.id)
+        .where(User.id == user.id)
+    )).first()
+    return create_token_pair(user, *(profile_ids or (None, None)))
+
+@router.post("/refresh", response_model=Token)
+async def refresh_access_token(body: RefreshRequest, db: AsyncSession = Depends(get_db)):
+    if not settings.STATELESS_AUTH:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Refresh tokens are only issued in stateless auth mode"
+        )
+    payload = decode_token(body.refresh_token, token_type=REFRESH_TOKEN)
+    # The one database read: a refresh picks up deactivation, revocation and role changes
+    user = await db.get(User, payload.get("uid"))
+    if user is None or user.email != payload["sub"] or not user.is_active:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    check_token_version(payload, user.token_version)
+    return await _token_pair(db, user)
+
 @router.get("/me")
-def get_current_user_info(current_user: User = Depends(get_current_active_user)):
+async def get_current_user_info(current_user: User = Depends(get_current_active_user)):
     return {
         "id": current_user.id,
         "email": current_user.email,
@@ -35,4 +84,31 @@ def get_current_user_info(current_user: User = Depends(get_current_active_user))
         "full_name": current_user.full_name,
         "role": current_user.role,
         "is_active": current_user.is_active
-    }
\ No newline at end of file
+    }
+
+@router.get("/principal-cache")
+async def get_principal_cache_stats(current_user: User = Depends(get_current_active_user)):
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions"
+        )
+    return principal_cache.stats()
+
+@router.get("/db-pool")
+async def get_db_pool_stats(current_user: User = Depends(get_current_active_user)):
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions"
+        )
+    return get_pool_stats()
+
+@router.get("/revocations")
+async def get_revocation_stats(current_user: User = Depends(get_current_active_user)):
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions"
+        )
+    return token_revocations.stats()
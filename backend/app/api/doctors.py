@@ -1,27 +1,38 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List, Optional, cast
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, status
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import Select, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+from pydantic import TypeAdapter
+from typing import Collection, List, Optional, cast
+from datetime import datetime, timedelta
+from ..config import settings
 from ..database import get_db
 from ..models.user import User, UserRole
 from ..models.doctor import Doctor
-from ..schemas import DoctorCreate, DoctorResponse, DoctorUpdate
-from ..utils.security import get_password_hash, get_current_active_user
+from ..models.specialization import Specialization
+from ..schemas import AvailableSlot, DoctorCreate, DoctorResponse, DoctorUpdate, SpecializationCount, UserResponse
+from ..utils.security import Actor, get_password_hash_async, get_current_active_user, get_current_active_stored_actor
+from ..utils.scheduling import compute_free_slots, get_booked_starts, naive_utc
+from ..utils.sequences import doctor_ids
+from ..utils.pagination import decode_cursor, next_cursor
+from ..utils.response_cache import CachedResponse, build_response, doctor_directory_cache, make_etag, specialization_cache
+from ..utils.specializations import counts_query, doctor_filter, ids_containing, normalize_key
+from ..utils.fast_json import RowSerializer, SchemaBundle, json_response
+from ..utils.expansions import parse_ids
 
 router = APIRouter(prefix="/doctors", tags=["Doctors"])
 
-def generate_doctor_id(db: Session) -> str:
-    last_doctor = db.query(Doctor).order_by(Doctor.id.desc()).first()
-    if last_doctor is not None:
-        last_id = cast(Optional[str], getattr(last_doctor, "doctor_id", None))
-        if last_id:
-            last_num = int(last_id.split("-")[1])
-            return f"DOC-{last_num + 1:05d}"
-    return "DOC-00001"
+doctor_rows = RowSerializer(Doctor, DoctorResponse, {"user": SchemaBundle("user", User, UserResponse)})
+specialization_list_adapter = TypeAdapter(List[SpecializationCount])
+
+def doctors_by_id(ids: Collection[int]) -> Select:
+    return doctor_rows.select().join(User, Doctor.user_id == User.id).where(Doctor.id.in_(ids))
 
 @router.post("/register", response_model=DoctorResponse, status_code=status.HTTP_201_CREATED)
-def register_doctor(
+async def register_doctor(
     doctor_data: DoctorCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
     # Only admins can register doctors
@@ -33,30 +44,32 @@ def register_doctor(
         )
     
     # Check if user already exists
-    existing_user = db.query(User).filter(
+    existing_user = await db.scalar(select(User.id).where(
         (User.email == doctor_data.user.email) | (User.username == doctor_data.user.username)
-    ).first()
+    ).limit(1))
     if existing_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email or username already registered"
         )
     
+    # Reserve the hospital ID before this session writes anything (SQLite allows one writer)
+    doctor_number = await run_in_threadpool(doctor_ids.next_id)
+    
     # Create user
     user = User(
         email=doctor_data.user.email,
         username=doctor_data.user.username,
         full_name=doctor_data.user.full_name,
-        hashed_password=get_password_hash(doctor_data.user.password),
+        hashed_password=await get_password_hash_async(doctor_data.user.password),
         role=UserRole.DOCTOR
     )
     db.add(user)
-    db.flush()
     
     # Create doctor profile
     doctor = Doctor(
-        user_id=user.id,
-        doctor_id=generate_doctor_id(db),
+        user=user,
+        doctor_id=doctor_number,
         specialization=doctor_data.specialization,
         qualification=doctor_data.qualification,
         phone=doctor_data.phone,
@@ -69,58 +82,146 @@ def register_doctor(
         available_time_end=doctor_data.available_time_end
     )
     db.add(doctor)
-    db.commit()
-    db.refresh(doctor)
+    await db.commit()
     
     return doctor
 
+def directory_page(
+    skip: int,
+    limit: int,
+    after: Optional[int] = None,
+    specialization: Optional[str] = None,
+    specialization_id: Optional[int] = None
+) -> Select:
+    """A page of the public directory: by offset, or keyset after the id `after`."""
+    query = doctor_rows.select().join(User, Doctor.user_id == User.id)
+    if specialization_id is not None:
+        query = doctor_filter(query, select(Specialization.id).where(Specialization.id == specialization_id))
+    if specialization:
+        # Catalog names containing the given text, as the free-text filter matched before the catalog
+        query = doctor_filter(query, ids_containing(specialization))
+    if after is not None:
+        query = query.where(Doctor.id > after)
+        skip = 0
+    return query.order_by(Doctor.id).offset(skip).limit(limit)
+
+async def load_directory_page(
+    db: AsyncSession,
+    skip: int,
+    limit: int,
+    cursor: Optional[str],
+    specialization: Optional[str],
+    specialization_id: Optional[int] = None
+) -> CachedResponse:
+    last_id = None
+    if cursor:
+        last_id, = decode_cursor(cursor, (int,))
+    
+    result = await db.execute(directory_page(skip, limit, last_id, specialization, specialization_id))
+    rows = result.all()
+    body = doctor_rows.dump(rows)
+    return CachedResponse(body, make_etag(body), next_cursor(rows, limit, lambda d: (d.id,)))
+
 @router.get("/", response_model=List[DoctorResponse])
-def get_all_doctors(
+async def get_all_doctors(
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
     specialization: Optional[str] = None,
-    db: Session = Depends(get_db)
+    specialization_id: Optional[int] = None,
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_db)
 ):
-    query = db.query(Doctor)
-    if specialization:
-        query = query.filter(Doctor.specialization.ilike(f"%{specialization}%"))
-    
-    doctors = query.offset(skip).limit(limit).all()
-    return doctors
+    # Public and read-mostly: serve serialized pages from memory, revalidated by ETag
+    key = (skip, limit, cursor, specialization, specialization_id)
+    page = doctor_directory_cache.get(key)
+    if page is None:
+        generation = doctor_directory_cache.generation()
+        page = await load_directory_page(db, skip, limit, cursor, specialization, specialization_id)
+        doctor_directory_cache.put(key, page, generation)
+    return build_response(page, if_none_match)
 
-@router.get("/me", response_model=DoctorResponse)
-def get_my_profile(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+@router.get("/specializations", response_model=List[SpecializationCount])
+async def get_specializations(
+    prefix: Optional[str] = Query(None, max_length=100),
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_db)
 ):
-    user_role = cast(UserRole, current_user.role)
-    if user_role != UserRole.DOCTOR:
+    key = normalize_key(prefix or "")
+    page = specialization_cache.get(key)
+    if page is None:
+        generation = specialization_cache.generation()
+        rows = (await db.execute(counts_query(key or None))).mappings().all()
+        body = specialization_list_adapter.dump_json(specialization_list_adapter.validate_python(rows))
+        page = CachedResponse(body, make_etag(body))
+        specialization_cache.put(key, page, generation)
+    return build_response(page, if_none_match)
+
+@router.get("/batch", response_model=List[DoctorResponse])
+async def get_doctors_batch(ids: str = Query(..., description="Comma-separated doctor ids"), db: AsyncSession = Depends(get_db)):
+    """The doctors with these ids, in the order given; unknown ids are left out."""
+    wanted = parse_ids(ids)
+    rows = {row.id: row for row in (await db.execute(doctors_by_id(wanted))).all()}
+    return json_response(doctor_rows.dump([rows[doctor_id] for doctor_id in wanted if doctor_id in rows]))
+
+@router.get("/me", response_model=DoctorResponse)
+async def get_my_profile(actor: Actor = Depends(get_current_active_stored_actor)):
+    if actor.role != UserRole.DOCTOR:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not a doctor account"
         )
     
-    doctor = db.query(Doctor).filter(Doctor.user_id == current_user.id).first()
+    doctor = actor.doctor
     if not doctor:
         raise HTTPException(status_code=404, detail="Doctor profile not found")
     
     return doctor
 
 @router.get("/{doctor_id}", response_model=DoctorResponse)
-def get_doctor(doctor_id: int, db: Session = Depends(get_db)):
-    doctor = db.query(Doctor).filter(Doctor.id == doctor_id).first()
+async def get_doctor(doctor_id: int, db: AsyncSession = Depends(get_db)):
+    doctor = await db.scalar(select(Doctor).options(joinedload(Doctor.user)).where(Doctor.id == doctor_id))
     if not doctor:
         raise HTTPException(status_code=404, detail="Doctor not found")
     return doctor
 
+@router.get("/{doctor_id}/slots", response_model=List[AvailableSlot])
+async def get_doctor_slots(
+    doctor_id: int,
+    from_date: Optional[datetime] = Query(None, alias="from"),
+    to_date: Optional[datetime] = Query(None, alias="to"),
+    db: AsyncSession = Depends(get_db)
+):
+    doctor = await db.get(Doctor, doctor_id)
+    if not doctor:
+        raise HTTPException(status_code=404, detail="Doctor not found")
+    
+    # "...Z" and "+02:00" bounds are compared with the naive UTC times stored
+    start = naive_utc(from_date) or datetime.utcnow()
+    end = naive_utc(to_date) or start + timedelta(days=7)
+    if end <= start:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="'to' must be after 'from'"
+        )
+    if end - start > timedelta(days=settings.MAX_SLOT_RANGE_DAYS):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Range cannot exceed {settings.MAX_SLOT_RANGE_DAYS} days"
+        )
+    
+    booked = await get_booked_starts(db, doctor_id, start, end)
+    slots = compute_free_slots(doctor, booked, start, end)
+    return [{"start": slot_start, "end": slot_end} for slot_start, slot_end in slots]
+
 @router.put("/{doctor_id}", response_model=DoctorResponse)
-def update_doctor(
+async def update_doctor(
     doctor_id: int,
     doctor_update: DoctorUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
-    doctor = db.query(Doctor).filter(Doctor.id == doctor_id).first()
+    doctor = await db.scalar(select(Doctor).options(joinedload(Doctor.user)).where(Doctor.id == doctor_id))
     if not doctor:
         raise HTTPException(status_code=404, detail="Doctor not found")
     
@@ -142,6 +243,5 @@ def update_doctor(
     for field, value in update_data.items():
         setattr(doctor, field, value)
     
-    db.commit()
-    db.refresh(doctor)
+    await db.commit()
     return doctor
\ No newline at end of file
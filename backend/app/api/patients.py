@@ -1,49 +1,76 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import Select, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+from typing import Collection, List, Optional
 from datetime import datetime
 from ..database import get_db
 from ..models.user import User, UserRole
 from ..models.patient import Patient
-from ..schemas import PatientCreate, PatientResponse, PatientUpdate
-from ..utils.security import get_password_hash, get_current_active_user
+from ..schemas import PatientCreate, PatientImportReport, PatientResponse, PatientSummary, PatientUpdate, UserResponse
+from ..utils.security import Actor, get_password_hash_async, get_current_active_user, get_current_active_stored_actor
+from ..utils.sequences import patient_ids
+from ..utils.pagination import cursor_headers, decode_cursor
+from ..utils.fast_json import RowSerializer, SchemaBundle, json_response
+from ..utils.fieldsets import FIELDS_DESCRIPTION, FieldSets
+from ..utils.expansions import parse_ids
+from ..utils.patient_search import search_query, supports_search
+from ..utils.patient_import import PatientImporter, iter_lines, records_for
+from ..utils.exports import ExportFormat, check_range, export_response, patients_query
 
 router = APIRouter(prefix="/patients", tags=["Patients"])
 
-def generate_patient_id(db: Session) -> str:
-    last_patient = db.query(Patient).order_by(Patient.id.desc()).first()
-    if last_patient and last_patient.patient_id:
-        last_num = int(last_patient.patient_id.split("-")[1])
-        return f"PAT-{last_num + 1:05d}"
-    return "PAT-00001"
+user_bundle = {"user": SchemaBundle("user", User, UserResponse)}
+patient_rows = RowSerializer(Patient, PatientResponse, user_bundle)
+# The list's default view, without the clinical text columns; user_id is for ownership checks
+patient_summary_rows = RowSerializer(Patient, PatientSummary, user_bundle, extra=[Patient.user_id])
+patient_fields = FieldSets(Patient, PatientResponse, user_bundle, keys=[Patient.id, Patient.user_id])
+summary_fields = tuple(PatientSummary.model_fields)
+
+def patients_by_id(ids: Collection[int]) -> Select:
+    return patient_summary_rows.select().join(User, Patient.user_id == User.id).where(Patient.id.in_(ids))
+
+def patients_page(rows_for: RowSerializer, with_user: bool, skip: int, limit: int, after: Optional[int] = None) -> Select:
+    """A page of the patient list: by offset, or keyset after the id `after`."""
+    # Plain rows with the user columns joined in, serialized in one pass
+    query = rows_for.select()
+    if with_user:
+        query = query.join(User, Patient.user_id == User.id)
+    if after is not None:
+        query = query.where(Patient.id > after)
+        skip = 0
+    return query.order_by(Patient.id).offset(skip).limit(limit)
 
 @router.post("/register", response_model=PatientResponse, status_code=status.HTTP_201_CREATED)
-def register_patient(patient_data: PatientCreate, db: Session = Depends(get_db)):
+async def register_patient(patient_data: PatientCreate, db: AsyncSession = Depends(get_db)):
     # Check if user already exists
-    existing_user = db.query(User).filter(
+    existing_user = await db.scalar(select(User.id).where(
         (User.email == patient_data.user.email) | (User.username == patient_data.user.username)
-    ).first()
+    ).limit(1))
     if existing_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email or username already registered"
         )
     
+    # Reserve the hospital ID before this session writes anything (SQLite allows one writer)
+    patient_number = await run_in_threadpool(patient_ids.next_id)
+    
     # Create user
     user = User(
         email=patient_data.user.email,
         username=patient_data.user.username,
         full_name=patient_data.user.full_name,
-        hashed_password=get_password_hash(patient_data.user.password),
+        hashed_password=await get_password_hash_async(patient_data.user.password),
         role=UserRole.PATIENT
     )
     db.add(user)
-    db.flush()
     
     # Create patient profile
     patient = Patient(
-        user_id=user.id,
-        patient_id=generate_patient_id(db),
+        user=user,
+        patient_id=patient_number,
         date_of_birth=patient_data.date_of_birth,
         gender=patient_data.gender,
         blood_group=patient_data.blood_group,
@@ -56,16 +83,39 @@ def register_patient(patient_data: PatientCreate, db: Session = Depends(get_db))
         current_medications=patient_data.current_medications
     )
     db.add(patient)
-    db.commit()
-    db.refresh(patient)
+    await db.commit()
     
     return patient
 
-@router.get("/", response_model=List[PatientResponse])
-def get_all_patients(
+@router.post("/import", response_model=PatientImportReport)
+async def import_patients(
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Register patients from a streamed CSV or NDJSON body; bad rows are reported, not fatal."""
+    if current_user.role not in [UserRole.ADMIN, UserRole.RECEPTIONIST]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions"
+        )
+    
+    records = records_for(request.headers.get("content-type", ""), iter_lines(request.stream()))
+    if records is None:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="Send text/csv or application/x-ndjson"
+        )
+    
+    return await PatientImporter(db).run(records)
+
+@router.get("/", response_model=List[PatientSummary])
+async def get_all_patients(
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
     if current_user.role not in [UserRole.ADMIN, UserRole.DOCTOR, UserRole.NURSE]:
@@ -74,33 +124,113 @@ def get_all_patients(
             detail="Not enough permissions"
         )
     
-    patients = db.query(Patient).offset(skip).limit(limit).all()
-    return patients
+    requested = patient_fields.parse(fields)
+    rows_for = patient_summary_rows if requested is None else patient_fields.rows(requested)
+    last_id = None
+    if cursor:
+        last_id, = decode_cursor(cursor, (int,))
+    
+    result = await db.execute(patients_page(rows_for, requested is None or "user" in requested, skip, limit, last_id))
+    rows = result.all()
+    return json_response(rows_for.dump(rows), cursor_headers(rows, limit, lambda p: (p.id,)))
 
-@router.get("/me", response_model=PatientResponse)
-def get_my_profile(
-    db: Session = Depends(get_db),
+@router.get("/search", response_model=List[PatientSummary])
+async def search_patients(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    if current_user.role not in [UserRole.ADMIN, UserRole.DOCTOR, UserRole.NURSE, UserRole.RECEPTIONIST]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions"
+        )
+    
+    dialect = db.bind.dialect.name
+    if not supports_search(dialect):
+        raise HTTPException(
+            status_code=status.HTTP_501_NOT_IMPLEMENTED,
+            detail="Search is not available on this database"
+        )
+    
+    requested = patient_fields.parse(fields)
+    query = search_query(dialect, q, limit)
+    if query is None:
+        return []
+    if requested is not None:
+        result = await db.scalars(query.options(*patient_fields.load_options(requested)))
+        return json_response(patient_fields.dump(requested, result.all()))
+    result = await db.scalars(query.options(*patient_fields.load_options(summary_fields)))
+    return result.all()
+
+@router.get("/batch", response_model=List[PatientSummary])
+async def get_patients_batch(
+    ids: str = Query(..., description="Comma-separated patient ids"),
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """The patients with these ids, in the order given; unknown ids are left out."""
+    wanted = parse_ids(ids)
+    requested = patient_fields.parse(fields)
+    rows_for = patient_summary_rows if requested is None else patient_fields.rows(requested)
+    query = rows_for.select().where(Patient.id.in_(wanted))
+    if requested is None or "user" in requested:
+        query = query.join(User, Patient.user_id == User.id)
+    rows = {row.id: row for row in (await db.execute(query)).all()}
+    
+    # Same rule as GET /patients/{id}: patients may only read their own record
+    if current_user.role == UserRole.PATIENT and any(row.user_id != current_user.id for row in rows.values()):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions"
+        )
+    
+    return json_response(rows_for.dump([rows[patient_id] for patient_id in wanted if patient_id in rows]))
+
+@router.get("/export")
+async def export_patients(
+    format: ExportFormat = ExportFormat.CSV,
+    date_from: Optional[datetime] = Query(None),
+    date_to: Optional[datetime] = Query(None),
     current_user: User = Depends(get_current_active_user)
 ):
-    if current_user.role != UserRole.PATIENT:
+    """Stream patients registered in [date_from, date_to) as CSV or NDJSON."""
+    if current_user.role not in [UserRole.ADMIN, UserRole.DOCTOR, UserRole.NURSE]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions"
+        )
+    
+    date_from, date_to = check_range(date_from, date_to)
+    return export_response(patients_query(date_from, date_to), format, "patients")
+
+@router.get("/me", response_model=PatientResponse)
+async def get_my_profile(actor: Actor = Depends(get_current_active_stored_actor)):
+    if actor.role != UserRole.PATIENT:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not a patient account"
         )
     
-    patient = db.query(Patient).filter(Patient.user_id == current_user.id).first()
+    patient = actor.patient
     if not patient:
         raise HTTPException(status_code=404, detail="Patient profile not found")
     
     return patient
 
 @router.get("/{patient_id}", response_model=PatientResponse)
-def get_patient(
+async def get_patient(
     patient_id: int,
-    db: Session = Depends(get_db),
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
-    patient = db.query(Patient).filter(Patient.id == patient_id).first()
+    requested = patient_fields.parse(fields)
+    options = [joinedload(Patient.user)] if requested is None else patient_fields.load_options(requested)
+    patient = await db.scalar(select(Patient).options(*options).where(Patient.id == patient_id))
     if not patient:
         raise HTTPException(status_code=404, detail="Patient not found")
     
@@ -111,16 +241,18 @@ def get_patient(
             detail="Not enough permissions"
         )
     
+    if requested is not None:
+        return json_response(patient_fields.dump_one(requested, patient))
     return patient
 
 @router.put("/{patient_id}", response_model=PatientResponse)
-def update_patient(
+async def update_patient(
     patient_id: int,
     patient_update: PatientUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
-    patient = db.query(Patient).filter(Patient.id == patient_id).first()
+    patient = await db.scalar(select(Patient).options(joinedload(Patient.user)).where(Patient.id == patient_id))
     if not patient:
         raise HTTPException(status_code=404, detail="Patient not found")
     
@@ -136,6 +268,5 @@ def update_patient(
     for field, value in update_data.items():
         setattr(patient, field, value)
     
-    db.commit()
-    db.refresh(patient)
+    await db.commit()
     return patient
\ No newline at end of file
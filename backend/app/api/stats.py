@@ -0,0 +1,45 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime
+from ..database import get_db
+from ..models.user import UserRole
+from ..models.appointment import AppointmentStatus
+from ..schemas import StatsSummary
+from ..utils.security import Actor, get_current_active_actor
+from ..utils.stats import (
+    DOCTORS, GLOBAL_SCOPE, PATIENTS, day_name, doctor_scope, patient_scope, read_counters, status_name
+)
+
+router = APIRouter(prefix="/stats", tags=["Stats"])
+
+@router.get("/summary", response_model=StatsSummary)
+async def get_summary(
+    db: AsyncSession = Depends(get_db),
+    actor: Actor = Depends(get_current_active_actor)
+):
+    """Dashboard counts from the maintained counters; no table is counted per request."""
+    # Same visibility as the appointment list
+    if actor.role == UserRole.PATIENT:
+        if not actor.patient:
+            raise HTTPException(status_code=404, detail="Patient profile not found")
+        scope = patient_scope(actor.patient.id)
+    elif actor.role == UserRole.DOCTOR:
+        if not actor.doctor:
+            raise HTTPException(status_code=404, detail="Doctor profile not found")
+        scope = doctor_scope(actor.doctor.id)
+    else:
+        scope = GLOBAL_SCOPE
+    
+    today = datetime.utcnow().date()
+    counters = await read_counters(db, scope, today)
+    by_status = {status: max(counters.get(status_name(status), 0), 0) for status in AppointmentStatus}
+    
+    return StatsSummary(
+        scope=scope,
+        appointments_by_status=by_status,
+        appointments_total=sum(by_status.values()),
+        appointments_today=max(counters.get(day_name(today), 0), 0),
+        doctors=max(counters.get(DOCTORS, 0), 0),
+        # The patient total is for staff, as is the patient list
+        patients=None if actor.role == UserRole.PATIENT else max(counters.get(PATIENTS, 0), 0)
+    )
@@ -0,0 +1,342 @@
+"""Maintenance commands: python -m app.cli <command>"""
+import argparse
+import sys
+from datetime import date, timedelta
+from .database import engine
+from .migrations import run_migrations
+
+def migrate(args: argparse.Namespace) -> int:
+    run_migrations()
+    print("Database is at the latest revision")
+    return 0
+
+def check_query_plans(args: argparse.Namespace) -> int:
+    from .utils.query_plans import check_query_plans as run_check
+
+    run_migrations()
+    failures = 0
+    for result in run_check(engine):
+        if result.ok:
+            note = f" (allowed: {result.shape.allow_scan})" if result.scanned_tables else ""
+            print(f"ok    {result.shape.name}{note}")
+        else:
+            failures += 1
+            print(f"SCAN  {result.shape.name}: full scan of {', '.join(result.scanned_tables)}")
+        if args.verbose or not result.ok:
+            for line in result.plan:
+                print(f"        {line}")
+    return 1 if failures else 0
+
+def check_query_counts(args: argparse.Namespace) -> int:
+    from .utils.query_counts import check_query_counts as run_check
+
+    run_migrations()
+    failures = 0
+    for result in run_check(args.page_sizes):
+        counts = ", ".join(f"limit={limit}: {count}" for limit, count in result.counts.items())
+        if result.ok:
+            print(f"ok    {result.endpoint} ({counts}; {result.rows} rows)")
+        else:
+            failures += 1
+            print(f"GROWS {result.endpoint} ({counts}; {result.rows} rows)")
+    return 1 if failures else 0
+
+def rebuild_search_index(args: argparse.Namespace) -> int:
+    from .utils.patient_search import rebuild_patient_search, supports_search
+
+    run_migrations()
+    if not supports_search(engine.dialect.name):
+        print(f"Patient search is not available on {engine.dialect.name}")
+        return 1
+    with engine.begin() as connection:
+        count = rebuild_patient_search(connection)
+    print(f"Indexed {count} patients")
+    return 0
+
+def reconcile_stats(args: argparse.Namespace) -> int:
+    from .utils.stats import reconcile_counters
+
+    run_migrations()
+    with engine.begin() as connection:
+        corrected = reconcile_counters(connection)
+    print(f"Corrected {corrected} counters")
+    return 0
+
+def backfill_rollups(args: argparse.Namespace) -> int:
+    from .utils.rollups import appointment_date_range, next_month, recompute_rollups
+
+    run_migrations()
+    with engine.connect() as connection:
+        bounds = appointment_date_range(connection)
+    if bounds is None and (args.start is None or args.end is None):
+        print("No appointments to roll up")
+        return 0
+    start = args.start or bounds[0]
+    end = args.end or bounds[1]
+    rows = 0
+    # One calendar month per transaction keeps each write lock short
+    while start < end:
+        batch_end = min(next_month(start), end)
+        with engine.begin() as connection:
+            rows += recompute_rollups(connection, start, batch_end)
+        start = batch_end
+    print(f"Wrote {rows} rollup rows")
+    return 0
+
+def bench_serialization(args: argparse.Namespace) -> int:
+    from .utils.benchmarks import benchmark_serialization
+
+    run_migrations()
+    print(f"{'endpoint':<24}{'rows':>6}{'fetch before':>14}{'after':>8}{'serialize before':>18}{'after':>8}{'speedup':>9}")
+    for result in benchmark_serialization(args.limit, args.repeat):
+        print(
+            f"{result.name:<24}{result.rows:>6}"
+            f"{result.fetch_before:>12.2f}ms{result.fetch_after:>6.2f}ms"
+            f"{result.serialize_before:>16.2f}ms{result.serialize_after:>6.2f}ms{result.speedup:>8.1f}x"
+        )
+    return 0
+
+def bench_fields(args: argparse.Namespace) -> int:
+    from .utils.benchmarks import benchmark_fieldsets
+
+    run_migrations()
+    print(f"{'endpoint':<24}{'view':<36}{'rows':>6}{'bytes':>10}{'ms/page':>10}")
+    for result in benchmark_fieldsets(args.limit, args.repeat):
+        print(f"{result.endpoint:<24}{result.view:<36}{result.rows:>6}{result.bytes:>10}{result.milliseconds:>10.2f}")
+    return 0
+
+def bench_auth(args: argparse.Namespace) -> int:
+    from .utils.benchmarks import benchmark_auth
+
+    run_migrations()
+    print(f"{'mode':<20}{'requests':>9}{'req/s':>9}{'mean':>10}{'queries/req':>13}")
+    for result in benchmark_auth(args.requests, args.concurrency):
+        mean = result.seconds / result.requests * args.concurrency * 1000
+        print(f"{result.mode:<20}{result.requests:>9}{result.throughput:>9.0f}{mean:>8.2f}ms{result.queries:>13.2f}")
+    return 0
+
+def send_notifications(args: argparse.Namespace) -> int:
+    from .config import settings
+    from .utils.notifications import notification_worker
+
+    run_migrations()
+    if not settings.SMTP_HOST:
+        print("SMTP_HOST is not set; nothing is queued or sent")
+        return 1
+    stats = notification_worker.drain(engine)
+    print(
+        f"Sent {stats.sent}, retrying {stats.retried}, failed {stats.failed}; "
+        f"{stats.depth} still pending"
+    )
+    return 0
+
+def run_scheduler(args: argparse.Namespace) -> int:
+    from .utils.appointment_scheduler import LeaseLost, appointment_scheduler
+
+    run_migrations()
+    lookback = timedelta(days=args.lookback_days) if args.lookback_days is not None else None
+    try:
+        report = appointment_scheduler.run_once(engine, lookback=lookback)
+    except LeaseLost:
+        print("Another process holds the scheduler lease; it is already running these jobs")
+        return 1
+    print(
+        f"Queued {report.reminders} reminders, marked {report.no_shows} no-shows, "
+        f"expired {report.expired} pending appointments"
+    )
+    return 0
+
+def generate_data(args: argparse.Namespace) -> int:
+    from .utils.synthetic import DEFAULT_PASSWORD, SyntheticDataGenerator
+
+    run_migrations()
+    password = args.password or DEFAULT_PASSWORD
+    generator = SyntheticDataGenerator(
+        engine, seed=args.seed, password=password, chunk_size=args.chunk_size, note_length=args.note_length
+    )
+    report = generator.run(args.patients, args.doctors, args.appointments, args.past_days, args.future_days)
+    print(
+        f"Inserted {report.patients} patients, {report.doctors} doctors and {report.appointments} appointments "
+        f"in {report.seconds:.1f}s (password: {password})"
+    )
+    if report.skipped:
+        print(f"Skipped {report.skipped} appointments: no free slot left in the doctors' hours")
+    return 0
+
+def load_test(args: argparse.Namespace) -> int:
+    from .utils.load_test import PAGE_SIZE, load_baseline, regressions, run_load_test, save_baseline
+    from .utils.synthetic import DEFAULT_PASSWORD
+
+    run_migrations()
+    result = run_load_test(
+        engine,
+        args.password or DEFAULT_PASSWORD,
+        concurrency=args.concurrency,
+        duration=args.duration,
+        warmup=args.warmup,
+        seed=args.seed,
+        sample=args.sample,
+        base_url=args.base_url,
+        scenarios=args.scenarios,
+        deep_page=args.deep_page,
+        login_storm=args.login_storm,
+        weights=dict(args.weights or [])
+    )
+    storm = f" + {result.login_storm} logging in" if result.login_storm else ""
+    print(f"{result.dialect}, {result.concurrency} workers{storm}, {result.duration:.1f}s")
+    if any(name.startswith("deep_page") for name in result.scenarios):
+        print(f"deep pages: patient list page {result.deep_page} ({result.deep_page * PAGE_SIZE} rows skipped)")
+    print(f"{'scenario':<20}{'requests':>9}{'errors':>8}{'req/s':>9}{'p50':>10}{'p95':>10}{'p99':>10}")
+    for name, summary in list(result.scenarios.items()) + [("total", result.total)]:
+        print(
+            f"{name:<20}{summary.requests:>9}{summary.errors:>8}{summary.throughput:>9.1f}"
+            f"{summary.p50:>8.1f}ms{summary.p95:>8.1f}ms{summary.p99:>8.1f}ms"
+        )
+    if args.save_baseline:
+        save_baseline(result, args.save_baseline)
+        print(f"Saved baseline to {args.save_baseline}")
+    if args.baseline:
+        found = regressions(result, load_baseline(args.baseline), args.threshold)
+        for message in found:
+            print(f"REGRESSION  {message}")
+        if found:
+            return 1
+        print(f"No regression beyond {args.threshold:.0%} of {args.baseline}")
+    return 0
+
+def _scenario_weight(value: str):
+    name, _, weight = value.partition("=")
+    if not name or not weight.isdigit():
+        raise argparse.ArgumentTypeError(f"expected NAME=N, got {value!r}")
+    return name, int(weight)
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.cli")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    subparsers.add_parser("migrate", help="Upgrade the database schema").set_defaults(func=migrate)
+
+    plans = subparsers.add_parser("check-query-plans", help="Fail if an endpoint query does a full table scan")
+    plans.add_argument("-v", "--verbose", action="store_true", help="Print every plan")
+    plans.set_defaults(func=check_query_plans)
+
+    counts = subparsers.add_parser(
+        "check-query-counts",
+        help="Fail if a list endpoint runs more queries for bigger pages"
+    )
+    counts.add_argument("page_sizes", nargs="*", type=int, default=[1, 10, 100], help="Page sizes to compare")
+    counts.set_defaults(func=check_query_counts)
+
+    subparsers.add_parser(
+        "rebuild-search-index",
+        help="Re-index every patient for /api/patients/search"
+    ).set_defaults(func=rebuild_search_index)
+
+    subparsers.add_parser(
+        "reconcile-stats",
+        help="Recount the dashboard counters and correct any drift"
+    ).set_defaults(func=reconcile_stats)
+
+    rollups = subparsers.add_parser(
+        "backfill-rollups",
+        help="Rebuild the analytics rollups for a date range (default: every appointment)"
+    )
+    rollups.add_argument("--from", dest="start", type=date.fromisoformat, help="First day, YYYY-MM-DD")
+    rollups.add_argument("--to", dest="end", type=date.fromisoformat, help="Day after the last, YYYY-MM-DD")
+    rollups.set_defaults(func=backfill_rollups)
+
+    bench = subparsers.add_parser(
+        "bench-serialization",
+        help="Time one page of each list endpoint on the ORM path and the fast JSON path"
+    )
+    bench.add_argument("--limit", type=int, default=100, help="Page size")
+    bench.add_argument("--repeat", type=int, default=50, help="Calls per timing round")
+    bench.set_defaults(func=bench_serialization)
+
+    fields = subparsers.add_parser(
+        "bench-fields",
+        help="Compare page size and time of full list rows, summaries and sparse fieldsets"
+    )
+    fields.add_argument("--limit", type=int, default=100, help="Rows per page")
+    fields.add_argument("--repeat", type=int, default=20, help="Pages per timing round")
+    fields.set_defaults(func=bench_fields)
+
+    auth = subparsers.add_parser(
+        "bench-auth",
+        help="Compare authenticated-request throughput with and without the database round trip"
+    )
+    auth.add_argument("--requests", type=int, default=2000, help="Requests per mode")
+    auth.add_argument("--concurrency", type=int, default=10, help="Concurrent requests")
+    auth.set_defaults(func=bench_auth)
+
+    send = subparsers.add_parser(
+        "send-notifications",
+        help="Send every due notification email in the outbox now, then exit"
+    )
+    send.set_defaults(func=send_notifications)
+
+    scheduler = subparsers.add_parser(
+        "run-scheduler",
+        help="Queue due reminders and mark overdue appointments no-show or expired, once"
+    )
+    scheduler.add_argument(
+        "--lookback-days", type=float,
+        help="Mark appointments that fell due up to this many days ago (default SCHEDULER_LOOKBACK_DAYS)"
+    )
+    scheduler.set_defaults(func=run_scheduler)
+
+    generate = subparsers.add_parser(
+        "generate-data",
+        help="Bulk-load synthetic patients, doctors and appointments for benchmarks"
+    )
+    generate.add_argument("--patients", type=int, default=1000)
+    generate.add_argument("--doctors", type=int, default=50)
+    generate.add_argument("--appointments", type=int, default=10000)
+    generate.add_argument("--past-days", type=int, default=365, help="Book appointments this far back")
+    generate.add_argument("--future-days", type=int, default=60, help="And this far ahead")
+    generate.add_argument("--seed", type=int, default=0, help="Same seed, same data")
+    generate.add_argument("--password", help="Password of every generated account")
+    generate.add_argument("--chunk-size", type=int, default=5000, help="Rows per insert transaction")
+    generate.add_argument(
+        "--note-length", type=int, default=0,
+        help="Average characters of clinical text in notes and histories; 0 keeps them to a few words"
+    )
+    generate.set_defaults(func=generate_data)
+
+    load = subparsers.add_parser(
+        "load-test",
+        help="Drive login, appointment and directory requests concurrently and report latency percentiles"
+    )
+    load.add_argument("--concurrency", type=int, default=10, help="Concurrent workers")
+    load.add_argument("--duration", type=float, default=30.0, help="Seconds measured, after the warm-up")
+    load.add_argument("--warmup", type=float, default=2.0, help="Seconds run before measuring")
+    load.add_argument("--seed", type=int, default=0)
+    load.add_argument("--sample", type=int, default=40, help="Patients to log in as; a quarter as many doctors")
+    load.add_argument("--password", help="Password shared by the sampled accounts (generate-data's default)")
+    load.add_argument("--base-url", help="Hit a running server instead of the app in process")
+    load.add_argument(
+        "--scenario", dest="scenarios", action="append",
+        help="Run only this scenario; repeatable. deep_page_offset and deep_page_cursor run only when named"
+    )
+    load.add_argument(
+        "--deep-page", type=int, default=500,
+        help="Patient list page the deep_page scenarios fetch, capped at the last full page"
+    )
+    load.add_argument(
+        "--login-storm", type=int, default=0, metavar="WORKERS",
+        help="Extra workers that do nothing but log in while the others run the mix"
+    )
+    load.add_argument(
+        "--weight", dest="weights", action="append", type=_scenario_weight, metavar="NAME=N",
+        help="Give a scenario this share of the mix instead of its default; repeatable"
+    )
+    load.add_argument("--save-baseline", metavar="PATH", help="Write the results here as JSON")
+    load.add_argument("--baseline", metavar="PATH", help="Exit 1 if results regressed against this baseline")
+    load.add_argument("--threshold", type=float, default=0.2, help="Allowed regression, as a fraction")
+    load.set_defaults(func=load_test)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
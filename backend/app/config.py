@@ -5,20 +5,119 @@ class Settings(BaseSettings):
     # Database
     DATABASE_URL: str = "sqlite:///./hospital.db"
     
+    # Connection pool, per engine (in-memory SQLite keeps SQLAlchemy's single-connection pool)
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30.0
+    # Seconds before a connection is replaced; -1 keeps connections forever
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    
+    # PRAGMAs applied to every new SQLite connection
+    SQLITE_JOURNAL_MODE: str = "WAL"
+    SQLITE_SYNCHRONOUS: str = "NORMAL"
+    SQLITE_MMAP_SIZE: int = 268435456
+    # Negative values are KiB, positive values are pages
+    SQLITE_CACHE_SIZE: int = -65536
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+    
     # Security
     SECRET_KEY: str = "your-secret-key-change-in-production-09d25e094faa6ca2556c818166b7a9563b93f7099f6f0f4caa6cf63b88e8d3e7"
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
     
+    # Stateless auth: requests build the principal from the token's claims, without the database.
+    # Access tokens are short-lived and renewed with a refresh token at POST /api/auth/refresh
+    STATELESS_AUTH: bool = False
+    STATELESS_ACCESS_TOKEN_EXPIRE_MINUTES: int = 5
+    REFRESH_TOKEN_EXPIRE_DAYS: int = 7
+    # Revoked token versions are reloaded this often; past the staleness limit requests use the database
+    REVOCATION_REFRESH_SECONDS: float = 5.0
+    REVOCATION_MAX_STALENESS_SECONDS: float = 60.0
+    
+    # Password hashing: bcrypt cost, and the process pool it runs on (0 workers = inline)
+    BCRYPT_ROUNDS: int = 12
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_QUEUE_SIZE: int = 8
+    PASSWORD_HASH_QUEUE_TIMEOUT: float = 5.0
+    
+    # Cache of authenticated principals (user + profile) keyed by token subject
+    PRINCIPAL_CACHE_ENABLED: bool = True
+    PRINCIPAL_CACHE_SIZE: int = 1024
+    PRINCIPAL_CACHE_TTL_SECONDS: int = 60
+    # Cross-worker invalidation channel: "local" (in-process stand-in) or None to disable
+    PRINCIPAL_CACHE_PUBSUB: Optional[str] = None
+    
+    # Public doctor directory (GET /api/doctors/) pages, serialized; size 0 disables
+    DOCTOR_DIRECTORY_CACHE_SIZE: int = 256
+    DOCTOR_DIRECTORY_CACHE_TTL_SECONDS: int = 30
+    
     # CORS
     ALLOWED_ORIGINS: list = ["http://localhost:5173", "http://localhost:3000"]
     
-    # Email (optional for MVP)
+    # Scheduling
+    APPOINTMENT_SLOT_MINUTES: int = 30
+    MAX_SLOT_RANGE_DAYS: int = 31
+    
+    # Bulk patient import: rows per insert batch and commit, and how many row errors to report
+    PATIENT_IMPORT_CHUNK_SIZE: int = 500
+    PATIENT_IMPORT_MAX_ERRORS: int = 1000
+    
+    # Streaming CSV/NDJSON exports: rows fetched from the server-side cursor per batch
+    EXPORT_BATCH_SIZE: int = 1000
+    
+    # Analytics: range used when a report names no dates
+    ANALYTICS_DEFAULT_RANGE_DAYS: int = 30
+    
+    # Request and SQL metrics served at GET /metrics; off removes the middleware and engine hooks
+    METRICS_ENABLED: bool = True
+    # Scrapers send "Authorization: Bearer <token>"; unset, GET /metrics answers 404
+    METRICS_TOKEN: Optional[str] = None
+    
+    # Number of hospital IDs (APT-/PAT-/DOC-) each worker reserves per round trip
+    ID_BLOCK_SIZE: int = 50
+    
+    # Email (optional for MVP); appointment notifications are queued only when SMTP_HOST is set
     SMTP_HOST: Optional[str] = None
     SMTP_PORT: Optional[int] = None
     SMTP_USER: Optional[str] = None
     SMTP_PASSWORD: Optional[str] = None
+    SMTP_FROM: str = "Hospital Management System <noreply@hospital.local>"
+    SMTP_STARTTLS: bool = False
+    SMTP_TIMEOUT_SECONDS: float = 10.0
+    # Connections kept open to the SMTP server, and how long an idle one is kept
+    SMTP_POOL_SIZE: int = 2
+    SMTP_IDLE_SECONDS: float = 60.0
     
+    # Notification outbox worker; off leaves draining to `python -m app.cli send-notifications`
+    NOTIFICATION_WORKER_ENABLED: bool = True
+    NOTIFICATION_BATCH_SIZE: int = 50
+    NOTIFICATION_POLL_SECONDS: float = 5.0
+    # Failed sends retry after BACKOFF * 2^(attempt - 1) seconds, capped, until MAX_ATTEMPTS
+    NOTIFICATION_MAX_ATTEMPTS: int = 8
+    NOTIFICATION_BACKOFF_SECONDS: float = 30.0
+    NOTIFICATION_BACKOFF_MAX_SECONDS: float = 3600.0
+    # A claimed batch not settled within this long is picked up again
+    NOTIFICATION_LEASE_SECONDS: float = 300.0
+
+    # Appointment scheduler: reminders and overdue transitions, run by one process at a time.
+    # Off by default; `python -m app.cli run-scheduler` runs the jobs once either way
+    SCHEDULER_ENABLED: bool = False
+    # Reminder emails go out this many hours before an appointment (needs SMTP_HOST)
+    APPOINTMENT_REMINDER_HOURS: list = [24, 2]
+    # Confirmed appointments this long past their start become no-shows;
+    # pending ones never confirmed this long past their start become expired
+    NO_SHOW_AFTER_MINUTES: int = 60
+    PENDING_EXPIRY_AFTER_MINUTES: int = 1440
+    # Transitions only touch appointments that fell due within this many days; older ones are left as they are
+    SCHEDULER_LOOKBACK_DAYS: int = 7
+    # Appointments per bulk UPDATE or reminder batch, each its own transaction
+    SCHEDULER_CHUNK_SIZE: int = 500
+    # The timeline is reloaded from the database this often, picking up changes made elsewhere
+    SCHEDULER_RELOAD_SECONDS: float = 60.0
+    # A holder that stops renewing loses the lease after this long
+    SCHEDULER_LEASE_SECONDS: float = 30.0
+
     class Config:
         env_file = ".env"
 
@@ -1,20 +1,170 @@
-from sqlalchemy import create_engine
+import threading
+import time
+from typing import Any, Dict, Optional, Type
+from sqlalchemy import create_engine, event, exc
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, Pool, QueuePool
 from .config import settings
 
-engine = create_engine(
-    settings.DATABASE_URL,
-    connect_args={"check_same_thread": False} if "sqlite" in settings.DATABASE_URL else {}
-)
+# DATABASE_URL may name either driver flavour; each engine gets the one it needs
+SYNC_DRIVERS = {"sqlite+aiosqlite": "sqlite", "postgresql+asyncpg": "postgresql+psycopg2"}
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "sqlite+pysqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+}
+
+def get_sync_database_url(url: str) -> str:
+    parsed = make_url(url)
+    return parsed.set(drivername=SYNC_DRIVERS.get(parsed.drivername, parsed.drivername)).render_as_string(hide_password=False)
+
+def get_async_database_url(url: str) -> str:
+    parsed = make_url(url)
+    return parsed.set(drivername=ASYNC_DRIVERS.get(parsed.drivername, parsed.drivername)).render_as_string(hide_password=False)
+
+SYNC_DATABASE_URL = get_sync_database_url(settings.DATABASE_URL)
+ASYNC_DATABASE_URL = get_async_database_url(settings.DATABASE_URL)
+
+class PoolStats:
+    """How long callers waited to check a connection out of a pool."""
+
+    def __init__(self):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, wait: float, timed_out: bool = False) -> None:
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            waits = self.checkouts + self.timeouts
+            return {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "total_wait_seconds": self.total_wait,
+                "mean_wait_seconds": self.total_wait / waits if waits else 0.0,
+                "max_wait_seconds": self.max_wait,
+            }
+
+class _TimedPool:
+    stats: PoolStats
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            self.stats.record(time.perf_counter() - started, timed_out=True)
+            raise
+        self.stats.record(time.perf_counter() - started)
+        return connection
+
+def _timed_pool_class(base: Type[Pool], stats: PoolStats) -> Type[Pool]:
+    # The pool rebuilds itself from its class on dispose(), so the stats live on the class
+    return type(base.__name__, (_TimedPool, base), {"stats": stats})
+
+def _is_memory_sqlite(url: str) -> bool:
+    parsed = make_url(url)
+    return parsed.get_backend_name() == "sqlite" and parsed.database in (None, "", ":memory:")
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record) -> None:
+    cursor = dbapi_connection.cursor()
+    # busy_timeout first, so switching the journal mode waits out other connections
+    cursor.execute(f"PRAGMA busy_timeout = {int(settings.SQLITE_BUSY_TIMEOUT_MS)}")
+    cursor.execute(f"PRAGMA journal_mode = {settings.SQLITE_JOURNAL_MODE}")
+    cursor.execute(f"PRAGMA synchronous = {settings.SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA mmap_size = {int(settings.SQLITE_MMAP_SIZE)}")
+    cursor.execute(f"PRAGMA cache_size = {int(settings.SQLITE_CACHE_SIZE)}")
+    cursor.close()
+
+def _engine_options(url: str, pool_class: Type[Pool], stats: Optional[PoolStats], **pool_overrides) -> Dict[str, Any]:
+    parsed = make_url(url)
+    options: Dict[str, Any] = {}
+    if parsed.get_backend_name() == "sqlite" and parsed.get_driver_name() != "aiosqlite":
+        options["connect_args"] = {"check_same_thread": False}
+    if _is_memory_sqlite(url):
+        # Every connection would see its own empty database; keep SQLAlchemy's default pool
+        return options
+    pool = {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    }
+    pool.update(pool_overrides)
+    options.update(pool)
+    options["poolclass"] = _timed_pool_class(pool_class, stats) if stats is not None else pool_class
+    return options
+
+def create_db_engine(url: str, stats: Optional[PoolStats] = None, **pool_overrides) -> Engine:
+    """Sync engine with the configured pool and, on SQLite, the connection PRAGMAs."""
+    db_engine = create_engine(url, **_engine_options(url, QueuePool, stats, **pool_overrides))
+    if db_engine.dialect.name == "sqlite":
+        event.listen(db_engine, "connect", _set_sqlite_pragmas)
+    return db_engine
+
+def create_async_db_engine(url: str, stats: Optional[PoolStats] = None, **pool_overrides) -> AsyncEngine:
+    """Async counterpart of create_db_engine; aiosqlite would otherwise reconnect per session."""
+    db_engine = create_async_engine(url, **_engine_options(url, AsyncAdaptedQueuePool, stats, **pool_overrides))
+    if db_engine.dialect.name == "sqlite":
+        event.listen(db_engine.sync_engine, "connect", _set_sqlite_pragmas)
+    return db_engine
+
+sync_pool_stats = PoolStats()
+async_pool_stats = PoolStats()
+
+# Sync engine: migrations, startup tasks and maintenance commands
+engine = create_db_engine(SYNC_DATABASE_URL, stats=sync_pool_stats)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async engine: request handlers
+async_engine = create_async_db_engine(ASYNC_DATABASE_URL, stats=async_pool_stats)
+
+# Responses are serialized after commit, so keep loaded attributes instead of expiring them
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 Base = declarative_base()
 
-def get_db():
+def _pool_status(pool: Pool, stats: PoolStats) -> Dict[str, Any]:
+    result: Dict[str, Any] = {"pool": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        result.update(
+            size=pool.size(),
+            checked_out=pool.checkedout(),
+            checked_in=pool.checkedin(),
+            overflow=pool.overflow(),
+        )
+    result.update(stats.snapshot())
+    return result
+
+def get_pool_stats() -> Dict[str, Any]:
+    return {
+        "async": _pool_status(async_engine.sync_engine.pool, async_pool_stats),
+        "sync": _pool_status(engine.pool, sync_pool_stats),
+    }
+
+async def get_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+def get_sync_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
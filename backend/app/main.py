@@ -1,20 +1,32 @@
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI
+from fastapi.responses import Response
 from fastapi.middleware.cors import CORSMiddleware
 from .config import settings
-from .database import engine, Base
-from .api import auth, patients, doctors, appointments
-from .models import user, patient, doctor, appointment as appointment_model
+from .database import async_engine, engine
+from .migrations import run_migrations
+from .api import auth, patients, doctors, appointments, stats, analytics
+from .models import user, patient, doctor, appointment as appointment_model, sequence, specialization, stat_counter, appointment_rollup, notification, scheduler
 from .utils.security import get_password_hash
+from .utils.passwords import password_hasher
+from .utils.revocations import token_revocations
+from .utils.notifications import notification_worker, notifications_enabled
+from .utils.appointment_scheduler import appointment_scheduler
+from .utils.pagination import NEXT_CURSOR_HEADER
+from .utils.fast_json import FastJSONResponse
+from .utils.metrics import (
+    CONTENT_TYPE, MetricsMiddleware, instrument_engine, metrics, register_default_collectors, require_metrics_token
+)
 from .models.user import User, UserRole
 from sqlalchemy.orm import Session
 
-# Create database tables
-Base.metadata.create_all(bind=engine)
+# Create or upgrade database tables
+run_migrations()
 
 app = FastAPI(
     title="Hospital Management System API",
     description="Cloud-based Hospital Management System",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=FastJSONResponse
 )
 
 # Configure CORS
@@ -24,13 +36,27 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
+if settings.METRICS_ENABLED:
+    # Added last so it wraps CORS and times the whole request
+    app.add_middleware(MetricsMiddleware)
+    instrument_engine(async_engine)
+    instrument_engine(engine)
+    register_default_collectors()
+
+    @app.get("/metrics", include_in_schema=False, dependencies=[Depends(require_metrics_token)])
+    def read_metrics():
+        return Response(content=metrics.render(), media_type=CONTENT_TYPE)
+
 # Include routers
 app.include_router(auth.router, prefix="/api")
 app.include_router(patients.router, prefix="/api")
 app.include_router(doctors.router, prefix="/api")
 app.include_router(appointments.router, prefix="/api")
+app.include_router(stats.router, prefix="/api")
+app.include_router(analytics.router, prefix="/api")
 
 @app.on_event("startup")
 def startup_event():
@@ -53,6 +79,49 @@ def startup_event():
     finally:
         db.close()
 
+@app.on_event("startup")
+async def start_revocation_refresh():
+    """Stateless auth: load the revoked token versions, then keep them current"""
+    if settings.STATELESS_AUTH:
+        async with async_engine.connect() as connection:
+            await connection.run_sync(token_revocations.load)
+        token_revocations.start(settings.REVOCATION_REFRESH_SECONDS)
+
+@app.on_event("startup")
+async def start_notification_worker():
+    """Send queued appointment emails in the background"""
+    if notifications_enabled() and settings.NOTIFICATION_WORKER_ENABLED:
+        notification_worker.start()
+
+@app.on_event("startup")
+async def start_appointment_scheduler():
+    """Reminders and no-show/expiry transitions; every worker starts one, the lease holder runs it"""
+    if settings.SCHEDULER_ENABLED:
+        appointment_scheduler.start()
+
+@app.on_event("shutdown")
+def shutdown_event():
+    password_hasher.shutdown()
+
+@app.on_event("shutdown")
+async def stop_revocation_refresh():
+    await token_revocations.stop()
+
+@app.on_event("shutdown")
+async def stop_notification_worker():
+    await notification_worker.stop()
+
+@app.on_event("shutdown")
+async def stop_appointment_scheduler():
+    await appointment_scheduler.stop()
+
+@app.on_event("shutdown")
+async def dispose_engines():
+    """Registered last: the handlers above still use the engines while stopping.
+    aiosqlite runs each connection on a non-daemon thread, so pooled connections left open keep the process alive"""
+    await async_engine.dispose()
+    engine.dispose()
+
 @app.get("/")
 def read_root():
     return {
@@ -0,0 +1,29 @@
+from pathlib import Path
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import inspect
+from sqlalchemy.engine import Engine
+from .database import SYNC_DATABASE_URL, engine
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+BASELINE_REVISION = "0001"
+
+def get_alembic_config() -> Config:
+    config = Config(str(BACKEND_DIR / "alembic.ini"))
+    config.set_main_option("script_location", str(BACKEND_DIR / "alembic"))
+    config.set_main_option("sqlalchemy.url", SYNC_DATABASE_URL)
+    return config
+
+def run_migrations(bind: Engine = engine) -> None:
+    """Upgrade the database to the latest revision.
+
+    Databases created by the old `Base.metadata.create_all` call have the tables
+    but no alembic_version row; those are stamped at the baseline first.
+    """
+    config = get_alembic_config()
+    with bind.begin() as connection:
+        config.attributes["connection"] = connection
+        inspector = inspect(connection)
+        if inspector.has_table("users") and not inspector.has_table("alembic_version"):
+            command.stamp(config, BASELINE_REVISION)
+        command.upgrade(config, "head")
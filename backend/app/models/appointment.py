@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, Enum
+from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, Enum, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 import enum
@@ -10,9 +10,21 @@ class AppointmentStatus(str, enum.Enum):
     COMPLETED = "completed"
     CANCELLED = "cancelled"
     NO_SHOW = "no_show"
+    # Still pending, never confirmed, PENDING_EXPIRY_AFTER_MINUTES past its start
+    EXPIRED = "expired"
+
+# Statuses whose booking no longer takes up its slot
+RELEASED_STATUSES = (AppointmentStatus.CANCELLED, AppointmentStatus.EXPIRED)
 
 class Appointment(Base):
     __tablename__ = "appointments"
+    __table_args__ = (
+        # Match the endpoint query shapes; see alembic revision 0003
+        Index("ix_appointments_doctor_id_appointment_date", "doctor_id", "appointment_date"),
+        Index("ix_appointments_patient_id_status_appointment_date", "patient_id", "status", "appointment_date"),
+        Index("ix_appointments_status_appointment_date", "status", "appointment_date"),
+        Index("ix_appointments_appointment_date", "appointment_date"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     appointment_number = Column(String, unique=True, index=True)
@@ -0,0 +1,41 @@
+from sqlalchemy import Column, Date, ForeignKey, Index, Integer
+from ..database import Base
+
+class AppointmentRollup(Base):
+    """Appointments per doctor, day and starting hour, one count column per AppointmentStatus."""
+    __tablename__ = "appointment_daily_rollups"
+    __table_args__ = (
+        # All-doctor reports read a day range; per-doctor reports use the primary key
+        Index("ix_appointment_daily_rollups_day", "day"),
+    )
+    
+    doctor_id = Column(Integer, ForeignKey("doctors.id", ondelete="CASCADE"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    hour = Column(Integer, primary_key=True)
+    # 0 = Monday, as date.weekday()
+    weekday = Column(Integer, nullable=False)
+    pending = Column(Integer, nullable=False, default=0)
+    confirmed = Column(Integer, nullable=False, default=0)
+    completed = Column(Integer, nullable=False, default=0)
+    cancelled = Column(Integer, nullable=False, default=0)
+    no_show = Column(Integer, nullable=False, default=0)
+    expired = Column(Integer, nullable=False, default=0)
+
+class AppointmentMonthlyRollup(Base):
+    """The daily rollups summed per calendar month, so reports over years read few rows."""
+    __tablename__ = "appointment_monthly_rollups"
+    __table_args__ = (
+        Index("ix_appointment_monthly_rollups_month", "month"),
+    )
+    
+    doctor_id = Column(Integer, ForeignKey("doctors.id", ondelete="CASCADE"), primary_key=True)
+    # First day of the month
+    month = Column(Date, primary_key=True)
+    weekday = Column(Integer, primary_key=True)
+    hour = Column(Integer, primary_key=True)
+    pending = Column(Integer, nullable=False, default=0)
+    confirmed = Column(Integer, nullable=False, default=0)
+    completed = Column(Integer, nullable=False, default=0)
+    cancelled = Column(Integer, nullable=False, default=0)
+    no_show = Column(Integer, nullable=False, default=0)
+    expired = Column(Integer, nullable=False, default=0)
@@ -8,7 +8,7 @@ class Doctor(Base):
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), unique=True)
     doctor_id = Column(String, unique=True, index=True)  # Hospital generated ID
-    specialization = Column(String, nullable=False)
+    specialization = Column(String, nullable=False)  # As entered; indexed via the specializations catalog
     qualification = Column(String, nullable=False)
     experience_years = Column(Integer)
     license_number = Column(String, unique=True)
@@ -22,5 +22,9 @@ class Doctor(Base):
     available_time_end = Column(String)  # e.g., "17:00"
     
     # Relationships
-    user = relationship("User", back_populates="doctor_profile")
-    appointments = relationship("Appointment", back_populates="doctor")
\ No newline at end of file
+    # Nested in every response; queries must load it eagerly rather than once per row
+    user = relationship("User", back_populates="doctor_profile", lazy="raise_on_sql")
+    appointments = relationship("Appointment", back_populates="doctor")
+    specializations = relationship(
+        "Specialization", secondary="doctor_specializations", back_populates="doctors", lazy="raise_on_sql"
+    )
\ No newline at end of file
@@ -0,0 +1,32 @@
+from sqlalchemy import Column, DateTime, Enum, ForeignKey, Index, Integer, String, Text
+from datetime import datetime
+import enum
+from ..database import Base
+
+class NotificationStatus(str, enum.Enum):
+    PENDING = "pending"
+    SENT = "sent"
+    FAILED = "failed"
+
+class Notification(Base):
+    """An email waiting in the outbox; written in the transaction of the change it reports."""
+    __tablename__ = "notification_outbox"
+    __table_args__ = (
+        # The worker's claim query: due pending rows, oldest first
+        Index("ix_notification_outbox_status_next_attempt_at", "status", "next_attempt_at"),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    # e.g. "appointment_booked"
+    kind = Column(String, nullable=False)
+    appointment_id = Column(Integer, ForeignKey("appointments.id", ondelete="SET NULL"), nullable=True)
+    recipient = Column(String, nullable=False)
+    subject = Column(String, nullable=False)
+    body = Column(Text, nullable=False)
+    status = Column(Enum(NotificationStatus), nullable=False, default=NotificationStatus.PENDING)
+    attempts = Column(Integer, nullable=False, default=0)
+    # Not before this time; a claimed row is pushed ahead by the lease, so a crashed sender's rows come back
+    next_attempt_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    last_error = Column(Text)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    sent_at = Column(DateTime)
@@ -37,5 +37,6 @@ class Patient(Base):
     current_medications = Column(Text)
     
     # Relationships
-    user = relationship("User", back_populates="patient_profile")
+    # Nested in every response; queries must load it eagerly rather than once per row
+    user = relationship("User", back_populates="patient_profile", lazy="raise_on_sql")
     appointments = relationship("Appointment", back_populates="patient")
\ No newline at end of file
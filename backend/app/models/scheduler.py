@@ -0,0 +1,21 @@
+from sqlalchemy import Column, DateTime, Integer, String
+from ..database import Base
+
+class SchedulerLease(Base):
+    """Which process runs a scheduler; it renews `expires_at` in every transaction it commits."""
+    __tablename__ = "scheduler_leases"
+    
+    name = Column(String, primary_key=True)
+    # Host, process and a per-start token of the holder; free once expires_at has passed
+    holder = Column(String)
+    expires_at = Column(DateTime, nullable=False)
+
+class SchedulerCheckpoint(Base):
+    """How far a scheduler job has got, as the (appointment_date, id) of the last appointment it handled."""
+    __tablename__ = "scheduler_checkpoints"
+    
+    # e.g. "reminder:24h"
+    job = Column(String, primary_key=True)
+    appointment_date = Column(DateTime, nullable=False)
+    appointment_id = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, nullable=False)
@@ -0,0 +1,8 @@
+from sqlalchemy import Column, Integer, String
+from ..database import Base
+
+class IdCounter(Base):
+    __tablename__ = "id_counters"
+    
+    name = Column(String, primary_key=True)
+    next_value = Column(Integer, nullable=False)
@@ -0,0 +1,25 @@
+from sqlalchemy import Column, Integer, String, ForeignKey, Index, Table
+from sqlalchemy.orm import relationship
+from ..database import Base
+
+# Doctors may list several specializations; kept in step with Doctor.specialization
+doctor_specializations = Table(
+    "doctor_specializations",
+    Base.metadata,
+    Column("doctor_id", Integer, ForeignKey("doctors.id", ondelete="CASCADE"), primary_key=True),
+    Column("specialization_id", Integer, ForeignKey("specializations.id", ondelete="CASCADE"), primary_key=True),
+    # Directory filter: specialization_id = ? ORDER BY doctor_id
+    Index("ix_doctor_specializations_specialization_id_doctor_id", "specialization_id", "doctor_id"),
+)
+
+class Specialization(Base):
+    __tablename__ = "specializations"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    # Lowercased, single-spaced name; unique, and range-scanned for prefix lookups.
+    # PostgreSQL also has a pg_trgm index on it for substring lookups (revision 0012)
+    key = Column(String, unique=True, index=True, nullable=False)
+    name = Column(String, nullable=False)
+    
+    # Relationships
+    doctors = relationship("Doctor", secondary=doctor_specializations, back_populates="specializations")
@@ -0,0 +1,11 @@
+from sqlalchemy import Column, Integer, String
+from ..database import Base
+
+class StatCounter(Base):
+    __tablename__ = "stat_counters"
+    
+    # "all", "doctor:<id>" or "patient:<id>"
+    scope = Column(String, primary_key=True)
+    # "status:<status>", "day:<YYYY-MM-DD>", "doctors" or "patients"
+    name = Column(String, primary_key=True)
+    value = Column(Integer, nullable=False, default=0)
@@ -1,14 +1,20 @@
-from pydantic import BaseModel, EmailStr
-from typing import Optional
+from pydantic import BaseModel, EmailStr, field_validator
+from typing import Dict, List, Optional
 from datetime import datetime, date
 from ..models.user import UserRole
 from ..models.patient import BloodGroup, Gender
 from ..models.appointment import AppointmentStatus
+from ..utils.scheduling import naive_utc
 
 # Token Schemas
 class Token(BaseModel):
     access_token: str
     token_type: str
+    # Stateless mode only
+    refresh_token: Optional[str] = None
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
 
 class TokenData(BaseModel):
     email: Optional[str] = None
@@ -64,6 +70,35 @@ class PatientResponse(PatientBase):
     class Config:
         from_attributes = True
 
+# List views leave out the clinical text; ?fields= or the detail endpoint returns it
+class PatientSummary(BaseModel):
+    date_of_birth: date
+    gender: Gender
+    phone: str
+    blood_group: Optional[BloodGroup] = None
+    address: Optional[str] = None
+    emergency_contact: Optional[str] = None
+    emergency_contact_name: Optional[str] = None
+    id: int
+    patient_id: str
+    user: UserResponse
+    
+    class Config:
+        from_attributes = True
+
+class ImportRowError(BaseModel):
+    row: int
+    errors: List[str]
+
+class PatientImportReport(BaseModel):
+    total: int
+    imported: int
+    failed: int
+    errors: List[ImportRowError]
+    
+    class Config:
+        from_attributes = True
+
 # Doctor Schemas
 class DoctorBase(BaseModel):
     specialization: str
@@ -96,6 +131,15 @@ class DoctorResponse(DoctorBase):
     class Config:
         from_attributes = True
 
+class SpecializationCount(BaseModel):
+    id: int
+    name: str
+    doctor_count: int
+
+class AvailableSlot(BaseModel):
+    start: datetime
+    end: datetime
+
 # Appointment Schemas
 class AppointmentBase(BaseModel):
     appointment_date: datetime
@@ -104,6 +148,9 @@ class AppointmentBase(BaseModel):
 class AppointmentCreate(AppointmentBase):
     doctor_id: int
 
+    # Stored and compared as naive UTC, whatever offset the client sent
+    _naive_date = field_validator("appointment_date")(naive_utc)
+
 class AppointmentUpdate(BaseModel):
     appointment_date: Optional[datetime] = None
     status: Optional[AppointmentStatus] = None
@@ -111,9 +158,13 @@ class AppointmentUpdate(BaseModel):
     prescription: Optional[str] = None
     diagnosis: Optional[str] = None
 
+    _naive_date = field_validator("appointment_date")(naive_utc)
+
 class AppointmentResponse(AppointmentBase):
     id: int
     appointment_number: str
+    patient_id: int
+    doctor_id: int
     status: AppointmentStatus
     notes: Optional[str] = None
     prescription: Optional[str] = None
@@ -123,6 +174,56 @@ class AppointmentResponse(AppointmentBase):
     class Config:
         from_attributes = True
 
+class AppointmentSummary(AppointmentBase):
+    id: int
+    appointment_number: str
+    patient_id: int
+    doctor_id: int
+    status: AppointmentStatus
+    created_at: datetime
+    # Whether notes, prescription or diagnosis is filled in
+    has_clinical_notes: bool
+    
+    class Config:
+        from_attributes = True
+
+# Dashboard Schemas
+class StatsSummary(BaseModel):
+    # "all", or the doctor's or patient's own appointments
+    scope: str
+    appointments_by_status: Dict[AppointmentStatus, int]
+    appointments_total: int
+    appointments_today: int
+    doctors: int
+    patients: Optional[int] = None
+
+# Analytics Schemas
+class AppointmentOutcomes(BaseModel):
+    pending: int
+    confirmed: int
+    completed: int
+    cancelled: int
+    no_show: int
+    expired: int
+    total: int
+    # Neither cancelled nor expired
+    booked: int
+    completion_rate: Optional[float] = None
+    no_show_rate: Optional[float] = None
+
+class DoctorUtilization(AppointmentOutcomes):
+    doctor_id: int
+    doctor_number: str
+    full_name: str
+    # Slots in the range under the doctor's current working hours
+    capacity: int
+    utilization: Optional[float] = None
+
+class SlotOutcomes(AppointmentOutcomes):
+    # 0 = Monday
+    weekday: int
+    hour: int
+
 # Login Schema
 class UserLogin(BaseModel):
     email: EmailStr
@@ -0,0 +1,446 @@
+"""Reminders and overdue transitions for appointments, run on an in-process timeline.
+
+Three kinds of job act on appointments as time passes:
+
+- `reminder:<hours>h` queues a reminder email APPOINTMENT_REMINDER_HOURS before each
+  pending or confirmed appointment (only when SMTP_HOST is set);
+- `no_show` marks confirmed appointments NO_SHOW once NO_SHOW_AFTER_MINUTES past their start;
+- `expiry` marks pending appointments nobody confirmed EXPIRED, PENDING_EXPIRY_AFTER_MINUTES
+  past their start, and emails the patient (only when SMTP_HOST is set).
+
+Transitions only look back SCHEDULER_LOOKBACK_DAYS from the moment an appointment
+fell due, so the first run against an old database does not rewrite years of
+history; `python -m app.cli run-scheduler --lookback-days N` sweeps further back once.
+
+Each job works in chunks of SCHEDULER_CHUNK_SIZE, one transaction per chunk: an
+indexed range query on appointment_date picks the chunk, then a single bulk UPDATE
+moves its statuses, or a multi-row INSERT puts its emails in the outbox. Bulk
+UPDATEs bypass the mapper events, so the transitions apply the stat counter and
+rollup deltas of the rows they changed themselves.
+
+`AppointmentScheduler` decides when to run them. It loads the times at which jobs
+fall due over the next SCHEDULER_RELOAD_SECONDS into a heap, from one range query on
+appointment_date, sleeps until the earliest, runs the jobs due then, and reloads
+once the window is used up. Appointments booked or moved meanwhile are picked up at
+the next reload.
+
+Only the process holding the `scheduler_leases` row runs jobs. Every job
+transaction first renews the lease with an UPDATE that matches only while this
+process still holds it, so a holder that stalled and was replaced commits nothing;
+the other processes retry as the lease would lapse. Transitions only match
+appointments still pending or confirmed, and each reminder job commits its
+checkpoint with its batch, so a restart or a takeover carries on where the last
+holder stopped: reminders missed meanwhile go out late if the appointment has not
+started yet, and none goes out twice.
+"""
+import asyncio
+import heapq
+import os
+import socket
+import uuid
+from collections import Counter
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Callable, List, Optional, Tuple
+from sqlalchemy import Select, and_, insert, or_, select, update
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import aliased
+from ..config import settings
+from ..models.appointment import Appointment, AppointmentStatus
+from ..models.doctor import Doctor
+from ..models.notification import Notification
+from ..models.patient import Patient
+from ..models.scheduler import SchedulerCheckpoint, SchedulerLease
+from ..models.user import User
+from .counters import upsert_counts
+from .notifications import EXPIRED, REMINDER, notification_worker, notifications_enabled, outbox_rows
+from .rollups import apply_rollup_deltas, rollup_counts
+from .stats import appointment_counts, apply_deltas
+
+LEASE_NAME = "appointment_scheduler"
+NO_SHOW = "no_show"
+EXPIRY = "expiry"
+
+ACTIVE = (AppointmentStatus.PENDING, AppointmentStatus.CONFIRMED)
+
+# expires_at of a lease nobody holds
+_FREE = datetime(1970, 1, 1)
+
+class LeaseLost(Exception):
+    """Another process holds the scheduler lease."""
+
+def lease_holder_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+def _ensure_lease(connection: Connection) -> None:
+    row = {"name": LEASE_NAME, "holder": None, "expires_at": _FREE}
+    dialect = connection.dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        insert_row = postgresql_insert if dialect == "postgresql" else sqlite_insert
+        connection.execute(insert_row(SchedulerLease).values(**row).on_conflict_do_nothing(index_elements=["name"]))
+    elif connection.scalar(select(SchedulerLease.name).where(SchedulerLease.name == LEASE_NAME)) is None:
+        connection.execute(insert(SchedulerLease).values(**row))
+
+def acquire_lease(connection: Connection, holder: str, seconds: float, now: Optional[datetime] = None) -> bool:
+    """Take the lease if it is free or has lapsed, or extend it if `holder` has it; True when held."""
+    now = now or datetime.utcnow()
+    _ensure_lease(connection)
+    return connection.execute(
+        update(SchedulerLease)
+        .where(SchedulerLease.name == LEASE_NAME, or_(SchedulerLease.holder == holder, SchedulerLease.expires_at < now))
+        .values(holder=holder, expires_at=now + timedelta(seconds=seconds))
+    ).rowcount == 1
+
+def renew_lease(connection: Connection, holder: str, seconds: float, now: Optional[datetime] = None) -> None:
+    """Extend the lease `holder` has; raises LeaseLost, so the caller's transaction rolls back, if it moved on."""
+    now = now or datetime.utcnow()
+    renewed = connection.execute(
+        update(SchedulerLease)
+        .where(SchedulerLease.name == LEASE_NAME, SchedulerLease.holder == holder)
+        .values(expires_at=now + timedelta(seconds=seconds))
+    ).rowcount
+    if renewed != 1:
+        raise LeaseLost(LEASE_NAME)
+
+def release_lease(connection: Connection, holder: str) -> None:
+    # Lets a standby take over at its next attempt instead of waiting out the lease
+    connection.execute(
+        update(SchedulerLease)
+        .where(SchedulerLease.name == LEASE_NAME, SchedulerLease.holder == holder)
+        .values(expires_at=_FREE)
+    )
+
+@dataclass(frozen=True)
+class Transition:
+    job: str
+    source: AppointmentStatus
+    target: AppointmentStatus
+    # How long past its start an appointment still in `source` moves to `target`
+    after: timedelta
+    # Outbox kind queued for each appointment moved, if any
+    notify: Optional[str] = None
+
+def transitions() -> List[Transition]:
+    return [
+        Transition(
+            NO_SHOW, AppointmentStatus.CONFIRMED, AppointmentStatus.NO_SHOW,
+            timedelta(minutes=settings.NO_SHOW_AFTER_MINUTES)
+        ),
+        Transition(
+            EXPIRY, AppointmentStatus.PENDING, AppointmentStatus.EXPIRED,
+            timedelta(minutes=settings.PENDING_EXPIRY_AFTER_MINUTES), notify=EXPIRED
+        ),
+    ]
+
+def default_lookback() -> timedelta:
+    return timedelta(days=settings.SCHEDULER_LOOKBACK_DAYS)
+
+def reminder_job(hours: float) -> str:
+    return f"reminder:{hours:g}h"
+
+def reminder_offsets() -> List[Tuple[str, timedelta]]:
+    """(job, how long before the appointment) for each reminder; none unless notifications are on."""
+    if not notifications_enabled():
+        return []
+    return [(reminder_job(hours), timedelta(hours=hours)) for hours in sorted(settings.APPOINTMENT_REMINDER_HOURS)]
+
+def scheduled_jobs() -> List[str]:
+    return [job for job, _ in reminder_offsets()] + [transition.job for transition in transitions()]
+
+def overdue_query(transition: Transition, since: datetime, cutoff: datetime, limit: int) -> Select:
+    return (
+        select(Appointment.id)
+        .where(
+            Appointment.status == transition.source,
+            Appointment.appointment_date >= since,
+            Appointment.appointment_date <= cutoff
+        )
+        .order_by(Appointment.appointment_date)
+        .limit(limit)
+    )
+
+def contacts_query() -> Select:
+    """Appointments' id, number and date with the patient's and the doctor's email and name."""
+    patient_user, doctor_user = aliased(User), aliased(User)
+    return (
+        select(
+            Appointment.id, Appointment.appointment_number, Appointment.appointment_date,
+            patient_user.email, patient_user.full_name, doctor_user.email, doctor_user.full_name
+        )
+        .outerjoin(Patient, Patient.id == Appointment.patient_id)
+        .outerjoin(patient_user, patient_user.id == Patient.user_id)
+        .outerjoin(Doctor, Doctor.id == Appointment.doctor_id)
+        .outerjoin(doctor_user, doctor_user.id == Doctor.user_id)
+    )
+
+def queue_emails(connection: Connection, kind: str, rows: List[Any], now: datetime) -> int:
+    """Insert the outbox rows for `kind` about each contacts_query() row; returns how many."""
+    emails = [
+        message
+        for appointment_id, number, appointment_date, patient_email, patient_name, doctor_email, doctor_name in rows
+        for message in outbox_rows(
+            kind, appointment_id, number, appointment_date,
+            (patient_email, patient_name) if patient_email else None,
+            (doctor_email, doctor_name) if doctor_email else None,
+            now
+        )
+    ]
+    if emails:
+        connection.execute(insert(Notification), emails)
+    return len(emails)
+
+def transition_chunk(
+    connection: Connection,
+    transition: Transition,
+    limit: int,
+    now: datetime,
+    lookback: Optional[timedelta] = None
+) -> Tuple[int, int]:
+    """Move up to `limit` overdue appointments from `source` to `target` with one UPDATE.
+
+    Only appointments that fell due within `lookback` (SCHEDULER_LOOKBACK_DAYS by default)
+    are moved. Returns (appointments moved, emails queued).
+    """
+    cutoff = now - transition.after
+    since = cutoff - (lookback if lookback is not None else default_lookback())
+    overdue = overdue_query(transition, since, cutoff, limit)
+    if connection.dialect.name == "postgresql":
+        # Rows a request is updating right now are left for the next chunk
+        overdue = overdue.with_for_update(skip_locked=True)
+    rows = connection.execute(
+        update(Appointment)
+        # Repeated outside the subquery: a row changed since it was picked keeps its new status
+        .where(
+            Appointment.id.in_(overdue.scalar_subquery()),
+            Appointment.status == transition.source,
+            Appointment.appointment_date <= cutoff
+        )
+        .values(status=transition.target, updated_at=now)
+        .returning(Appointment.id, Appointment.patient_id, Appointment.doctor_id, Appointment.appointment_date)
+    ).all()
+    counts: Counter = Counter()
+    rollups: Counter = Counter()
+    for _, patient_id, doctor_id, appointment_date in rows:
+        counts.update(appointment_counts(patient_id, doctor_id, transition.target, appointment_date))
+        counts.subtract(appointment_counts(patient_id, doctor_id, transition.source, appointment_date))
+        rollups.update(rollup_counts(doctor_id, transition.target, appointment_date))
+        rollups.subtract(rollup_counts(doctor_id, transition.source, appointment_date))
+    apply_deltas(connection, counts)
+    apply_rollup_deltas(connection, rollups)
+    emails = 0
+    if rows and transition.notify is not None and notifications_enabled():
+        # Bulk UPDATEs skip the mapper events that queue mail, so queue it here, in the same transaction
+        contacts = connection.execute(contacts_query().where(Appointment.id.in_([row.id for row in rows]))).all()
+        emails = queue_emails(connection, transition.notify, contacts, now)
+    return len(rows), emails
+
+def reminders_query(after: Tuple[datetime, int], until: datetime, limit: int) -> Select:
+    """Active appointments past the (appointment_date, id) position `after`, up to `until`, with contacts."""
+    after_date, after_id = after
+    return (
+        contacts_query()
+        .where(
+            Appointment.status.in_(ACTIVE),
+            Appointment.appointment_date <= until,
+            or_(
+                Appointment.appointment_date > after_date,
+                and_(Appointment.appointment_date == after_date, Appointment.id > after_id)
+            )
+        )
+        .order_by(Appointment.appointment_date, Appointment.id)
+        .limit(limit)
+    )
+
+def reminder_chunk(connection: Connection, job: str, offset: timedelta, limit: int, now: datetime) -> Tuple[int, int]:
+    """Queue reminders for up to `limit` appointments now within `offset`; returns (appointments, emails)."""
+    checkpoint = connection.execute(
+        select(SchedulerCheckpoint.appointment_date, SchedulerCheckpoint.appointment_id)
+        .where(SchedulerCheckpoint.job == job)
+    ).first()
+    # A job seen for the first time starts from now; appointments that have started get no reminder
+    position = max(tuple(checkpoint) if checkpoint is not None else (now + offset, 0), (now, 0))
+    rows = connection.execute(reminders_query(position, now + offset, limit)).all()
+    emails = queue_emails(connection, REMINDER, rows, now)
+    done = (rows[-1].appointment_date, rows[-1].id) if rows else position
+    if len(rows) < limit:
+        # Caught up; appointments booked inside the offset from here on get no reminder
+        done = max(done, (now + offset, 0))
+    upsert_counts(connection, SchedulerCheckpoint, ["job"], ["appointment_date", "appointment_id", "updated_at"], [
+        {"job": job, "appointment_date": done[0], "appointment_id": done[1], "updated_at": now}
+    ], add=False)
+    return len(rows), emails
+
+def _windows() -> List[Tuple[str, Tuple[AppointmentStatus, ...], timedelta]]:
+    # (job, statuses it acts on, when it falls due relative to the appointment's start)
+    windows = [(job, ACTIVE, -offset) for job, offset in reminder_offsets()]
+    return windows + [(transition.job, (transition.source,), transition.after) for transition in transitions()]
+
+def timeline_query(now: datetime, until: datetime) -> Select:
+    """Distinct (appointment_date, status) of the appointments some job falls due for in (now, until]."""
+    return select(Appointment.appointment_date, Appointment.status).distinct().where(
+        Appointment.status.in_(ACTIVE),
+        or_(*(
+            and_(Appointment.appointment_date > now - lead, Appointment.appointment_date <= until - lead)
+            for _, _, lead in _windows()
+        ))
+    )
+
+def due_times(connection: Connection, now: datetime, until: datetime) -> List[Tuple[datetime, str]]:
+    """(when, job) for each time in (now, until] some job falls due."""
+    windows = _windows()
+    return sorted({
+        (appointment_date + lead, job)
+        for appointment_date, status in connection.execute(timeline_query(now, until))
+        for job, statuses, lead in windows
+        if status in statuses and now < appointment_date + lead <= until
+    })
+
+@dataclass
+class RunReport:
+    reminders: int = 0
+    no_shows: int = 0
+    expired: int = 0
+
+@dataclass
+class SchedulerStats(RunReport):
+    runs: int = 0
+    errors: int = 0
+    # 1 while this process holds the lease
+    leader: int = 0
+
+class AppointmentScheduler:
+    def __init__(self):
+        self.holder = lease_holder_id()
+        self.stats = SchedulerStats()
+        self._heap: List[Tuple[datetime, str]] = []
+        self._reload_at: Optional[datetime] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def _chunk(
+        self, connection: Connection, job: str, now: datetime, lookback: Optional[timedelta] = None
+    ) -> Tuple[int, int]:
+        """One chunk of `job` under the lease; returns (appointments handled, emails queued)."""
+        renew_lease(connection, self.holder, settings.SCHEDULER_LEASE_SECONDS)
+        limit = settings.SCHEDULER_CHUNK_SIZE
+        for transition in transitions():
+            if transition.job == job:
+                return transition_chunk(connection, transition, limit, now, lookback)
+        for reminder, offset in reminder_offsets():
+            if reminder == job:
+                return reminder_chunk(connection, job, offset, limit, now)
+        return 0, 0
+
+    @staticmethod
+    def _record(report: RunReport, job: str, handled: int, emails: int) -> None:
+        if job == NO_SHOW:
+            report.no_shows += handled
+        elif job == EXPIRY:
+            report.expired += handled
+        else:
+            report.reminders += emails
+
+    def run_once(
+        self, bind: Engine, now: Optional[datetime] = None, lookback: Optional[timedelta] = None
+    ) -> RunReport:
+        """Run every job to completion, synchronously; for `python -m app.cli run-scheduler`.
+
+        `lookback` overrides SCHEDULER_LOOKBACK_DAYS for the transitions.
+        """
+        now = now or datetime.utcnow()
+        with bind.begin() as connection:
+            if not acquire_lease(connection, self.holder, settings.SCHEDULER_LEASE_SECONDS, now):
+                raise LeaseLost(LEASE_NAME)
+        report = RunReport()
+        try:
+            for job in scheduled_jobs():
+                while True:
+                    with bind.begin() as connection:
+                        handled, emails = self._chunk(connection, job, now, lookback)
+                    self._record(report, job, handled, emails)
+                    if handled < settings.SCHEDULER_CHUNK_SIZE:
+                        break
+        finally:
+            with bind.begin() as connection:
+                release_lease(connection, self.holder)
+        return report
+
+    async def _transaction(self, function: Callable[..., Any], *args: Any) -> Any:
+        from ..database import async_engine
+
+        async with async_engine.begin() as connection:
+            return await connection.run_sync(function, *args)
+
+    async def _run_jobs(self, jobs: List[str], now: datetime) -> None:
+        queued = 0
+        for job in jobs:
+            while True:
+                handled, emails = await self._transaction(self._chunk, job, now)
+                self._record(self.stats, job, handled, emails)
+                queued += emails
+                if handled < settings.SCHEDULER_CHUNK_SIZE:
+                    break
+        self.stats.runs += 1
+        if queued:
+            notification_worker.wake()
+
+    async def _step(self) -> float:
+        """Take or keep the lease and run whatever is due; returns seconds until the next step."""
+        lease = settings.SCHEDULER_LEASE_SECONDS
+        now = datetime.utcnow()
+        if not self.stats.leader:
+            if not await self._transaction(acquire_lease, self.holder, lease, now):
+                return lease / 3
+            self.stats.leader = 1
+            # New holder: catch up on everything due, then plan
+            self._reload_at = now
+        if now >= self._reload_at:
+            await self._run_jobs(scheduled_jobs(), now)
+            until = now + timedelta(seconds=settings.SCHEDULER_RELOAD_SECONDS)
+            self._heap = await self._transaction(due_times, now, until)
+            heapq.heapify(self._heap)
+            self._reload_at = until
+        else:
+            due = set()
+            while self._heap and self._heap[0][0] <= now:
+                due.add(heapq.heappop(self._heap)[1])
+            if due:
+                await self._run_jobs([job for job in scheduled_jobs() if job in due], now)
+            else:
+                await self._transaction(renew_lease, self.holder, lease)
+        wake_at = min(self._heap[0][0], self._reload_at) if self._heap else self._reload_at
+        # Wake in time to renew the lease, whatever is due
+        return min(max((wake_at - datetime.utcnow()).total_seconds(), 0.0), lease / 3)
+
+    async def _run_forever(self) -> None:
+        while True:
+            try:
+                delay = await self._step()
+            except LeaseLost:
+                self.stats.leader = 0
+                self._heap = []
+                delay = 0.0
+            except Exception:
+                self.stats.errors += 1
+                delay = settings.SCHEDULER_LEASE_SECONDS / 3
+            await asyncio.sleep(delay)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run_forever())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self.stats.leader:
+            self.stats.leader = 0
+            self._heap = []
+            await self._transaction(release_lease, self.holder)
+
+appointment_scheduler = AppointmentScheduler()
@@ -0,0 +1,245 @@
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, List
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+from sqlalchemy import Select, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from ..database import AsyncSessionLocal, async_engine
+from ..models.appointment import Appointment
+from ..models.doctor import Doctor
+from ..models.patient import Patient
+from ..models.user import User
+from .fast_json import RowSerializer
+
+@dataclass
+class SerializationCase:
+    name: str
+    # The endpoint's previous ORM query, and its row query on the fast path
+    orm_query: Callable[[], Select]
+    row_query: Callable[[], Select]
+    rows: RowSerializer
+
+@dataclass
+class SerializationResult:
+    name: str
+    rows: int
+    # Milliseconds per page
+    fetch_before: float
+    fetch_after: float
+    serialize_before: float
+    serialize_after: float
+
+    @property
+    def speedup(self) -> float:
+        before = self.fetch_before + self.serialize_before
+        after = self.fetch_after + self.serialize_after
+        return before / after if after else 0.0
+
+def _cases() -> List[SerializationCase]:
+    from ..api.appointments import appointment_rows
+    from ..api.doctors import doctor_rows
+    from ..api.patients import patient_rows
+
+    return [
+        SerializationCase(
+            "GET /api/patients/",
+            lambda: select(Patient).options(selectinload(Patient.user)).order_by(Patient.id),
+            lambda: patient_rows.select().join(User, Patient.user_id == User.id).order_by(Patient.id),
+            patient_rows
+        ),
+        SerializationCase(
+            "GET /api/doctors/",
+            lambda: select(Doctor).options(selectinload(Doctor.user)).order_by(Doctor.id),
+            lambda: doctor_rows.select().join(User, Doctor.user_id == User.id).order_by(Doctor.id),
+            doctor_rows
+        ),
+        SerializationCase(
+            "GET /api/appointments/",
+            lambda: select(Appointment).order_by(Appointment.appointment_date.desc(), Appointment.id.desc()),
+            lambda: appointment_rows.select().order_by(Appointment.appointment_date.desc(), Appointment.id.desc()),
+            appointment_rows
+        ),
+    ]
+
+async def _per_call(call: Callable[[], Awaitable[Any]], repeat: int) -> float:
+    # Best of three rounds, in milliseconds per call
+    best = float("inf")
+    for _ in range(3):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            await call()
+        best = min(best, (time.perf_counter() - start) / repeat * 1000)
+    return best
+
+async def _run(limit: int, repeat: int) -> List[SerializationResult]:
+    results = []
+    try:
+        async with AsyncSessionLocal() as db:
+            for case in _cases():
+                field = create_response_field(name="benchmark", type_=List[case.rows.schema])
+
+                async def fetch_objects(db: AsyncSession = db) -> List[Any]:
+                    db.expunge_all()
+                    return (await db.scalars(case.orm_query().limit(limit))).all()
+
+                async def fetch_rows(db: AsyncSession = db) -> List[Any]:
+                    return (await db.execute(case.row_query().limit(limit))).all()
+
+                objects = await fetch_objects()
+                rows = await fetch_rows()
+
+                async def before() -> bytes:
+                    # What FastAPI does with a response_model: validate, dump to Python, json.dumps
+                    content = await serialize_response(field=field, response_content=objects)
+                    return JSONResponse(content).body
+
+                async def after() -> bytes:
+                    return case.rows.dump(rows)
+
+                if await before() != await after():
+                    raise AssertionError(f"{case.name}: fast path output differs")
+                results.append(SerializationResult(
+                    case.name,
+                    len(rows),
+                    await _per_call(fetch_objects, repeat),
+                    await _per_call(fetch_rows, repeat),
+                    await _per_call(before, repeat),
+                    await _per_call(after, repeat),
+                ))
+    finally:
+        # aiosqlite connections run on their own threads, which would keep the process alive
+        await async_engine.dispose()
+    return results
+
+def benchmark_serialization(limit: int = 100, repeat: int = 50) -> List[SerializationResult]:
+    """Time fetching and serializing one page of each list endpoint, before and after the fast path."""
+    return asyncio.run(_run(limit, repeat))
+
+@dataclass
+class FieldSetResult:
+    endpoint: str
+    view: str
+    rows: int
+    # Response body size, and milliseconds to fetch and serialize the page
+    bytes: int
+    milliseconds: float
+
+async def _fieldsets_run(limit: int, repeat: int) -> List[FieldSetResult]:
+    from datetime import datetime
+    from ..api.appointments import appointment_fields, appointment_rows, appointment_summary_rows
+    from ..api.patients import patient_fields, patient_rows, patient_summary_rows
+
+    # Past appointments, where the clinical text is; newest first like the list
+    past = Appointment.appointment_date < datetime.utcnow()
+    by_date = (Appointment.appointment_date.desc(), Appointment.id.desc())
+    appointment_subset = appointment_fields.rows(appointment_fields.parse("id,appointment_date,status"))
+    patient_subset = patient_fields.rows(patient_fields.parse("id,patient_id"))
+    cases = [
+        ("GET /api/appointments/", "all columns (old default)", lambda: appointment_rows.select().where(past).order_by(*by_date), appointment_rows),
+        ("GET /api/appointments/", "summary (default)", lambda: appointment_summary_rows.select().where(past).order_by(*by_date), appointment_summary_rows),
+        ("GET /api/appointments/", "fields=id,appointment_date,status", lambda: appointment_subset.select().where(past).order_by(*by_date), appointment_subset),
+        ("GET /api/patients/", "all columns (old default)", lambda: patient_rows.select().join(User, Patient.user_id == User.id).order_by(Patient.id), patient_rows),
+        ("GET /api/patients/", "summary (default)", lambda: patient_summary_rows.select().join(User, Patient.user_id == User.id).order_by(Patient.id), patient_summary_rows),
+        ("GET /api/patients/", "fields=id,patient_id", lambda: patient_subset.select().order_by(Patient.id), patient_subset),
+    ]
+    results = []
+    try:
+        async with AsyncSessionLocal() as db:
+            for endpoint, view, query, rows_for in cases:
+
+                async def page(query=query, rows_for=rows_for) -> bytes:
+                    rows = (await db.execute(query().limit(limit))).all()
+                    return rows_for.dump(rows)
+
+                body = await page()
+                rows = len((await db.execute(query().limit(limit))).all())
+                results.append(FieldSetResult(endpoint, view, rows, len(body), await _per_call(page, repeat)))
+    finally:
+        await async_engine.dispose()
+    return results
+
+def benchmark_fieldsets(limit: int = 100, repeat: int = 20) -> List[FieldSetResult]:
+    """Bytes and time per list page for the full rows, the summary view and a sparse fieldset."""
+    return asyncio.run(_fieldsets_run(limit, repeat))
+
+@dataclass
+class AuthResult:
+    mode: str
+    requests: int
+    seconds: float
+    # Statements per request, all of them authentication
+    queries: float
+
+    @property
+    def throughput(self) -> float:
+        return self.requests / self.seconds if self.seconds else 0.0
+
+async def _auth_run(requests: int, concurrency: int) -> List[AuthResult]:
+    import httpx
+    from ..config import settings
+    from ..main import app
+    from .principal_cache import principal_cache
+    from .query_counts import count_queries
+    from .revocations import token_revocations
+    from .security import create_access_token, create_token_pair
+
+    async with AsyncSessionLocal() as db:
+        row = (await db.execute(
+            select(User, Patient.id, Doctor.id)
+            .outerjoin(Patient, Patient.user_id == User.id)
+            .outerjoin(Doctor, Doctor.user_id == User.id)
+            .where(User.is_active.is_(True))
+            .order_by(User.id)
+            .limit(1)
+        )).first()
+    if row is None:
+        raise RuntimeError("No active user to authenticate as")
+    user, patient_id, doctor_id = row
+    async with async_engine.connect() as connection:
+        await connection.run_sync(token_revocations.load)
+    classic = create_access_token({"sub": user.email})
+    stateless = create_token_pair(user, patient_id, doctor_id)["access_token"]
+    modes = [
+        # (name, token, stateless mode, principal cache size)
+        ("database", classic, False, 0),
+        ("principal cache", classic, False, principal_cache.maxsize),
+        ("stateless claims", stateless, True, principal_cache.maxsize),
+    ]
+    saved = settings.STATELESS_AUTH, principal_cache.maxsize
+    results = []
+    transport = httpx.ASGITransport(app=app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+            for name, token, stateless_mode, cache_size in modes:
+                settings.STATELESS_AUTH = stateless_mode
+                principal_cache.maxsize = cache_size
+                principal_cache.clear()
+                headers = {"Authorization": f"Bearer {token}"}
+                remaining = [requests]
+
+                async def worker() -> None:
+                    while remaining[0] > 0:
+                        remaining[0] -= 1
+                        response = await client.get("/api/auth/me", headers=headers)
+                        if response.status_code != 200:
+                            raise AssertionError(f"{name}: GET /api/auth/me returned {response.status_code}")
+
+                for _ in range(20):
+                    await client.get("/api/auth/me", headers=headers)
+                with count_queries(async_engine) as counter:
+                    started = time.perf_counter()
+                    await asyncio.gather(*(worker() for _ in range(concurrency)))
+                    elapsed = time.perf_counter() - started
+                results.append(AuthResult(name, requests, elapsed, counter.count / requests))
+    finally:
+        settings.STATELESS_AUTH, principal_cache.maxsize = saved
+        await async_engine.dispose()
+    return results
+
+def benchmark_auth(requests: int = 2000, concurrency: int = 10) -> List[AuthResult]:
+    """Throughput of GET /api/auth/me authenticated from the database, the principal cache and token claims."""
+    return asyncio.run(_auth_run(requests, concurrency))
@@ -0,0 +1,49 @@
+from typing import Any, Dict, Iterable, List, Sequence, Tuple
+from sqlalchemy import inspect, update
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Connection
+
+def upsert_counts(
+    connection: Connection,
+    model,
+    keys: Sequence[str],
+    counts: Sequence[str],
+    rows: Iterable[Dict[str, Any]],
+    add: bool = True
+) -> None:
+    """Insert `rows`, or on a key conflict add their `counts` to the stored ones (set them if not `add`)."""
+    rows = list(rows)
+    if not rows:
+        return
+    dialect = connection.dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        insert = postgresql_insert if dialect == "postgresql" else sqlite_insert
+        statement = insert(model)
+        connection.execute(
+            statement.on_conflict_do_update(index_elements=list(keys), set_={
+                name: getattr(model, name) + statement.excluded[name] if add else statement.excluded[name]
+                for name in counts
+            }),
+            rows
+        )
+        return
+    for row in rows:
+        result = connection.execute(
+            update(model)
+            .where(*(getattr(model, name) == row[name] for name in keys))
+            .values({name: getattr(model, name) + row[name] if add else row[name] for name in counts})
+        )
+        if result.rowcount == 0:
+            connection.execute(model.__table__.insert(), [row])
+
+def before_and_after(target, fields: Iterable[str]) -> Tuple[List[Any], List[Any]]:
+    """Values of `fields` as loaded and as about to be written, for after_update listeners."""
+    before, after = [], []
+    state = inspect(target)
+    for field in fields:
+        history = state.attrs[field].history
+        current = getattr(target, field)
+        after.append(current)
+        before.append(history.deleted[0] if history.deleted else current)
+    return before, after
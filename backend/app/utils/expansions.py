@@ -0,0 +1,109 @@
+"""Related records in one round trip: `?expand=doctor,patient` and the batch endpoints.
+
+An expanded relation is loaded with a single `IN` query over the ids on the page,
+never one query per item, and nested under the relation's name. The batch
+endpoints (`GET /doctors/batch?ids=1,2,3`) run the same queries for ids the
+client already holds.
+"""
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Callable, Collection, Dict, List, Optional, Sequence, Tuple
+from fastapi import HTTPException, status
+from pydantic import BaseModel, TypeAdapter, create_model
+from sqlalchemy import Select
+from sqlalchemy.ext.asyncio import AsyncSession
+from .fast_json import RowSerializer
+
+# Ids per batch request, and so per IN list
+MAX_BATCH_IDS = 100
+
+EXPAND_DESCRIPTION = "Comma-separated related records to embed, e.g. doctor,patient"
+
+def parse_ids(ids: str, limit: int = MAX_BATCH_IDS) -> List[int]:
+    """Comma-separated ids, deduplicated in the order given."""
+    try:
+        parsed = list(dict.fromkeys(int(part) for part in ids.split(",") if part.strip()))
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="ids must be comma-separated integers"
+        )
+    if not parsed or len(parsed) > limit:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Give between 1 and {limit} ids"
+        )
+    return parsed
+
+@dataclass
+class Relation:
+    name: str
+    # Foreign key on the outer row, e.g. Appointment.doctor_id
+    key: Any
+    rows: RowSerializer
+    # ids -> query selecting `rows.columns` for those ids
+    query: Callable[[Collection[int]], Select]
+
+    async def load(self, db: AsyncSession, ids: Collection[int]) -> Dict[int, BaseModel]:
+        if not ids:
+            return {}
+        rows = (await db.execute(self.query(ids))).all()
+        return {row.id: model for row, model in zip(rows, self.rows.models(rows))}
+
+class Expansions:
+    def __init__(self, *relations: Relation, maxsize: int = 32):
+        self.relations = {relation.name: relation for relation in relations}
+        self.model = lru_cache(maxsize)(self._model)
+        self._adapters = lru_cache(maxsize)(lambda model: TypeAdapter(List[model]))
+
+    def parse(self, expand: Optional[str]) -> Tuple[str, ...]:
+        names = {name.strip() for name in (expand or "").split(",") if name.strip()}
+        unknown = sorted(names - set(self.relations))
+        if unknown:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Cannot expand {', '.join(unknown)}; choose from {', '.join(self.relations)}"
+            )
+        return tuple(name for name in self.relations if name in names)
+
+    def _model(self, schema: type, names: Tuple[str, ...]) -> type:
+        return create_model(
+            f"{schema.__name__}Expanded",
+            __base__=schema,
+            **{name: (Optional[self.relations[name].rows.schema], None) for name in names}
+        )
+
+    async def attach(
+        self,
+        db: AsyncSession,
+        names: Tuple[str, ...],
+        items: Sequence[BaseModel],
+        sources: Sequence[Any]
+    ) -> List[BaseModel]:
+        """`items` with the relations nested; `sources[i]` (row or object) holds the keys of `items[i]`."""
+        if not items:
+            return []
+        related = {}
+        for name in names:
+            attribute = self.relations[name].key.key
+            ids = {getattr(source, attribute) for source in sources} - {None}
+            related[name] = (attribute, await self.relations[name].load(db, ids))
+        model = self.model(type(items[0]), names)
+        return [
+            model.model_construct(**item.__dict__, **{
+                name: loaded.get(getattr(source, attribute)) for name, (attribute, loaded) in related.items()
+            })
+            for item, source in zip(items, sources)
+        ]
+
+    async def dump(self, db: AsyncSession, names: Tuple[str, ...], rows_for: RowSerializer, rows: Sequence[Any]) -> bytes:
+        if not names:
+            return rows_for.dump(rows)
+        items = await self.attach(db, names, rows_for.models(rows), rows)
+        return self._adapters(self.model(rows_for.schema, names)).dump_json(items)
+
+    async def dump_one(self, db: AsyncSession, names: Tuple[str, ...], item: BaseModel, source: Any) -> bytes:
+        if not names:
+            return item.model_dump_json().encode()
+        expanded, = await self.attach(db, names, [item], [source])
+        return expanded.model_dump_json().encode()
@@ -0,0 +1,147 @@
+import csv
+import enum
+import io
+import json
+from datetime import date, datetime
+from typing import Any, AsyncIterator, Callable, List, Optional, Sequence, Tuple
+from fastapi import HTTPException, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import Select, select
+from ..config import settings
+from ..database import AsyncSessionLocal
+from ..models.appointment import Appointment
+from ..models.patient import Patient
+from ..models.user import User
+from .scheduling import naive_utc
+
+class ExportFormat(str, enum.Enum):
+    CSV = "csv"
+    NDJSON = "ndjson"
+
+MEDIA_TYPES = {
+    ExportFormat.CSV: "text/csv",
+    ExportFormat.NDJSON: "application/x-ndjson",
+}
+
+# Plain columns rather than ORM entities: no identity map, nothing kept per row
+APPOINTMENT_COLUMNS = [
+    Appointment.id,
+    Appointment.appointment_number,
+    Appointment.patient_id,
+    Appointment.doctor_id,
+    Appointment.appointment_date,
+    Appointment.status,
+    Appointment.reason,
+    Appointment.notes,
+    Appointment.prescription,
+    Appointment.diagnosis,
+    Appointment.created_at,
+    Appointment.updated_at,
+]
+
+PATIENT_COLUMNS = [
+    Patient.id,
+    Patient.patient_id,
+    User.email,
+    User.username,
+    User.full_name,
+    User.is_active,
+    User.created_at,
+    Patient.date_of_birth,
+    Patient.gender,
+    Patient.blood_group,
+    Patient.phone,
+    Patient.address,
+    Patient.emergency_contact,
+    Patient.emergency_contact_name,
+    Patient.medical_history,
+    Patient.allergies,
+    Patient.current_medications,
+]
+
+def check_range(
+    date_from: Optional[datetime],
+    date_to: Optional[datetime]
+) -> Tuple[Optional[datetime], Optional[datetime]]:
+    """The range as the naive UTC the columns hold, so bounds with an offset compare correctly."""
+    date_from, date_to = naive_utc(date_from), naive_utc(date_to)
+    if date_from is not None and date_to is not None and date_from >= date_to:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="date_from must be before date_to"
+        )
+    return date_from, date_to
+
+def appointments_query(date_from: Optional[datetime], date_to: Optional[datetime]) -> Select:
+    # [date_from, date_to) on appointment_date, oldest first
+    query = select(*APPOINTMENT_COLUMNS)
+    if date_from is not None:
+        query = query.where(Appointment.appointment_date >= date_from)
+    if date_to is not None:
+        query = query.where(Appointment.appointment_date < date_to)
+    return query.order_by(Appointment.appointment_date, Appointment.id)
+
+def patients_query(date_from: Optional[datetime], date_to: Optional[datetime]) -> Select:
+    # [date_from, date_to) on the account's registration time
+    query = select(*PATIENT_COLUMNS).join(User, Patient.user_id == User.id)
+    if date_from is not None:
+        query = query.where(User.created_at >= date_from)
+    if date_to is not None:
+        query = query.where(User.created_at < date_to)
+    return query.order_by(Patient.id)
+
+def _plain(value: Any) -> Any:
+    if isinstance(value, enum.Enum):
+        return value.value
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+def _csv_writer(names: List[str]) -> Callable[[Sequence[Sequence[Any]]], str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    header = [True]
+
+    def write(rows: Sequence[Sequence[Any]]) -> str:
+        buffer.seek(0)
+        buffer.truncate()
+        if header[0]:
+            writer.writerow(names)
+            header[0] = False
+        writer.writerows([_plain(value) for value in row] for row in rows)
+        return buffer.getvalue()
+
+    return write
+
+def _ndjson_writer(names: List[str]) -> Callable[[Sequence[Sequence[Any]]], str]:
+    def write(rows: Sequence[Sequence[Any]]) -> str:
+        return "".join(
+            json.dumps({name: _plain(value) for name, value in zip(names, row)}) + "\n"
+            for row in rows
+        )
+
+    return write
+
+async def stream_rows(query: Select, export_format: ExportFormat) -> AsyncIterator[bytes]:
+    """Serialize `query` one fetch batch at a time; memory is bounded by EXPORT_BATCH_SIZE."""
+    names = [column.name for column in query.selected_columns]
+    write = _csv_writer(names) if export_format == ExportFormat.CSV else _ndjson_writer(names)
+    # The response outlives the request's get_db session, so the stream owns its own
+    async with AsyncSessionLocal() as session:
+        # stream() + yield_per keeps a server-side cursor open instead of buffering the result
+        result = await session.stream(query.execution_options(yield_per=settings.EXPORT_BATCH_SIZE))
+        wrote_any = False
+        async for rows in result.partitions():
+            wrote_any = True
+            yield write(rows).encode()
+        if not wrote_any and export_format == ExportFormat.CSV:
+            # An empty export still gets its header row
+            yield write([]).encode()
+
+def export_response(query: Select, export_format: ExportFormat, name: str) -> StreamingResponse:
+    filename = f"{name}-{datetime.utcnow():%Y%m%d%H%M%S}.{export_format.value}"
+    return StreamingResponse(
+        stream_rows(query, export_format),
+        media_type=MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
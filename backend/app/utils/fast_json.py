@@ -0,0 +1,78 @@
+"""Fast JSON path for list endpoints.
+
+FastAPI turns a `response_model` result into JSON in three steps: it validates the
+ORM objects, dumps them back to Python with jsonable values, and json.dumps those.
+`RowSerializer` selects only the columns a response schema reads, builds the
+models from the rows without validating them again (they are the schema's own
+columns; EmailStr's check alone was most of the cost) and dumps JSON bytes with a
+prebuilt TypeAdapter; the endpoint returns those bytes as is. Endpoints opt in one by one and keep
+their `response_model` for the OpenAPI schema. Everything else renders through
+`FastJSONResponse`, which uses orjson when it is installed.
+"""
+from typing import Any, Dict, List, Mapping, Optional, Sequence
+from fastapi import Response
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, TypeAdapter
+from sqlalchemy import Select, select
+from sqlalchemy.orm import Bundle
+
+try:
+    import orjson
+except ImportError:  # optional: the standard library encoder is used instead
+    orjson = None
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered by orjson when available, with the same compact output."""
+
+    def render(self, content: Any) -> bytes:
+        if orjson is None:
+            return super().render(content)
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+def schema_columns(entity, schema: type, nested: Optional[Mapping[str, Any]] = None) -> List[Any]:
+    """The columns of `entity` named like the fields of `schema`; nested models come from bundles,
+    computed fields from labelled expressions."""
+    nested = nested or {}
+    return [
+        nested[name] if name in nested else getattr(entity, name)
+        for name in schema.model_fields
+    ]
+
+class RowSerializer:
+    """Selects the columns `schema` reads and serializes result rows straight to JSON bytes."""
+
+    def __init__(self, entity, schema: type, nested: Optional[Dict[str, Any]] = None, extra: Sequence[Any] = ()):
+        self.schema = schema
+        self.columns = schema_columns(entity, schema, nested)
+        # Selected for the endpoint's own use (cursor keys), left out of the JSON
+        self.columns += [column for column in extra if column.key not in schema.model_fields]
+        self.adapter = TypeAdapter(List[schema])
+
+    def select(self) -> Select:
+        return select(*self.columns)
+
+    def models(self, rows: Sequence[Any]) -> List[BaseModel]:
+        construct = self.schema.model_construct
+        return [construct(**row._mapping) for row in rows]
+
+    def dump(self, rows: Sequence[Any]) -> bytes:
+        return self.adapter.dump_json(self.models(rows))
+
+class SchemaBundle(Bundle):
+    """A nested model's columns, labelled apart from the outer row's and returned as that model."""
+
+    def __init__(self, name: str, entity, schema: type):
+        self.schema = schema
+        self.fields = list(schema.model_fields)
+        # "user__id" rather than a second "id" next to the outer row's
+        super().__init__(name, *(getattr(entity, field).label(f"{name}__{field}") for field in self.fields))
+
+    def create_row_processor(self, query, procs, labels):
+        fields, construct = self.fields, self.schema.model_construct
+
+        def proc(row):
+            return construct(**dict(zip(fields, [getter(row) for getter in procs])))
+        return proc
+
+def json_response(body: bytes, headers: Optional[Dict[str, str]] = None) -> Response:
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -0,0 +1,78 @@
+"""Sparse fieldsets: `?fields=id,status,appointment_date` on list and detail endpoints.
+
+`fields` names a subset of the endpoint's full response schema and the response
+holds exactly those fields. List endpoints select only the matching columns,
+through a RowSerializer built for the subset. Detail endpoints load the entity
+with `load_only`, so columns nobody asked for, the long clinical text ones in
+particular, are never read from the database. The subset model and its serializer
+are built once per distinct field set.
+"""
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from fastapi import HTTPException, status
+from pydantic import TypeAdapter, create_model
+from sqlalchemy.orm import joinedload, load_only
+from .fast_json import RowSerializer
+
+FIELDS_DESCRIPTION = "Comma-separated fields to return, e.g. id,status; omit for the default view"
+
+Fields = Tuple[str, ...]
+
+class FieldSets:
+    def __init__(
+        self,
+        entity,
+        schema: type,
+        nested: Optional[Dict[str, Any]] = None,
+        keys: Sequence[Any] = (),
+        maxsize: int = 64
+    ):
+        self.entity = entity
+        self.schema = schema
+        self.nested = nested or {}
+        # Columns the endpoint needs whatever was asked for: cursor keys, ownership checks
+        self.keys = list(keys)
+        self.model = lru_cache(maxsize)(self._model)
+        self.rows = lru_cache(maxsize)(self._rows)
+        self._adapters = lru_cache(maxsize)(lambda model: TypeAdapter(List[model]))
+
+    def parse(self, fields: Optional[str]) -> Optional[Fields]:
+        """The requested fields in schema order, or None for the endpoint's default view."""
+        if fields is None:
+            return None
+        names = {name.strip() for name in fields.split(",") if name.strip()}
+        unknown = sorted(names - set(self.schema.model_fields))
+        if not names or unknown:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Unknown fields: {', '.join(unknown) or '(none given)'}; "
+                       f"choose from {', '.join(self.schema.model_fields)}"
+            )
+        # One canonical order, so "a,b" and "b,a" share a serializer
+        return tuple(name for name in self.schema.model_fields if name in names)
+
+    def _model(self, fields: Fields) -> type:
+        declared = self.schema.model_fields
+        return create_model(
+            f"{self.schema.__name__}Fields",
+            __config__={"from_attributes": True},
+            **{name: (declared[name].annotation, declared[name]) for name in fields}
+        )
+
+    def _rows(self, fields: Fields) -> RowSerializer:
+        return RowSerializer(self.entity, self.model(fields), self.nested, extra=self.keys)
+
+    def load_options(self, fields: Sequence[str]) -> List[Any]:
+        """ORM options loading only `fields` (and the keys) of the entity, relationships joined."""
+        columns = [getattr(self.entity, name) for name in fields if name not in self.nested]
+        options: List[Any] = [load_only(*columns, *self.keys)]
+        options += [joinedload(getattr(self.entity, name)) for name in fields if name in self.nested]
+        return options
+
+    def dump(self, fields: Fields, objects: Sequence[Any]) -> bytes:
+        """JSON for ORM objects loaded with `load_options(fields)`."""
+        model = self.model(fields)
+        return self._adapters(model).dump_json([model.model_validate(item) for item in objects])
+
+    def dump_one(self, fields: Fields, item: Any) -> bytes:
+        return self.model(fields).model_validate(item).model_dump_json().encode()
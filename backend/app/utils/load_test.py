@@ -0,0 +1,386 @@
+"""Load test for the main API paths: python -m app.cli load-test.
+
+Workers run a weighted mix of scenarios (login, list/get/create appointments,
+the doctor directory) through the real routers for a fixed time. By default they
+run in process over httpx's ASGI transport, against whatever DATABASE_URL names,
+SQLite or PostgreSQL. With a base URL they hit a running server instead. Users
+and appointments come from the database, so load it first with generate-data;
+every sampled account must share the one password.
+
+The routers were synchronous before the async engine (revision 8e9d35e); to compare,
+serve a checkout of its parent on a copy of the database, with alembic_version set
+back to that tree's head, and run the same mix against both with --base-url.
+
+Scenarios outside the default mix run only when named. `deep_page_offset` and
+`deep_page_cursor` fetch the same deep page of GET /api/patients/ by ?skip= and by
+?cursor=. Run each on its own (together they queue behind each other) at several
+--deep-page values: offset latency grows with the page, cursor latency stays flat.
+
+With --login-storm N, N more workers do nothing but log in, reported as
+`login_storm`, while the others run the mix. Comparing the other scenarios with a
+run without the storm shows what bcrypt does to everything else.
+
+--weight NAME=N changes a scenario's share of the mix, e.g. create_appointment=50
+with the list and get scenarios for a write-heavy run; repeating one mix with
+different pool or SQLITE_* settings compares them under concurrent reads and writes.
+
+Results can be saved as a JSON baseline. A later run compared against that baseline
+fails when throughput drops, or p95 latency rises, by more than the threshold.
+"""
+import asyncio
+import json
+import math
+import random
+import time
+from dataclasses import asdict, dataclass, field, replace
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+import httpx
+from sqlalchemy import func, select
+from sqlalchemy.engine import Engine
+from ..models.appointment import Appointment
+from ..models.doctor import Doctor
+from ..models.patient import Patient
+from ..models.user import User
+from .pagination import encode_cursor
+from .scheduling import slot_length
+
+PAGE_SIZE = 20
+
+# (method, url, httpx keyword arguments, statuses that count as success)
+Request = Tuple[str, str, Dict[str, Any], Tuple[int, ...]]
+
+@dataclass
+class Account:
+    email: str
+    token: str = ""
+    # Patients only: their own appointments, for the get scenario
+    appointment_ids: List[int] = field(default_factory=list)
+    patient_id: Optional[int] = None
+
+@dataclass
+class LoadContext:
+    password: str
+    patients: List[Account]
+    doctors: List[Account]
+    doctor_ids: List[int]
+    # Bookings go to consecutive slots after every existing appointment, so they never conflict
+    first_free_slot: datetime
+    booked: int = 0
+    # The same page of the patient list by offset and by cursor (None on the first page)
+    deep_offset: int = 0
+    deep_cursor: Optional[str] = None
+
+    def next_slot(self) -> datetime:
+        slot = self.first_free_slot + self.booked * slot_length()
+        self.booked += 1
+        return slot
+
+def _auth(account: Account) -> Dict[str, str]:
+    return {"Authorization": f"Bearer {account.token}"}
+
+def _login(context: LoadContext, rng: random.Random) -> Request:
+    account = rng.choice(context.patients + context.doctors)
+    return "POST", "/api/auth/login", {"data": {"username": account.email, "password": context.password}}, (200,)
+
+def _list_appointments(context: LoadContext, rng: random.Random) -> Request:
+    account = rng.choice(context.doctors) if context.doctors and rng.random() < 0.3 else rng.choice(context.patients)
+    return "GET", "/api/appointments/", {"params": {"limit": PAGE_SIZE}, "headers": _auth(account)}, (200,)
+
+def _get_appointment(context: LoadContext, rng: random.Random) -> Request:
+    account = rng.choice([patient for patient in context.patients if patient.appointment_ids] or context.patients)
+    appointment_id = rng.choice(account.appointment_ids) if account.appointment_ids else 0
+    return "GET", f"/api/appointments/{appointment_id}", {"headers": _auth(account)}, (200,)
+
+def _create_appointment(context: LoadContext, rng: random.Random) -> Request:
+    account = rng.choice(context.patients)
+    body = {
+        "doctor_id": rng.choice(context.doctor_ids),
+        "appointment_date": context.next_slot().isoformat(),
+        "reason": "Load test booking",
+    }
+    return "POST", "/api/appointments/", {"json": body, "headers": _auth(account)}, (201,)
+
+def _doctor_directory(context: LoadContext, rng: random.Random) -> Request:
+    return "GET", "/api/doctors/", {"params": {"limit": PAGE_SIZE}}, (200,)
+
+def _deep_page_offset(context: LoadContext, rng: random.Random) -> Request:
+    # Doctors may list patients
+    params = {"skip": context.deep_offset, "limit": PAGE_SIZE}
+    return "GET", "/api/patients/", {"params": params, "headers": _auth(rng.choice(context.doctors))}, (200,)
+
+def _deep_page_cursor(context: LoadContext, rng: random.Random) -> Request:
+    params: Dict[str, Any] = {"limit": PAGE_SIZE}
+    if context.deep_cursor is not None:
+        params["cursor"] = context.deep_cursor
+    return "GET", "/api/patients/", {"params": params, "headers": _auth(rng.choice(context.doctors))}, (200,)
+
+@dataclass
+class Scenario:
+    name: str
+    weight: int
+    build: Callable[[LoadContext, random.Random], Request]
+    # Part of the mix run when no scenario is named
+    default: bool = True
+
+SCENARIOS = [
+    Scenario("login", 5, _login),
+    Scenario("list_appointments", 30, _list_appointments),
+    Scenario("get_appointment", 30, _get_appointment),
+    Scenario("create_appointment", 10, _create_appointment),
+    Scenario("doctor_directory", 25, _doctor_directory),
+    Scenario("deep_page_offset", 50, _deep_page_offset, default=False),
+    Scenario("deep_page_cursor", 50, _deep_page_cursor, default=False),
+]
+
+# What the --login-storm workers run, on top of the mix
+LOGIN_STORM = Scenario("login_storm", 1, _login, default=False)
+
+@dataclass
+class ScenarioResult:
+    requests: int
+    errors: int
+    throughput: float
+    # Milliseconds
+    p50: float
+    p95: float
+    p99: float
+
+@dataclass
+class LoadTestResult:
+    dialect: str
+    concurrency: int
+    duration: float
+    total: ScenarioResult
+    scenarios: Dict[str, ScenarioResult]
+    # Zero-based patient list page the deep_page scenarios fetched
+    deep_page: int = 0
+    # Workers that only logged in, on top of `concurrency`
+    login_storm: int = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "LoadTestResult":
+        return cls(
+            dialect=data["dialect"],
+            concurrency=data["concurrency"],
+            duration=data["duration"],
+            total=ScenarioResult(**data["total"]),
+            scenarios={name: ScenarioResult(**result) for name, result in data["scenarios"].items()},
+            deep_page=data.get("deep_page", 0),
+            login_storm=data.get("login_storm", 0),
+        )
+
+def percentile(sorted_values: Sequence[float], percent: float) -> float:
+    # Nearest rank
+    if not sorted_values:
+        return 0.0
+    return sorted_values[max(0, math.ceil(percent / 100 * len(sorted_values)) - 1)]
+
+def _summarize(latencies: List[float], errors: int, elapsed: float) -> ScenarioResult:
+    latencies = sorted(latencies)
+    return ScenarioResult(
+        requests=len(latencies),
+        errors=errors,
+        throughput=len(latencies) / elapsed if elapsed else 0.0,
+        p50=percentile(latencies, 50) * 1000,
+        p95=percentile(latencies, 95) * 1000,
+        p99=percentile(latencies, 99) * 1000,
+    )
+
+def load_context(bind: Engine, password: str, sample: int, rng: random.Random, deep_page: int = 0) -> LoadContext:
+    """Sample accounts and their appointments from the database the app uses.
+
+    The deep_page scenarios get patient list page `deep_page`, or the last full page if there are fewer.
+    """
+    with bind.connect() as connection:
+        patients = connection.execute(
+            select(User.email, Patient.id).join(Patient, Patient.user_id == User.id).order_by(Patient.id)
+        ).all()
+        doctors = connection.execute(
+            select(User.email, Doctor.id).join(Doctor, Doctor.user_id == User.id).order_by(Doctor.id)
+        ).all()
+        if not patients or not doctors:
+            raise RuntimeError("The load test needs patients and doctors; run generate-data first")
+        patients = rng.sample(patients, min(sample, len(patients)))
+        accounts = [Account(email, patient_id=patient_id) for email, patient_id in patients]
+        for account in accounts:
+            account.appointment_ids = connection.scalars(
+                select(Appointment.id).where(Appointment.patient_id == account.patient_id).limit(50)
+            ).all()
+        last = connection.scalar(select(func.max(Appointment.appointment_date))) or datetime.utcnow()
+        full_pages = (connection.scalar(select(func.count()).select_from(Patient)) or 0) // PAGE_SIZE
+        deep_offset = min(deep_page, max(full_pages - 1, 0)) * PAGE_SIZE
+        deep_cursor = None
+        if deep_offset:
+            # Patient pages are keyed on id: the cursor is the id the previous page ended on
+            deep_cursor = encode_cursor([connection.scalar(
+                select(Patient.id).order_by(Patient.id).offset(deep_offset - 1).limit(1)
+            )])
+    first_free = datetime.combine(max(last, datetime.utcnow()).date() + timedelta(days=1), datetime.min.time())
+    return LoadContext(
+        password=password,
+        patients=accounts,
+        doctors=[Account(email) for email, _ in rng.sample(doctors, min(max(sample // 4, 1), len(doctors)))],
+        doctor_ids=[doctor_id for _, doctor_id in doctors],
+        first_free_slot=first_free,
+        deep_offset=deep_offset,
+        deep_cursor=deep_cursor,
+    )
+
+async def _log_in(client: httpx.AsyncClient, context: LoadContext) -> None:
+    for account in context.patients + context.doctors:
+        response = await client.post("/api/auth/login", data={"username": account.email, "password": context.password})
+        if response.status_code != 200:
+            raise RuntimeError(f"Could not log in as {account.email}: {response.status_code} {response.text}")
+        account.token = response.json()["access_token"]
+
+async def _run(
+    client: httpx.AsyncClient,
+    context: LoadContext,
+    scenarios: List[Scenario],
+    concurrency: int,
+    duration: float,
+    warmup: float,
+    seed: int,
+    login_storm: int = 0
+) -> Tuple[Dict[str, List[float]], Dict[str, int], float]:
+    storm = [LOGIN_STORM] if login_storm else []
+    latencies: Dict[str, List[float]] = {scenario.name: [] for scenario in scenarios + storm}
+    errors: Dict[str, int] = {scenario.name: 0 for scenario in scenarios + storm}
+    started = time.perf_counter()
+    measure_from = started + warmup
+    stop_at = measure_from + duration
+
+    async def worker(number: int, mix: List[Scenario]) -> None:
+        rng = random.Random(seed * 1000 + number)
+        weights = [scenario.weight for scenario in mix]
+        while True:
+            now = time.perf_counter()
+            if now >= stop_at:
+                return
+            scenario = rng.choices(mix, weights)[0]
+            method, url, options, ok = scenario.build(context, rng)
+            request_started = time.perf_counter()
+            try:
+                response = await client.request(method, url, **options)
+                success = response.status_code in ok
+            except httpx.HTTPError:
+                success = False
+            finished = time.perf_counter()
+            if request_started < measure_from:
+                continue
+            if success:
+                latencies[scenario.name].append(finished - request_started)
+            else:
+                errors[scenario.name] += 1
+
+    await asyncio.gather(
+        *(worker(number, scenarios) for number in range(concurrency)),
+        *(worker(concurrency + number, storm) for number in range(login_storm))
+    )
+    return latencies, errors, time.perf_counter() - measure_from
+
+async def _load_test(
+    bind: Engine,
+    password: str,
+    concurrency: int,
+    duration: float,
+    warmup: float,
+    seed: int,
+    sample: int,
+    base_url: Optional[str],
+    names: Optional[List[str]],
+    deep_page: int,
+    login_storm: int,
+    weights: Dict[str, int]
+) -> LoadTestResult:
+    rng = random.Random(seed)
+    context = load_context(bind, password, sample, rng, deep_page)
+    scenarios = [scenario for scenario in SCENARIOS if scenario.name in names] if names else [
+        scenario for scenario in SCENARIOS if scenario.default
+    ]
+    if not scenarios:
+        raise ValueError(f"No scenario named {', '.join(names or [])}; choose from {', '.join(s.name for s in SCENARIOS)}")
+    unknown = set(weights) - {scenario.name for scenario in scenarios}
+    if unknown:
+        raise ValueError(f"Weights for scenarios not in this run: {', '.join(sorted(unknown))}")
+    scenarios = [replace(scenario, weight=weights.get(scenario.name, scenario.weight)) for scenario in scenarios]
+    if base_url:
+        client = httpx.AsyncClient(
+            base_url=base_url, timeout=30.0, limits=httpx.Limits(max_connections=concurrency + login_storm)
+        )
+    else:
+        from ..main import app
+
+        # An unhandled error (e.g. "database is locked" under write contention) counts as a 500, as it would
+        # behind uvicorn, instead of escaping from the worker and ending the run
+        transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+        client = httpx.AsyncClient(transport=transport, base_url="http://load-test", timeout=30.0)
+    async with client:
+        await _log_in(client, context)
+        latencies, errors, elapsed = await _run(
+            client, context, scenarios, concurrency, duration, warmup, seed, login_storm
+        )
+    if not base_url:
+        from ..database import async_engine
+
+        await async_engine.dispose()
+    every = [latency for values in latencies.values() for latency in values]
+    return LoadTestResult(
+        dialect=bind.dialect.name,
+        concurrency=concurrency,
+        duration=elapsed,
+        total=_summarize(every, sum(errors.values()), elapsed),
+        scenarios={name: _summarize(latencies[name], errors[name], elapsed) for name in latencies},
+        deep_page=context.deep_offset // PAGE_SIZE,
+        login_storm=login_storm,
+    )
+
+def run_load_test(
+    bind: Engine,
+    password: str,
+    concurrency: int = 10,
+    duration: float = 30.0,
+    warmup: float = 2.0,
+    seed: int = 0,
+    sample: int = 40,
+    base_url: Optional[str] = None,
+    scenarios: Optional[List[str]] = None,
+    deep_page: int = 500,
+    login_storm: int = 0,
+    weights: Optional[Dict[str, int]] = None
+) -> LoadTestResult:
+    return asyncio.run(_load_test(
+        bind, password, concurrency, duration, warmup, seed, sample, base_url, scenarios, deep_page, login_storm,
+        weights or {}
+    ))
+
+def save_baseline(result: LoadTestResult, path: str) -> None:
+    with open(path, "w") as handle:
+        json.dump(result.to_dict(), handle, indent=2)
+
+def load_baseline(path: str) -> LoadTestResult:
+    with open(path) as handle:
+        return LoadTestResult.from_dict(json.load(handle))
+
+def regressions(result: LoadTestResult, baseline: LoadTestResult, threshold: float) -> List[str]:
+    """Where throughput fell, or p95 rose, by more than `threshold` (0.2 = 20%) against the baseline."""
+    found = []
+    pairs = [
+        (name, current, baseline.scenarios[name])
+        for name, current in result.scenarios.items() if name in baseline.scenarios
+    ]
+    # Totals only compare when both runs had the same mix
+    if set(result.scenarios) == set(baseline.scenarios):
+        pairs.append(("total", result.total, baseline.total))
+    for name, current, before in pairs:
+        if before.throughput and current.throughput < before.throughput * (1 - threshold):
+            found.append(f"{name}: throughput {current.throughput:.1f}/s, baseline {before.throughput:.1f}/s")
+        if before.p95 and current.p95 > before.p95 * (1 + threshold):
+            found.append(f"{name}: p95 {current.p95:.1f}ms, baseline {before.p95:.1f}ms")
+        if current.errors > before.errors and current.errors > current.requests * 0.01:
+            found.append(f"{name}: {current.errors} errors, baseline {before.errors}")
+    return found
@@ -0,0 +1,288 @@
+"""Request and SQL metrics, exposed in the Prometheus text format at GET /metrics.
+
+`MetricsMiddleware` times every request and counts its status, labelled by method
+and route template (never the raw path, so ids do not multiply the series). The
+engine hooks time each statement and add it to the current request's tally, kept
+in a context variable, which the middleware records when the request finishes.
+Pool waits come from the PoolStats the engines already keep. Everything stays in
+process memory, so each worker reports its own numbers. Scrapers authenticate with
+the static METRICS_TOKEN, not a user login, so a scrape never expires or hits the
+user tables.
+"""
+import hmac
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+from fastapi import Header, HTTPException, status
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine
+from ..config import settings
+
+# Upper bounds, in seconds or statements
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 10.0)
+SQL_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 50, 100)
+
+# Starlette appends the charset to text/ media types
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+# Requests that matched no route share one label
+UNMATCHED_ROUTE = "<unmatched>"
+
+class Histogram:
+    """Counts per bucket plus a running sum; rendered cumulatively like Prometheus expects."""
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    @property
+    def count(self) -> int:
+        return sum(self.counts)
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        total = 0
+        result = []
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            result.append(("+Inf" if bound == float("inf") else _number(bound), total))
+        return result
+
+@dataclass
+class RequestTally:
+    queries: int = 0
+    sql_seconds: float = 0.0
+
+_current_tally: ContextVar[Optional[RequestTally]] = ContextVar("request_tally", default=None)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+class MetricsRegistry:
+    def __init__(self):
+        self.request_seconds: Dict[Labels, Histogram] = {}
+        self.request_queries: Dict[Labels, Histogram] = {}
+        self.request_sql_seconds: Dict[Labels, Histogram] = {}
+        self.responses: Counter = Counter()
+        self.query_seconds = Histogram(SQL_BUCKETS)
+        # (metric name, type, help, callable returning {labels: value}), read at scrape time
+        self._collectors: List[Tuple[str, str, str, Callable[[], Dict[Labels, float]]]] = []
+        # (metric name, help, histogram) kept up to date by their owners, e.g. the notification worker
+        self._histograms: List[Tuple[str, str, Histogram]] = []
+        self._lock = threading.Lock()
+
+    def observe_request(self, method: str, route: str, status_code: int, seconds: float, tally: RequestTally) -> None:
+        labels = (("method", method), ("route", route))
+        with self._lock:
+            self.responses[labels + (("status", str(status_code)),)] += 1
+            _histogram(self.request_seconds, labels, LATENCY_BUCKETS).observe(seconds)
+            _histogram(self.request_queries, labels, QUERY_COUNT_BUCKETS).observe(tally.queries)
+            _histogram(self.request_sql_seconds, labels, SQL_BUCKETS).observe(tally.sql_seconds)
+
+    def observe_query(self, seconds: float) -> None:
+        with self._lock:
+            self.query_seconds.observe(seconds)
+        tally = _current_tally.get()
+        if tally is not None:
+            tally.queries += 1
+            tally.sql_seconds += seconds
+
+    def add_collector(self, name: str, kind: str, help_text: str, collect: Callable[[], Dict[Labels, float]]) -> None:
+        """Render the values `collect` returns at scrape time, e.g. pool or cache stats."""
+        self._collectors.append((name, kind, help_text, collect))
+
+    def add_histogram(self, name: str, help_text: str, histogram: Histogram) -> None:
+        self._histograms.append((name, help_text, histogram))
+
+    def reset(self) -> None:
+        with self._lock:
+            self.request_seconds.clear()
+            self.request_queries.clear()
+            self.request_sql_seconds.clear()
+            self.responses.clear()
+            self.query_seconds = Histogram(SQL_BUCKETS)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        with self._lock:
+            _render_values(lines, "http_responses_total", "counter", "Responses by method, route and status", self.responses)
+            _render_histograms(lines, "http_request_duration_seconds", "Request latency, to the last body byte", self.request_seconds)
+            _render_histograms(lines, "http_request_db_queries", "SQL statements per request", self.request_queries)
+            _render_histograms(lines, "http_request_db_seconds", "Time in SQL per request", self.request_sql_seconds)
+            _render_histograms(lines, "db_query_duration_seconds", "SQL statement latency, requests and background work", {(): self.query_seconds})
+        for name, kind, help_text, collect in self._collectors:
+            _render_values(lines, name, kind, help_text, collect())
+        for name, help_text, histogram in self._histograms:
+            _render_histograms(lines, name, help_text, {(): histogram})
+        return "\n".join(lines) + "\n"
+
+def _histogram(histograms: Dict[Labels, Histogram], labels: Labels, buckets: Sequence[float]) -> Histogram:
+    histogram = histograms.get(labels)
+    if histogram is None:
+        histogram = histograms[labels] = Histogram(buckets)
+    return histogram
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(labels: Iterable[Tuple[str, str]]) -> str:
+    rendered = ",".join(f'{name}="{_escape(value)}"' for name, value in labels)
+    return f"{{{rendered}}}" if rendered else ""
+
+def _header(lines: List[str], name: str, kind: str, help_text: str) -> None:
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} {kind}")
+
+def _render_values(lines: List[str], name: str, kind: str, help_text: str, values: Dict[Labels, float]) -> None:
+    _header(lines, name, kind, help_text)
+    for labels in sorted(values):
+        lines.append(f"{name}{_labels(labels)} {_number(values[labels])}")
+
+def _render_histograms(lines: List[str], name: str, help_text: str, histograms: Dict[Labels, Histogram]) -> None:
+    _header(lines, name, "histogram", help_text)
+    for labels in sorted(histograms):
+        histogram = histograms[labels]
+        for bound, count in histogram.cumulative():
+            lines.append(f"{name}_bucket{_labels(labels + (('le', bound),))} {count}")
+        lines.append(f"{name}_sum{_labels(labels)} {_number(histogram.sum)}")
+        lines.append(f"{name}_count{_labels(labels)} {histogram.count}")
+
+metrics = MetricsRegistry()
+
+class MetricsMiddleware:
+    """Plain ASGI middleware; BaseHTTPMiddleware would add a task and a stream per request."""
+
+    def __init__(self, app, registry: MetricsRegistry = metrics):
+        self.app = app
+        self.registry = registry
+        self._routes: Dict[Any, str] = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status_code = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status_code[0] = message["status"]
+            await send(message)
+
+        tally = RequestTally()
+        token = _current_tally.set(tally)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            _current_tally.reset(token)
+            self.registry.observe_request(scope["method"], self._route(scope), status_code[0], elapsed, tally)
+
+    def _route(self, scope) -> str:
+        # The router leaves the matched endpoint in the scope; its path template is the label
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return UNMATCHED_ROUTE
+        route = self._routes.get(endpoint)
+        if route is None:
+            paths = {
+                getattr(candidate, "endpoint", None): candidate.path
+                for candidate in scope["app"].routes if hasattr(candidate, "path")
+            }
+            route = self._routes[endpoint] = paths.get(endpoint, UNMATCHED_ROUTE)
+        return route
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._metrics_started = time.perf_counter()
+
+def require_metrics_token(authorization: Optional[str] = Header(None)) -> None:
+    """Bearer METRICS_TOKEN, compared in constant time; without a configured token nothing is served."""
+    if not settings.METRICS_TOKEN:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(token.encode(), settings.METRICS_TOKEN.encode()):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid metrics token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+def instrument_engine(bind: Union[Engine, AsyncEngine], registry: MetricsRegistry = metrics) -> None:
+    """Time every statement on `bind` and charge it to the request running it, if any."""
+    target = bind.sync_engine if isinstance(bind, AsyncEngine) else bind
+
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, "_metrics_started", None)
+        if started is not None:
+            registry.observe_query(time.perf_counter() - started)
+
+    event.listen(target, "before_cursor_execute", _before_cursor_execute)
+    event.listen(target, "after_cursor_execute", after_cursor_execute)
+
+def _engine_values(pools: Dict[str, Dict[str, Any]], field: str) -> Dict[Labels, float]:
+    return {(("engine", name),): pool[field] for name, pool in pools.items() if field in pool}
+
+def register_default_collectors(registry: MetricsRegistry = metrics) -> None:
+    """Pool waits, cache counters, notification delivery and the scheduler, read from the stats the app already keeps."""
+    from ..database import get_pool_stats
+    from .principal_cache import principal_cache
+    from .response_cache import doctor_directory_cache, specialization_cache
+    from .notifications import notification_worker
+    from .appointment_scheduler import appointment_scheduler
+
+    for name, field, kind, help_text in (
+        ("db_pool_checkouts_total", "checkouts", "counter", "Connections checked out of the pool"),
+        ("db_pool_timeouts_total", "timeouts", "counter", "Checkouts that timed out waiting for a connection"),
+        ("db_pool_wait_seconds_total", "total_wait_seconds", "counter", "Time spent waiting for a pooled connection"),
+        ("db_pool_max_wait_seconds", "max_wait_seconds", "gauge", "Longest wait for a pooled connection"),
+        ("db_pool_checked_out", "checked_out", "gauge", "Connections currently checked out"),
+        ("db_pool_size", "size", "gauge", "Connections the pool keeps open"),
+    ):
+        registry.add_collector(name, kind, help_text, lambda field=field: _engine_values(get_pool_stats(), field))
+
+    caches = {"principal": principal_cache, "doctor_directory": doctor_directory_cache, "specializations": specialization_cache}
+
+    def cache_values(field: str) -> Dict[Labels, float]:
+        return {(("cache", name),): cache.stats()[field] for name, cache in caches.items()}
+
+    for name, field, kind, help_text in (
+        ("cache_hits_total", "hits", "counter", "Cache lookups answered from the cache"),
+        ("cache_misses_total", "misses", "counter", "Cache lookups that missed"),
+        ("cache_evictions_total", "evictions", "counter", "Entries evicted to stay within the size limit"),
+        ("cache_entries", "size", "gauge", "Entries in the cache"),
+    ):
+        registry.add_collector(name, kind, help_text, lambda field=field: cache_values(field))
+
+    for name, field, kind, help_text in (
+        ("notifications_sent_total", "sent", "counter", "Notification emails delivered by this worker"),
+        ("notifications_retried_total", "retried", "counter", "Failed sends scheduled for another attempt"),
+        ("notifications_failed_total", "failed", "counter", "Notifications given up on"),
+        ("notification_outbox_pending", "depth", "gauge", "Outbox rows not yet sent, as of the worker's last batch"),
+    ):
+        registry.add_collector(name, kind, help_text, lambda field=field: {(): getattr(notification_worker.stats, field)})
+    registry.add_histogram(
+        "notification_delivery_seconds", "Time from queueing a notification to its delivery",
+        notification_worker.stats.latency
+    )
+
+    for name, field, kind, help_text in (
+        ("scheduler_reminders_queued_total", "reminders", "counter", "Reminder emails queued by the scheduler"),
+        ("appointments_marked_no_show_total", "no_shows", "counter", "Confirmed appointments marked no-show"),
+        ("appointments_expired_total", "expired", "counter", "Pending appointments marked expired once past"),
+        ("scheduler_runs_total", "runs", "counter", "Times the scheduler ran its due jobs"),
+        ("scheduler_errors_total", "errors", "counter", "Scheduler steps that failed and were retried"),
+        ("scheduler_leader", "leader", "gauge", "1 while this process holds the scheduler lease"),
+    ):
+        registry.add_collector(name, kind, help_text, lambda field=field: {(): getattr(appointment_scheduler.stats, field)})
@@ -0,0 +1,513 @@
+"""Appointment emails through a transactional outbox.
+
+Booking, confirming, cancelling, rescheduling or expiring an appointment queues its emails
+in `notification_outbox` from the mapper events below, on the flush connection:
+a message exists exactly when its change commits, and no request waits on SMTP.
+Reminders, and the emails for appointments it expires in bulk, are queued by the
+appointment scheduler (app.utils.appointment_scheduler).
+Nothing is queued unless SMTP_HOST is set.
+
+`NotificationWorker` drains the outbox in the background. It claims a batch of
+due rows, pushing them ahead by NOTIFICATION_LEASE_SECONDS so the rows of a worker
+that died come back, sends them over pooled SMTP connections in threads, then
+marks each one sent, due again after exponential backoff, or failed (a 5xx reply,
+or NOTIFICATION_MAX_ATTEMPTS used up). A commit that queued mail wakes this
+worker's loop at once; other workers find it on their next poll.
+
+To watch the mail go out locally, run an SMTP stand-in such as
+`python -m aiosmtpd -n -l localhost:8025` with SMTP_HOST=localhost, SMTP_PORT=8025.
+"""
+import asyncio
+import random
+import smtplib
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+from email.utils import formatdate, make_msgid
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from sqlalchemy import event, func, insert, select, update
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session
+from ..config import settings
+from ..models.appointment import RELEASED_STATUSES, Appointment, AppointmentStatus
+from ..models.doctor import Doctor
+from ..models.notification import Notification, NotificationStatus
+from ..models.patient import Patient
+from ..models.user import User
+from .counters import before_and_after
+from .metrics import Histogram
+
+BOOKED = "appointment_booked"
+CONFIRMED = "appointment_confirmed"
+CANCELLED = "appointment_cancelled"
+RESCHEDULED = "appointment_rescheduled"
+REMINDER = "appointment_reminder"
+EXPIRED = "appointment_expired"
+
+# kind -> recipient -> (subject, body), formatted with the appointment's details
+TEMPLATES: Dict[str, Dict[str, Tuple[str, str]]] = {
+    BOOKED: {
+        "patient": (
+            "Appointment {number} requested",
+            "Dear {patient},\n\nYour appointment {number} with Dr. {doctor} on {date} has been requested "
+            "and is awaiting confirmation.\n"
+        ),
+        "doctor": (
+            "New appointment request {number}",
+            "Dear Dr. {doctor},\n\n{patient} has requested appointment {number} on {date}.\n"
+        ),
+    },
+    CONFIRMED: {
+        "patient": (
+            "Appointment {number} confirmed",
+            "Dear {patient},\n\nDr. {doctor} has confirmed your appointment {number} on {date}.\n"
+        ),
+    },
+    CANCELLED: {
+        "patient": (
+            "Appointment {number} cancelled",
+            "Dear {patient},\n\nYour appointment {number} with Dr. {doctor} on {date} has been cancelled.\n"
+        ),
+        "doctor": (
+            "Appointment {number} cancelled",
+            "Dear Dr. {doctor},\n\nAppointment {number} with {patient} on {date} has been cancelled.\n"
+        ),
+    },
+    RESCHEDULED: {
+        "patient": (
+            "Appointment {number} rescheduled",
+            "Dear {patient},\n\nYour appointment {number} with Dr. {doctor} has moved to {date}.\n"
+        ),
+        "doctor": (
+            "Appointment {number} rescheduled",
+            "Dear Dr. {doctor},\n\nAppointment {number} with {patient} has moved to {date}.\n"
+        ),
+    },
+    REMINDER: {
+        "patient": (
+            "Reminder: appointment {number} on {date}",
+            "Dear {patient},\n\nThis is a reminder of your appointment {number} with Dr. {doctor} on {date}.\n"
+        ),
+    },
+    EXPIRED: {
+        "patient": (
+            "Appointment request {number} expired",
+            "Dear {patient},\n\nYour appointment request {number} with Dr. {doctor} on {date} was never "
+            "confirmed and has expired. Please book a new appointment if you still need one.\n"
+        ),
+    },
+}
+
+def notifications_enabled() -> bool:
+    return bool(settings.SMTP_HOST)
+
+Contact = Optional[Tuple[str, str]]
+
+def _contact(connection: Connection, model, profile_id: Optional[int]) -> Contact:
+    if profile_id is None:
+        return None
+    row = connection.execute(
+        select(User.email, User.full_name).join(model, model.user_id == User.id).where(model.id == profile_id)
+    ).first()
+    return tuple(row) if row is not None else None
+
+def outbox_rows(
+    kind: str,
+    appointment_id: int,
+    number: str,
+    appointment_date: datetime,
+    patient: Contact,
+    doctor: Contact,
+    now: Optional[datetime] = None
+) -> List[Dict[str, Any]]:
+    """Outbox rows for `kind` about one appointment; `patient` and `doctor` are (email, name) or None."""
+    contacts = {"patient": patient, "doctor": doctor}
+    details = {
+        "number": number,
+        "date": appointment_date.strftime("%A %d %B %Y at %H:%M"),
+        "patient": patient[1] if patient else "the patient",
+        "doctor": doctor[1] if doctor else "your doctor",
+    }
+    now = now or datetime.utcnow()
+    return [
+        {
+            "kind": kind,
+            "appointment_id": appointment_id,
+            "recipient": contacts[role][0],
+            "subject": subject.format(**details),
+            "body": body.format(**details),
+            "status": NotificationStatus.PENDING,
+            "attempts": 0,
+            "next_attempt_at": now,
+            "created_at": now,
+        }
+        for role, (subject, body) in TEMPLATES[kind].items() if contacts[role] is not None
+    ]
+
+def queue_notifications(connection: Connection, kind: str, appointment: Appointment) -> int:
+    """Insert the outbox rows for `kind`; returns how many."""
+    rows = outbox_rows(
+        kind, appointment.id, appointment.appointment_number, appointment.appointment_date,
+        _contact(connection, Patient, appointment.patient_id), _contact(connection, Doctor, appointment.doctor_id)
+    )
+    if rows:
+        connection.execute(insert(Notification), rows)
+    return len(rows)
+
+# Set on the session when its flush queued mail; the commit then wakes the worker
+_QUEUED_KEY = "notifications_queued"
+
+def _queue(connection: Connection, kind: str, target: Appointment) -> None:
+    if queue_notifications(connection, kind, target):
+        session = Session.object_session(target)
+        if session is not None:
+            session.info[_QUEUED_KEY] = True
+
+def _appointment_booked(mapper, connection, target: Appointment) -> None:
+    if notifications_enabled():
+        _queue(connection, BOOKED, target)
+
+def _appointment_changed(mapper, connection, target: Appointment) -> None:
+    if not notifications_enabled():
+        return
+    (old_status, old_date), (status, appointment_date) = before_and_after(target, ("status", "appointment_date"))
+    if status != old_status and status == AppointmentStatus.CONFIRMED:
+        _queue(connection, CONFIRMED, target)
+    elif status != old_status and status == AppointmentStatus.CANCELLED:
+        _queue(connection, CANCELLED, target)
+    elif status != old_status and status == AppointmentStatus.EXPIRED:
+        _queue(connection, EXPIRED, target)
+    elif appointment_date != old_date and status not in RELEASED_STATUSES:
+        _queue(connection, RESCHEDULED, target)
+
+event.listen(Appointment, "after_insert", _appointment_booked)
+event.listen(Appointment, "after_update", _appointment_changed)
+
+@event.listens_for(Session, "after_commit")
+def _wake_worker(session: Session) -> None:
+    if session.info.pop(_QUEUED_KEY, None):
+        notification_worker.wake()
+
+@event.listens_for(Session, "after_rollback")
+def _drop_queued(session: Session) -> None:
+    session.info.pop(_QUEUED_KEY, None)
+
+@dataclass
+class OutboxMessage:
+    id: int
+    recipient: str
+    subject: str
+    body: str
+    attempts: int
+    created_at: datetime
+
+    def email(self) -> EmailMessage:
+        message = EmailMessage()
+        message["From"] = settings.SMTP_FROM
+        message["To"] = self.recipient
+        message["Subject"] = self.subject
+        message["Date"] = formatdate(localtime=False)
+        message["Message-ID"] = make_msgid()
+        message.set_content(self.body)
+        return message
+
+@dataclass
+class Outcome:
+    message: OutboxMessage
+    # None when sent
+    error: Optional[str] = None
+    # 5xx replies: retrying will not help
+    permanent: bool = False
+
+def _smtp_error(error: Exception) -> Tuple[str, bool]:
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        codes = [code for code, _ in error.recipients.values()]
+        return f"Recipient refused: {error.recipients}", bool(codes) and min(codes) >= 500
+    if isinstance(error, smtplib.SMTPResponseException):
+        return f"{error.smtp_code} {error.smtp_error!r}", error.smtp_code >= 500
+    return f"{type(error).__name__}: {error}", False
+
+class SMTPPool:
+    """Up to `size` open SMTP connections, each used by one thread at a time and reused while fresh."""
+
+    def __init__(
+        self,
+        host: str,
+        port: int = 0,
+        user: Optional[str] = None,
+        password: Optional[str] = None,
+        starttls: bool = False,
+        timeout: float = 10.0,
+        size: int = 2,
+        idle_seconds: float = 60.0,
+        factory: Callable[..., smtplib.SMTP] = smtplib.SMTP
+    ):
+        self.host, self.port, self.user, self.password = host, port, user, password
+        self.starttls, self.timeout, self.idle_seconds = starttls, timeout, idle_seconds
+        self.factory = factory
+        self.opened = 0
+        self._slots = threading.BoundedSemaphore(size)
+        self._idle: List[Tuple[smtplib.SMTP, float]] = []
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls) -> "SMTPPool":
+        return cls(
+            settings.SMTP_HOST or "localhost", settings.SMTP_PORT or 0, settings.SMTP_USER, settings.SMTP_PASSWORD,
+            settings.SMTP_STARTTLS, settings.SMTP_TIMEOUT_SECONDS, settings.SMTP_POOL_SIZE, settings.SMTP_IDLE_SECONDS
+        )
+
+    def _connect(self) -> smtplib.SMTP:
+        client = self.factory(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.starttls:
+                client.starttls()
+            if self.user:
+                client.login(self.user, self.password or "")
+        except Exception:
+            _close(client)
+            raise
+        with self._lock:
+            self.opened += 1
+        return client
+
+    def _checkout(self) -> smtplib.SMTP:
+        now = time.monotonic()
+        with self._lock:
+            while self._idle:
+                client, since = self._idle.pop()
+                if now - since <= self.idle_seconds:
+                    return client
+                _close(client)
+        return self._connect()
+
+    def _checkin(self, client: smtplib.SMTP) -> None:
+        with self._lock:
+            self._idle.append((client, time.monotonic()))
+
+    def send_all(self, messages: Sequence[OutboxMessage]) -> List[Outcome]:
+        """Send in order over one connection; a dropped connection is reopened once per call."""
+        outcomes: List[Outcome] = []
+        client: Optional[smtplib.SMTP] = None
+        reconnected = False
+        with self._slots:
+            for message in messages:
+                while True:
+                    try:
+                        if client is None:
+                            client = self._connect() if reconnected else self._checkout()
+                        client.send_message(message.email())
+                        outcomes.append(Outcome(message))
+                        break
+                    except smtplib.SMTPServerDisconnected as error:
+                        dropped = error
+                    except smtplib.SMTPException as error:
+                        # A reply to this message; the connection itself is fine
+                        outcomes.append(Outcome(message, *_smtp_error(error)))
+                        break
+                    except OSError as error:
+                        dropped = error
+                    if client is not None:
+                        _close(client)
+                        client = None
+                    if reconnected:
+                        outcomes.append(Outcome(message, *_smtp_error(dropped)))
+                        break
+                    reconnected = True
+            if client is not None:
+                self._checkin(client)
+        return outcomes
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for client, _ in idle:
+            _close(client)
+
+def _close(client: smtplib.SMTP) -> None:
+    try:
+        client.quit()
+    except Exception:
+        client.close()
+
+def backoff_seconds(attempts: int) -> float:
+    """Delay before retry number `attempts`: doubling from the base, capped, with jitter."""
+    delay = min(settings.NOTIFICATION_BACKOFF_MAX_SECONDS, settings.NOTIFICATION_BACKOFF_SECONDS * 2 ** (attempts - 1))
+    # Spread out the retries of a batch that failed together
+    return delay * random.uniform(0.5, 1.0)
+
+def claim_batch(connection: Connection, limit: int, lease: float, now: Optional[datetime] = None) -> List[OutboxMessage]:
+    """Take up to `limit` due messages and push them a lease ahead, counting the attempt."""
+    now = now or datetime.utcnow()
+    due = (
+        select(Notification.id)
+        .where(Notification.status == NotificationStatus.PENDING, Notification.next_attempt_at <= now)
+        .order_by(Notification.next_attempt_at, Notification.id)
+        .limit(limit)
+    )
+    if connection.dialect.name == "postgresql":
+        # Concurrent workers claim disjoint batches instead of queueing on the same rows
+        due = due.with_for_update(skip_locked=True)
+    rows = connection.execute(
+        update(Notification)
+        # Repeated outside the subquery: on SQLite a second worker's claim finds the rows already pushed ahead
+        .where(
+            Notification.id.in_(due.scalar_subquery()),
+            Notification.status == NotificationStatus.PENDING,
+            Notification.next_attempt_at <= now
+        )
+        .values(attempts=Notification.attempts + 1, next_attempt_at=now + timedelta(seconds=lease))
+        .returning(
+            Notification.id, Notification.recipient, Notification.subject, Notification.body,
+            Notification.attempts, Notification.created_at
+        )
+    ).all()
+    return sorted((OutboxMessage(*row) for row in rows), key=lambda message: message.id)
+
+def settle(connection: Connection, outcomes: Sequence[Outcome], max_attempts: int, now: Optional[datetime] = None) -> None:
+    now = now or datetime.utcnow()
+    sent = [outcome.message.id for outcome in outcomes if outcome.error is None]
+    if sent:
+        connection.execute(
+            update(Notification).where(Notification.id.in_(sent))
+            .values(status=NotificationStatus.SENT, sent_at=now, last_error=None)
+        )
+    for outcome in outcomes:
+        if outcome.error is None:
+            continue
+        if outcome.permanent or outcome.message.attempts >= max_attempts:
+            values = {"status": NotificationStatus.FAILED}
+        else:
+            values = {"next_attempt_at": now + timedelta(seconds=backoff_seconds(outcome.message.attempts))}
+        connection.execute(
+            update(Notification).where(Notification.id == outcome.message.id).values(last_error=outcome.error, **values)
+        )
+
+def queue_depth(connection: Connection) -> int:
+    return connection.scalar(
+        select(func.count()).select_from(Notification).where(Notification.status == NotificationStatus.PENDING)
+    ) or 0
+
+# Seconds from queueing to delivery
+DELIVERY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0, 3600.0)
+
+@dataclass
+class DeliveryStats:
+    sent: int = 0
+    retried: int = 0
+    failed: int = 0
+    batches: int = 0
+    errors: int = 0
+    # Pending rows, due or not, as of the last batch
+    depth: int = 0
+    latency: Histogram = field(default_factory=lambda: Histogram(DELIVERY_BUCKETS))
+
+    def record(self, outcomes: Sequence[Outcome], max_attempts: int, now: datetime) -> None:
+        self.batches += 1
+        for outcome in outcomes:
+            if outcome.error is None:
+                self.sent += 1
+                self.latency.observe(max((now - outcome.message.created_at).total_seconds(), 0.0))
+            elif outcome.permanent or outcome.message.attempts >= max_attempts:
+                self.failed += 1
+            else:
+                self.retried += 1
+
+class NotificationWorker:
+    def __init__(self, pool_factory: Callable[[], SMTPPool] = SMTPPool.from_settings):
+        self.pool_factory = pool_factory
+        self.stats = DeliveryStats()
+        self._pool: Optional[SMTPPool] = None
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
+    @property
+    def pool(self) -> SMTPPool:
+        if self._pool is None:
+            self._pool = self.pool_factory()
+        return self._pool
+
+    def wake(self) -> None:
+        """Run the next batch now; safe to call from any thread."""
+        loop, wakeup = self._loop, self._wakeup
+        if loop is not None and wakeup is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(wakeup.set)
+
+    def _split(self, messages: List[OutboxMessage]) -> List[List[OutboxMessage]]:
+        # One share per pooled connection, sent in parallel threads
+        shares = max(1, min(settings.SMTP_POOL_SIZE, len(messages)))
+        return [messages[index::shares] for index in range(shares)]
+
+    async def run_once(self) -> int:
+        """Claim, send and settle one batch; returns how many messages it held."""
+        from ..database import async_engine
+
+        async with async_engine.begin() as connection:
+            batch = await connection.run_sync(
+                claim_batch, settings.NOTIFICATION_BATCH_SIZE, settings.NOTIFICATION_LEASE_SECONDS
+            )
+        if batch:
+            shares = await asyncio.gather(*(asyncio.to_thread(self.pool.send_all, share) for share in self._split(batch)))
+            outcomes = [outcome for share in shares for outcome in share]
+            now = datetime.utcnow()
+            async with async_engine.begin() as connection:
+                await connection.run_sync(settle, outcomes, settings.NOTIFICATION_MAX_ATTEMPTS, now)
+            self.stats.record(outcomes, settings.NOTIFICATION_MAX_ATTEMPTS, now)
+        async with async_engine.connect() as connection:
+            self.stats.depth = await connection.run_sync(queue_depth)
+        return len(batch)
+
+    def drain(self, bind: Engine) -> DeliveryStats:
+        """Send everything due now, synchronously; for `python -m app.cli send-notifications`."""
+        stats = DeliveryStats()
+        while True:
+            with bind.begin() as connection:
+                batch = claim_batch(connection, settings.NOTIFICATION_BATCH_SIZE, settings.NOTIFICATION_LEASE_SECONDS)
+            if not batch:
+                break
+            outcomes = self.pool.send_all(batch)
+            now = datetime.utcnow()
+            with bind.begin() as connection:
+                settle(connection, outcomes, settings.NOTIFICATION_MAX_ATTEMPTS, now)
+            stats.record(outcomes, settings.NOTIFICATION_MAX_ATTEMPTS, now)
+        with bind.connect() as connection:
+            stats.depth = queue_depth(connection)
+        self.pool.close()
+        return stats
+
+    async def _run_forever(self) -> None:
+        while True:
+            self._wakeup.clear()
+            try:
+                if await self.run_once() >= settings.NOTIFICATION_BATCH_SIZE:
+                    # More may be due; go again without waiting
+                    continue
+            except Exception:
+                self.stats.errors += 1
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), settings.NOTIFICATION_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self) -> None:
+        if self._task is None:
+            self._loop = asyncio.get_running_loop()
+            self._wakeup = asyncio.Event()
+            self._task = self._loop.create_task(self._run_forever())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            self._loop = self._wakeup = None
+        if self._pool is not None:
+            await asyncio.to_thread(self._pool.close)
+
+notification_worker = NotificationWorker()
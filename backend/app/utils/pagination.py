@@ -0,0 +1,54 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Sequence
+from fastapi import HTTPException, status
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+def _encode_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {"dt": value.isoformat()}
+    return value
+
+def _decode_value(value: Any, kind: type) -> Any:
+    # Checked against the sort key's type: the database must never see a forged value of another type
+    if kind is datetime:
+        if not (isinstance(value, dict) and set(value) == {"dt"} and isinstance(value["dt"], str)):
+            raise ValueError(value)
+        decoded = datetime.fromisoformat(value["dt"])
+        if decoded.tzinfo is not None:
+            raise ValueError(value)
+        return decoded
+    # bool is an int subclass, but never a valid id
+    if kind is int and (not isinstance(value, int) or isinstance(value, bool)):
+        raise ValueError(value)
+    return value
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    raw = json.dumps([_encode_value(value) for value in values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str, types: Sequence[type]) -> List[Any]:
+    """The sort key values in `cursor`, one of each of `types` (int or datetime); 400 if it is not that."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(values, list) or len(values) != len(types):
+            raise ValueError(cursor)
+        return [_decode_value(value, kind) for value, kind in zip(values, types)]
+    except (ValueError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+def next_cursor(items: Sequence[Any], limit: int, key: Callable[[Any], Sequence[Any]]) -> Optional[str]:
+    # A short page is the last one; otherwise the last row's sort key resumes the scan
+    if items and len(items) >= limit:
+        return encode_cursor(key(items[-1]))
+    return None
+
+def cursor_headers(items: Sequence[Any], limit: int, key: Callable[[Any], Sequence[Any]]) -> Dict[str, str]:
+    cursor = next_cursor(items, limit, key)
+    return {NEXT_CURSOR_HEADER: cursor} if cursor else {}
@@ -0,0 +1,152 @@
+import asyncio
+import multiprocessing
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Callable, List, Optional, Sequence, Tuple, TypeVar
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+from ..config import settings
+
+T = TypeVar("T")
+
+_contexts = {}
+
+def _context(rounds: int) -> CryptContext:
+    # Built lazily per cost so worker processes only pay for it once
+    context = _contexts.get(rounds)
+    if context is None:
+        context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=rounds)
+        _contexts[rounds] = context
+    return context
+
+# Module-level so they can be pickled into the worker processes
+
+def _hash(password: str, rounds: int) -> str:
+    return _context(rounds).hash(password)
+
+def _verify(password: str, hashed_password: str, rounds: int) -> bool:
+    return _context(rounds).verify(password, hashed_password)
+
+def _verify_and_update(password: str, hashed_password: str, rounds: int) -> Tuple[bool, Optional[str]]:
+    return _context(rounds).verify_and_update(password, hashed_password)
+
+def _hash_batch(passwords: List[str], rounds: int) -> List[str]:
+    context = _context(rounds)
+    return [context.hash(password) for password in passwords]
+
+class PasswordHasher:
+    """Runs bcrypt on a size-bounded process pool, off the web worker's request threads.
+
+    At most `workers + queue_size` hashes may be running or waiting at once. Callers
+    beyond that wait up to `queue_timeout` seconds for a free place and then get a
+    503, so a login storm can only ever tie up that many of the request threads.
+    With `workers=0` hashing runs inline in the calling thread.
+    """
+
+    def __init__(self, rounds: int, workers: int, queue_size: int, queue_timeout: float):
+        self.rounds = rounds
+        self.workers = workers
+        self.queue_timeout = queue_timeout
+        self._slots = threading.BoundedSemaphore(max(workers, 1) + queue_size)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def hash(self, password: str) -> str:
+        return self._run(_hash, password, self.rounds)
+
+    def verify(self, password: str, hashed_password: str) -> bool:
+        return self._run(_verify, password, hashed_password, self.rounds)
+
+    def verify_and_update(self, password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """Verify, and return a fresh hash when the stored one uses an outdated cost."""
+        return self._run(_verify_and_update, password, hashed_password, self.rounds)
+
+    async def hash_async(self, password: str) -> str:
+        return await self._run_async(_hash, password, self.rounds)
+
+    async def verify_async(self, password: str, hashed_password: str) -> bool:
+        return await self._run_async(_verify, password, hashed_password, self.rounds)
+
+    async def verify_and_update_async(self, password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        return await self._run_async(_verify_and_update, password, hashed_password, self.rounds)
+
+    async def hash_many_async(self, passwords: Sequence[str]) -> List[str]:
+        """Hash a batch across every worker, one slot per worker-sized share.
+
+        Holding at most `workers` slots leaves the rest of the queue to interactive logins.
+        """
+        if not passwords:
+            return []
+        shares = max(self.workers, 1)
+        size = -(-len(passwords) // shares)
+        batches = [list(passwords[i:i + size]) for i in range(0, len(passwords), size)]
+        results = await asyncio.gather(*[
+            self._run_async(_hash_batch, batch, self.rounds) for batch in batches
+        ])
+        return [hashed for batch in results for hashed in batch]
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # spawn, not fork: the web worker is multi-threaded by the time this runs
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._executor
+
+    def _acquire(self) -> None:
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Server is busy, please retry",
+                headers={"Retry-After": "1"},
+            )
+
+    def _submit(self, fn: Callable[..., T], *args) -> "Future[T]":
+        future = self._get_executor().submit(fn, *args)
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def _run(self, fn: Callable[..., T], *args) -> T:
+        self._acquire()
+        if self.workers <= 0:
+            try:
+                return fn(*args)
+            finally:
+                self._slots.release()
+        try:
+            future = self._submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        return future.result()
+
+    async def _run_async(self, fn: Callable[..., T], *args) -> T:
+        if not self._slots.acquire(blocking=False):
+            # Wait for a slot off the event loop
+            await asyncio.get_running_loop().run_in_executor(None, self._acquire)
+        if self.workers <= 0:
+            try:
+                return await asyncio.get_running_loop().run_in_executor(None, fn, *args)
+            finally:
+                self._slots.release()
+        try:
+            future = self._submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        return await asyncio.wrap_future(future)
+
+password_hasher = PasswordHasher(
+    rounds=settings.BCRYPT_ROUNDS,
+    workers=settings.PASSWORD_HASH_WORKERS,
+    queue_size=settings.PASSWORD_HASH_QUEUE_SIZE,
+    queue_timeout=settings.PASSWORD_HASH_QUEUE_TIMEOUT
+)
@@ -0,0 +1,228 @@
+import codecs
+import csv
+import json
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple
+from fastapi.concurrency import run_in_threadpool
+from pydantic import ValidationError
+from sqlalchemy import insert, or_, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..config import settings
+from ..models.patient import Patient
+from ..models.user import User, UserRole
+from ..schemas import PatientCreate, UserCreate
+from .passwords import password_hasher
+from .patient_search import index_patients
+from .sequences import patient_ids
+from .stats import GLOBAL_SCOPE, PATIENTS, apply_deltas
+
+# Columns that belong to the nested user; CSV headers may also spell them "user.email"
+USER_FIELDS = set(UserCreate.model_fields)
+
+@dataclass
+class ImportReport:
+    total: int = 0
+    imported: int = 0
+    failed: int = 0
+    errors: List[Dict[str, Any]] = field(default_factory=list)
+
+    def fail(self, row: int, messages: List[str]) -> None:
+        self.failed += 1
+        # The counts stay exact; only the detail list is capped
+        if len(self.errors) < settings.PATIENT_IMPORT_MAX_ERRORS:
+            self.errors.append({"row": row, "errors": messages})
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Decode a UTF-8 byte stream into lines without holding the whole body."""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    pending = ""
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending.rstrip("\r")
+
+def _nest(flat: Dict[str, Any]) -> Dict[str, Any]:
+    # Empty cells are absent values, not empty strings
+    record: Dict[str, Any] = {"user": {}}
+    for key, value in flat.items():
+        if key is None or value is None or value == "":
+            continue
+        key = key.strip()
+        if key.startswith("user."):
+            record["user"][key[5:]] = value
+        elif key in USER_FIELDS:
+            record["user"][key] = value
+        else:
+            record[key] = value
+    return record
+
+async def iter_csv_records(lines: AsyncIterator[str]) -> AsyncIterator[Tuple[int, Any]]:
+    """(row number, record or error message); row 1 is the first line after the header."""
+    header: Optional[List[str]] = None
+    buffer: List[str] = []
+    row = 0
+    async for line in lines:
+        buffer.append(line)
+        text = "\n".join(buffer)
+        # An odd number of quotes means a quoted field continues on the next line
+        if text.count('"') % 2:
+            continue
+        buffer = []
+        if not text.strip():
+            continue
+        values = next(csv.reader([text]))
+        if header is None:
+            header = values
+            continue
+        row += 1
+        if len(values) > len(header):
+            yield row, f"Expected {len(header)} columns, got {len(values)}"
+            continue
+        yield row, _nest(dict(zip(header, values)))
+    if buffer:
+        yield row + 1, "Unterminated quoted field"
+
+async def iter_ndjson_records(lines: AsyncIterator[str]) -> AsyncIterator[Tuple[int, Any]]:
+    row = 0
+    async for line in lines:
+        if not line.strip():
+            continue
+        row += 1
+        try:
+            value = json.loads(line)
+        except ValueError as error:
+            yield row, f"Invalid JSON: {error}"
+            continue
+        if not isinstance(value, dict):
+            yield row, "Expected a JSON object"
+            continue
+        # Accept both the register_patient body shape and flat objects
+        yield row, value if isinstance(value.get("user"), dict) else _nest(value)
+
+def _validate(record: Dict[str, Any]) -> PatientCreate:
+    # Imported accounts are always patients, whatever the row says
+    record.setdefault("user", {})["role"] = UserRole.PATIENT.value
+    return PatientCreate.model_validate(record)
+
+def _messages(error: ValidationError) -> List[str]:
+    return [".".join(str(part) for part in item["loc"]) + ": " + item["msg"] for item in error.errors()]
+
+class PatientImporter:
+    """Validates, hashes and bulk-inserts patients in chunks, one commit per chunk."""
+
+    def __init__(self, db: AsyncSession, chunk_size: Optional[int] = None):
+        self.db = db
+        self.chunk_size = chunk_size or settings.PATIENT_IMPORT_CHUNK_SIZE
+        self.report = ImportReport()
+        self._chunk: List[Tuple[int, PatientCreate]] = []
+
+    async def run(self, records: AsyncIterator[Tuple[int, Any]]) -> ImportReport:
+        async for row, record in records:
+            self.report.total += 1
+            if isinstance(record, str):
+                self.report.fail(row, [record])
+                continue
+            try:
+                self._chunk.append((row, _validate(record)))
+            except ValidationError as error:
+                self.report.fail(row, _messages(error))
+                continue
+            if len(self._chunk) >= self.chunk_size:
+                await self._flush()
+        await self._flush()
+        self.report.errors.sort(key=lambda error: error["row"])
+        return self.report
+
+    async def _flush(self) -> None:
+        chunk, self._chunk = self._chunk, []
+        chunk = await self._drop_duplicates(chunk)
+        if not chunk:
+            return
+        # Full BCRYPT_ROUNDS cost; the speed comes from spreading the chunk over the hashing pool
+        hashes = await password_hasher.hash_many_async([data.user.password for _, data in chunk])
+        # IDs come from the allocator's own connection, before this session writes
+        numbers = await run_in_threadpool(patient_ids.next_ids, len(chunk))
+        rows = [(row, data, hashed, number) for (row, data), hashed, number in zip(chunk, hashes, numbers)]
+        try:
+            await self._insert(rows)
+            await self.db.commit()
+            self.report.imported += len(rows)
+        except IntegrityError:
+            # A concurrent registration took an email or username; find the row one by one
+            await self.db.rollback()
+            for item in rows:
+                try:
+                    await self._insert([item])
+                    await self.db.commit()
+                    self.report.imported += 1
+                except IntegrityError:
+                    await self.db.rollback()
+                    self.report.fail(item[0], ["user: Email or username already registered"])
+
+    async def _drop_duplicates(self, chunk: List[Tuple[int, PatientCreate]]) -> List[Tuple[int, PatientCreate]]:
+        if not chunk:
+            return chunk
+        emails = {data.user.email for _, data in chunk}
+        usernames = {data.user.username for _, data in chunk}
+        result = await self.db.execute(
+            select(User.email, User.username).where(or_(User.email.in_(emails), User.username.in_(usernames)))
+        )
+        taken_emails: Set[str] = set()
+        taken_usernames: Set[str] = set()
+        for email, username in result:
+            taken_emails.add(email)
+            taken_usernames.add(username)
+        kept = []
+        for row, data in chunk:
+            # Also catches repeats within the file: the first occurrence wins
+            if data.user.email in taken_emails or data.user.username in taken_usernames:
+                self.report.fail(row, ["user: Email or username already registered"])
+                continue
+            taken_emails.add(data.user.email)
+            taken_usernames.add(data.user.username)
+            kept.append((row, data))
+        return kept
+
+    async def _insert(self, rows: List[Tuple[int, PatientCreate, str, str]]) -> None:
+        # Bulk INSERT ... RETURNING, one statement per table per chunk
+        user_ids = (await self.db.scalars(
+            insert(User).returning(User.id, sort_by_parameter_order=True),
+            [
+                {
+                    "email": data.user.email,
+                    "username": data.user.username,
+                    "full_name": data.user.full_name,
+                    "hashed_password": hashed,
+                    "role": UserRole.PATIENT,
+                    "is_active": True,
+                }
+                for _, data, hashed, _ in rows
+            ]
+        )).all()
+        new_ids = (await self.db.scalars(
+            insert(Patient).returning(Patient.id, sort_by_parameter_order=True),
+            [
+                dict(data.model_dump(exclude={"user"}), user_id=user_id, patient_id=number)
+                for (_, data, _, number), user_id in zip(rows, user_ids)
+            ]
+        )).all()
+        # Bulk inserts skip mapper events, so index for search and count explicitly
+        await self.db.run_sync(lambda session: self._after_insert(session.connection(), new_ids))
+
+    @staticmethod
+    def _after_insert(connection, new_ids: List[int]) -> None:
+        index_patients(connection, new_ids)
+        apply_deltas(connection, {(GLOBAL_SCOPE, PATIENTS): len(new_ids)})
+
+def records_for(content_type: str, lines: AsyncIterator[str]) -> Optional[AsyncIterator[Tuple[int, Any]]]:
+    media_type = content_type.split(";")[0].strip().lower()
+    if media_type in ("text/csv", "application/csv"):
+        return iter_csv_records(lines)
+    if media_type in ("application/x-ndjson", "application/ndjson", "application/jsonl", "application/json-lines"):
+        return iter_ndjson_records(lines)
+    return None
@@ -0,0 +1,137 @@
+"""Full-text index over patient name, hospital ID, phone, allergies and medical history.
+
+SQLite keeps it in an FTS5 table keyed by rowid = patients.id; PostgreSQL in a table of
+tsvectors with a GIN index, where name, hospital ID and phone carry weight A. Both are created by migration 0004 and kept in step
+with writes by the mapper events below, inside the writing transaction.
+"""
+import re
+from typing import Iterable, List, Optional, Tuple
+from sqlalchemy import Integer, Select, bindparam, event, inspect, select, text
+from sqlalchemy.engine import Connection
+from ..models.patient import Patient
+from ..models.user import User
+
+# Document source rows; the index statements append a WHERE clause to pick the patients
+_SOURCE = "FROM patients p JOIN users u ON u.id = p.user_id"
+
+def _pg_vector(column: str, weight: str) -> str:
+    # Split on punctuation ourselves so "PAT-00012" and "555-0101" index as separate words
+    return f"setweight(to_tsvector('simple', regexp_replace(coalesce({column}, ''), '[^[:alnum:]]+', ' ', 'g')), '{weight}')"
+
+_INDEX_SQL = {
+    "sqlite": (
+        "INSERT INTO patient_search (rowid, full_name, patient_number, phone, allergies, medical_history) "
+        f"SELECT p.id, u.full_name, p.patient_id, p.phone, p.allergies, p.medical_history {_SOURCE}"
+    ),
+    "postgresql": (
+        "INSERT INTO patient_search (patient_id, document) SELECT p.id, "
+        + " || ".join([
+            _pg_vector("u.full_name", "A"),
+            _pg_vector("p.patient_id", "A"),
+            _pg_vector("p.phone", "A"),
+            _pg_vector("p.allergies", "B"),
+            _pg_vector("p.medical_history", "C"),
+        ])
+        + f" {_SOURCE}"
+    ),
+}
+
+_DELETE_SQL = {
+    "sqlite": "DELETE FROM patient_search WHERE rowid IN :ids",
+    "postgresql": "DELETE FROM patient_search WHERE patient_id IN :ids",
+}
+
+# bm25()/ts_rank() score every match before LIMIT applies, which is a full pass over the
+# index for a common term. Rank in tiers instead: patients matching on name, hospital ID
+# or phone come before those matching only on allergies or history. Each tier reads at
+# most :limit entries of the index.
+_SEARCH_SQL = """SELECT id, MIN(tier) AS rank FROM (
+    SELECT * FROM ({identity} LIMIT :limit) AS identity_hits
+    UNION ALL
+    SELECT * FROM ({anywhere} LIMIT :limit) AS anywhere_hits
+) AS tiers GROUP BY id ORDER BY rank, id LIMIT :limit"""
+
+_TIER_SQL = {
+    "sqlite": "SELECT rowid AS id, {tier} AS tier FROM patient_search WHERE patient_search MATCH :{param}",
+    "postgresql": "SELECT patient_id AS id, {tier} AS tier FROM patient_search WHERE document @@ to_tsquery('simple', :{param})",
+}
+
+def supports_search(dialect: str) -> bool:
+    return dialect in _INDEX_SQL
+
+def _terms(query: str) -> List[str]:
+    return re.findall(r"\w+", query.lower())
+
+def _match_expressions(dialect: str, terms: List[str]) -> Tuple[str, str]:
+    # Every term must match, each as a prefix so partial names and numbers find results.
+    # Returns (identity fields only, any field)
+    if dialect == "sqlite":
+        anywhere = " ".join(f'"{term}"*' for term in terms)
+        return f"{{full_name patient_number phone}} : ({anywhere})", anywhere
+    return " & ".join(f"{term}:*A" for term in terms), " & ".join(f"{term}:*" for term in terms)
+
+def search_query(dialect: str, query: str, limit: int) -> Optional[Select]:
+    """Patients matching every term of `query`, best match first; None if it has no terms."""
+    terms = _terms(query)
+    if not terms:
+        return None
+    identity, anywhere = _match_expressions(dialect, terms)
+    sql = _SEARCH_SQL.format(
+        identity=_TIER_SQL[dialect].format(tier=0, param="identity"),
+        anywhere=_TIER_SQL[dialect].format(tier=1, param="anywhere"),
+    )
+    hits = text(sql).bindparams(identity=identity, anywhere=anywhere, limit=limit) \
+        .columns(id=Integer, rank=Integer).subquery("hits")
+    return select(Patient).join(hits, hits.c.id == Patient.id).order_by(hits.c.rank, hits.c.id)
+
+def _unindex(connection: Connection, ids: List[int]) -> None:
+    connection.execute(
+        text(_DELETE_SQL[connection.dialect.name]).bindparams(bindparam("ids", expanding=True)), {"ids": ids}
+    )
+
+def index_patients(connection: Connection, patient_ids: Iterable[int]) -> None:
+    dialect = connection.dialect.name
+    ids = list(patient_ids)
+    if not ids or not supports_search(dialect):
+        return
+    _unindex(connection, ids)
+    connection.execute(
+        text(f"{_INDEX_SQL[dialect]} WHERE p.id IN :ids").bindparams(bindparam("ids", expanding=True)),
+        {"ids": ids}
+    )
+
+def rebuild_patient_search(connection: Connection) -> int:
+    """Re-index every patient; returns how many were indexed."""
+    dialect = connection.dialect.name
+    if not supports_search(dialect):
+        return 0
+    connection.execute(text("DELETE FROM patient_search"))
+    return connection.execute(text(_INDEX_SQL[dialect])).rowcount
+
+# Re-index on writes, in the same transaction, when an indexed column changed
+_PATIENT_FIELDS = ("user_id", "patient_id", "phone", "allergies", "medical_history")
+
+def _changed(target, fields: Iterable[str]) -> bool:
+    state = inspect(target)
+    return any(state.attrs[field].history.has_changes() for field in fields)
+
+def _index_patient(mapper, connection, target) -> None:
+    index_patients(connection, [target.id])
+
+def _reindex_patient(mapper, connection, target) -> None:
+    if _changed(target, _PATIENT_FIELDS):
+        index_patients(connection, [target.id])
+
+def _unindex_patient(mapper, connection, target) -> None:
+    if supports_search(connection.dialect.name):
+        _unindex(connection, [target.id])
+
+def _reindex_user(mapper, connection, target) -> None:
+    if _changed(target, ("full_name",)):
+        patient_ids = connection.execute(select(Patient.id).where(Patient.user_id == target.id)).scalars().all()
+        index_patients(connection, patient_ids)
+
+event.listen(Patient, "after_insert", _index_patient)
+event.listen(Patient, "after_update", _reindex_patient)
+event.listen(Patient, "after_delete", _unindex_patient)
+event.listen(User, "after_update", _reindex_user)
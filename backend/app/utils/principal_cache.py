@@ -0,0 +1,178 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple, Union
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, make_transient_to_detached
+from ..config import settings
+from ..models.doctor import Doctor
+from ..models.patient import Patient
+from ..models.user import User
+
+def _snapshot(obj: Any) -> Optional[Dict[str, Any]]:
+    if obj is None:
+        return None
+    return {attr.key: getattr(obj, attr.key) for attr in obj.__mapper__.column_attrs}
+
+def _restore(model: Any, values: Optional[Dict[str, Any]], db: Union[Session, AsyncSession]) -> Any:
+    # Rebuild a persistent, unmodified instance in this session without touching the database
+    if values is None:
+        return None
+    obj = model(**values)
+    make_transient_to_detached(obj)
+    db.add(obj)
+    return obj
+
+class CachedPrincipal:
+    """Column values of a user and their profiles, detached from any session."""
+
+    def __init__(self, user: User, patient: Optional[Patient], doctor: Optional[Doctor]):
+        self.user_id = user.id
+        self.user = _snapshot(user)
+        self.patient = _snapshot(patient)
+        self.doctor = _snapshot(doctor)
+
+    def attach(self, db: Union[Session, AsyncSession]) -> Tuple[User, Optional[Patient], Optional[Doctor]]:
+        return (
+            _restore(User, self.user, db),
+            _restore(Patient, self.patient, db),
+            _restore(Doctor, self.doctor, db),
+        )
+
+class LocalPubSub:
+    """In-process stand-in for a broker channel (e.g. Redis pub/sub) shared by cache instances."""
+
+    def __init__(self):
+        self._subscribers: List[Callable[[Any], None]] = []
+        self._lock = threading.Lock()
+
+    def subscribe(self, callback: Callable[[Any], None]) -> None:
+        with self._lock:
+            self._subscribers.append(callback)
+
+    def publish(self, message: Any) -> None:
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for callback in subscribers:
+            callback(message)
+
+class PrincipalCache:
+    """Bounded LRU cache of resolved principals keyed by token subject, with a TTL."""
+
+    def __init__(self, maxsize: int, ttl: float, bus: Optional[LocalPubSub] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.bus = bus
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._entries: "OrderedDict[str, Tuple[float, CachedPrincipal]]" = OrderedDict()
+        self._subjects_by_user: Dict[int, str] = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+        if bus is not None:
+            bus.subscribe(self._on_message)
+
+    def get(self, subject: str) -> Optional[CachedPrincipal]:
+        with self._lock:
+            entry = self._entries.get(subject)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    self._drop(subject)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(subject)
+            self.hits += 1
+            return entry[1]
+
+    def generation(self) -> int:
+        with self._lock:
+            return self._generation
+
+    def put(self, subject: str, principal: CachedPrincipal, generation: int) -> None:
+        with self._lock:
+            # An invalidation ran while this principal was being loaded; it may be stale
+            if generation != self._generation or self.maxsize <= 0:
+                return
+            self._drop(subject)
+            self._entries[subject] = (time.monotonic() + self.ttl, principal)
+            self._subjects_by_user[principal.user_id] = subject
+            while len(self._entries) > self.maxsize:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.evictions += 1
+
+    def invalidate_users(self, user_ids: Set[int], publish: bool = True) -> None:
+        with self._lock:
+            self._generation += 1
+            for user_id in user_ids:
+                subject = self._subjects_by_user.get(user_id)
+                if subject is not None:
+                    self._drop(subject)
+                    self.invalidations += 1
+        if publish and self.bus is not None:
+            self.bus.publish((id(self), sorted(user_ids)))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._subjects_by_user.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+    def _drop(self, subject: str) -> None:
+        entry = self._entries.pop(subject, None)
+        if entry is not None and self._subjects_by_user.get(entry[1].user_id) == subject:
+            del self._subjects_by_user[entry[1].user_id]
+
+    def _on_message(self, message: Tuple[int, List[int]]) -> None:
+        sender, user_ids = message
+        if sender != id(self):
+            self.invalidate_users(set(user_ids), publish=False)
+
+principal_bus = LocalPubSub() if settings.PRINCIPAL_CACHE_PUBSUB == "local" else None
+principal_cache = PrincipalCache(
+    maxsize=settings.PRINCIPAL_CACHE_SIZE if settings.PRINCIPAL_CACHE_ENABLED else 0,
+    ttl=settings.PRINCIPAL_CACHE_TTL_SECONDS,
+    bus=principal_bus
+)
+
+# Invalidate after commit so a concurrent request cannot re-cache the pre-update row.
+# Ids queued by a transaction that rolls back are flushed by the session's next commit,
+# which costs one needless cache miss at most.
+_PENDING_KEY = "principal_cache_invalidations"
+
+def _queue_invalidation(mapper, connection, target) -> None:
+    user_id = target.id if isinstance(target, User) else target.user_id
+    if user_id is None:
+        return
+    session = Session.object_session(target)
+    if session is not None:
+        session.info.setdefault(_PENDING_KEY, set()).add(user_id)
+
+for _model in (User, Patient, Doctor):
+    event.listen(_model, "after_update", _queue_invalidation)
+    event.listen(_model, "after_delete", _queue_invalidation)
+for _model in (Patient, Doctor):
+    event.listen(_model, "after_insert", _queue_invalidation)
+
+@event.listens_for(Session, "after_commit")
+def _flush_invalidations(session: Session) -> None:
+    user_ids = session.info.pop(_PENDING_KEY, None)
+    if user_ids:
+        principal_cache.invalidate_users(user_ids)
@@ -0,0 +1,125 @@
+import asyncio
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Sequence, Union
+from pydantic import TypeAdapter
+from sqlalchemy import event, func, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from ..database import AsyncSessionLocal, async_engine
+from ..models.appointment import Appointment
+from ..models.doctor import Doctor
+from ..models.patient import Patient
+from ..models.user import User, UserRole
+
+class QueryCounter:
+    """Statements executed on an engine while the counter is active."""
+
+    def __init__(self):
+        self.statements: List[str] = []
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    def assert_at_most(self, expected: int) -> None:
+        if self.count > expected:
+            listing = "\n".join(self.statements)
+            raise AssertionError(f"Expected at most {expected} queries, ran {self.count}:\n{listing}")
+
+@contextmanager
+def count_queries(bind: Union[Engine, AsyncEngine]) -> Iterator[QueryCounter]:
+    target = bind.sync_engine if isinstance(bind, AsyncEngine) else bind
+    counter = QueryCounter()
+
+    def before(conn, cursor, statement, parameters, context, executemany):
+        counter.statements.append(statement)
+
+    event.listen(target, "before_cursor_execute", before)
+    try:
+        yield counter
+    finally:
+        event.remove(target, "before_cursor_execute", before)
+
+@dataclass
+class ListEndpoint:
+    name: str
+    model: Any
+    # None when the call already returns the serialized body
+    response_model: Any
+    call: Callable[[AsyncSession, User, int], Awaitable[Any]]
+
+def _endpoints() -> List[ListEndpoint]:
+    from ..api import appointments, doctors, patients
+    from .security import Actor
+
+    return [
+        ListEndpoint(
+            "GET /api/patients/", Patient, None,
+            lambda db, admin, limit: patients.get_all_patients(limit=limit, fields=None, db=db, current_user=admin)
+        ),
+        ListEndpoint(
+            # Bypasses the directory cache
+            "GET /api/doctors/", Doctor, None,
+            lambda db, admin, limit: doctors.load_directory_page(db, 0, limit, None, None, None)
+        ),
+        ListEndpoint(
+            "GET /api/appointments/", Appointment, None,
+            lambda db, admin, limit: appointments.get_appointments(
+                limit=limit, fields=None, expand=None, db=db, actor=Actor(admin)
+            )
+        ),
+        ListEndpoint(
+            # One IN query per relation, whatever the page size
+            "GET /api/appointments/?expand=doctor,patient", Appointment, None,
+            lambda db, admin, limit: appointments.get_appointments(
+                limit=limit, fields=None, expand="doctor,patient", db=db, actor=Actor(admin)
+            )
+        ),
+    ]
+
+def _principal() -> User:
+    # The list endpoints only look at the caller's role, so an unsaved admin will do,
+    # and the check runs on any database, one filled by generate-data alone included
+    return User(
+        id=0, email="query-counts@localhost", username="query-counts", full_name="Query count check",
+        role=UserRole.ADMIN, is_active=True
+    )
+
+@dataclass
+class QueryCountResult:
+    endpoint: str
+    rows: int
+    # Page size -> statements run to fetch and serialize one page
+    counts: Dict[int, int]
+
+    @property
+    def ok(self) -> bool:
+        return len(set(self.counts.values())) <= 1
+
+async def _check(page_sizes: Sequence[int]) -> List[QueryCountResult]:
+    results = []
+    try:
+        admin = _principal()
+        async with AsyncSessionLocal() as db:
+            for endpoint in _endpoints():
+                rows = await db.scalar(select(func.count()).select_from(endpoint.model))
+                adapter = TypeAdapter(List[endpoint.response_model]) if endpoint.response_model else None
+                counts = {}
+                for limit in page_sizes:
+                    # Start from an empty identity map so earlier pages cannot hide lazy loads
+                    db.expunge_all()
+                    with count_queries(async_engine) as counter:
+                        items = await endpoint.call(db, admin, limit)
+                        if adapter is not None:
+                            adapter.validate_python(items)
+                    counts[limit] = counter.count
+                results.append(QueryCountResult(endpoint.name, rows or 0, counts))
+    finally:
+        # aiosqlite connections run on their own threads, which would keep the process alive
+        await async_engine.dispose()
+    return results
+
+def check_query_counts(page_sizes: Sequence[int] = (1, 10, 100)) -> List[QueryCountResult]:
+    """Run each list endpoint at several page sizes and report the statements per page."""
+    return asyncio.run(_check(page_sizes))
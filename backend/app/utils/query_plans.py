@@ -0,0 +1,214 @@
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Callable, Iterator, List, Optional
+from sqlalchemy import event, select, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session
+from ..models.appointment import RELEASED_STATUSES, Appointment, AppointmentStatus
+from ..models.doctor import Doctor
+from ..models.patient import Patient
+from ..models.user import User
+from .appointment_scheduler import default_lookback, overdue_query, reminders_query, timeline_query, transitions
+from .exports import appointments_query, patients_query
+from .rollups import doctor_totals_query, slot_totals_query
+from .patient_search import search_query, supports_search
+from .security import principal_query
+from .specializations import counts_query
+
+@dataclass
+class QueryShape:
+    name: str
+    build: Callable[[Session], Any]
+    # Set when a scan is known and accepted; the reason is printed with the report
+    allow_scan: Optional[str] = None
+
+@dataclass
+class PlanResult:
+    shape: QueryShape
+    scanned_tables: List[str]
+    plan: List[str]
+
+    @property
+    def ok(self) -> bool:
+        return not self.scanned_tables or self.shape.allow_scan is not None
+
+def _shapes(dialect: str) -> List[QueryShape]:
+    # Endpoint shapes come from the builders the routes themselves call
+    from ..api.appointments import appointment_summary_rows, appointments_page
+    from ..api.doctors import directory_page, doctors_by_id
+    from ..api.patients import patient_summary_rows, patients_by_id, patients_page
+
+    now = datetime.utcnow()
+    length = timedelta(minutes=30)
+    offset_scan = "offset pages walk the list in order from the start; cursor mode is the indexed path"
+    shapes = [
+        QueryShape("auth: user by email", lambda db: select(User).where(User.email == "a@b.c")),
+        QueryShape("auth: principal by email", lambda db: principal_query("a@b.c")),
+        QueryShape("patients: by id", lambda db: select(Patient).where(Patient.id == 1)),
+        QueryShape("patients: by ids", lambda db: patients_by_id([1, 2, 3])),
+        QueryShape("patients: list cursor", lambda db: patients_page(patient_summary_rows, True, 0, 100, after=100)),
+        QueryShape(
+            "patients: list offset",
+            lambda db: patients_page(patient_summary_rows, True, 5000, 100),
+            allow_scan=offset_scan
+        ),
+        QueryShape("doctors: by id", lambda db: select(Doctor).where(Doctor.id == 1)),
+        QueryShape("doctors: by ids", lambda db: doctors_by_id([1, 2, 3])),
+        QueryShape("doctors: list cursor", lambda db: directory_page(0, 100, after=100)),
+        QueryShape("doctors: list offset", lambda db: directory_page(5000, 100), allow_scan=offset_scan),
+        QueryShape("doctors: specialization filter", lambda db: directory_page(0, 100, after=100, specialization_id=1)),
+        QueryShape(
+            "doctors: specialization substring filter",
+            lambda db: directory_page(0, 100, after=100, specialization="ology"),
+            allow_scan="the catalog has one row per distinct specialization; PostgreSQL uses its pg_trgm index"
+        ),
+        QueryShape("specializations: prefix lookup", lambda db: counts_query("cardio")),
+        QueryShape("appointments: by id", lambda db: select(Appointment).where(Appointment.id == 1)),
+        QueryShape(
+            "appointments: patient list",
+            lambda db: appointments_page(appointment_summary_rows, 0, 100, patient_id=1)
+        ),
+        QueryShape(
+            "appointments: patient list offset",
+            lambda db: appointments_page(appointment_summary_rows, 500, 100, patient_id=1)
+        ),
+        QueryShape(
+            "appointments: patient list by status",
+            lambda db: appointments_page(appointment_summary_rows, 0, 100, patient_id=1, status=AppointmentStatus.PENDING)
+        ),
+        QueryShape(
+            "appointments: doctor list cursor",
+            lambda db: appointments_page(appointment_summary_rows, 0, 100, after=(now, 100), doctor_id=1)
+        ),
+        QueryShape(
+            "appointments: doctor list offset",
+            lambda db: appointments_page(appointment_summary_rows, 500, 100, doctor_id=1)
+        ),
+        QueryShape(
+            "appointments: admin list by status",
+            lambda db: appointments_page(appointment_summary_rows, 0, 100, status=AppointmentStatus.CONFIRMED)
+        ),
+        QueryShape(
+            "appointments: admin list cursor",
+            lambda db: appointments_page(appointment_summary_rows, 0, 100, after=(now, 100))
+        ),
+        QueryShape(
+            "appointments: admin list offset",
+            lambda db: appointments_page(appointment_summary_rows, 5000, 100),
+            allow_scan=offset_scan
+        ),
+        QueryShape(
+            "scheduling: conflict check",
+            lambda db: db.query(Appointment.id).filter(
+                Appointment.doctor_id == 1,
+                Appointment.appointment_date > now - length,
+                Appointment.appointment_date < now + length,
+                Appointment.status.not_in(RELEASED_STATUSES)
+            ).limit(1)
+        ),
+        QueryShape(
+            "scheduling: booked slots",
+            lambda db: db.query(Appointment.appointment_date).filter(
+                Appointment.doctor_id == 1,
+                Appointment.appointment_date > now - length,
+                Appointment.appointment_date < now + timedelta(days=7),
+                Appointment.status.not_in(RELEASED_STATUSES)
+            ).order_by(Appointment.appointment_date)
+        ),
+        QueryShape("exports: appointments by date range", lambda db: appointments_query(now - timedelta(days=30), now)),
+        QueryShape(
+            "exports: doctor appointments by date range",
+            lambda db: appointments_query(now - timedelta(days=30), now).where(Appointment.doctor_id == 1)
+        ),
+        QueryShape(
+            "exports: patients",
+            lambda db: patients_query(None, None),
+            allow_scan="a full export reads every patient; rows stream in primary-key order"
+        ),
+        QueryShape(
+            "analytics: doctor totals",
+            lambda db: doctor_totals_query(now.date() - timedelta(days=400), now.date())
+        ),
+        QueryShape(
+            "analytics: one doctor's slots",
+            lambda db: slot_totals_query(now.date() - timedelta(days=400), now.date(), doctor_id=1)
+        ),
+        QueryShape(
+            "scheduler: overdue appointments",
+            lambda db: overdue_query(transitions()[0], now - default_lookback(), now, 500)
+        ),
+        QueryShape("scheduler: reminders due", lambda db: reminders_query((now, 0), now + timedelta(hours=2), 500)),
+        QueryShape("scheduler: timeline", lambda db: timeline_query(now, now + timedelta(minutes=1))),
+    ]
+    if supports_search(dialect):
+        shapes.append(QueryShape("patients: search", lambda db: search_query(dialect, "smith john", 20)))
+    return shapes
+
+def _sqlite_scans(rows: List[Any]) -> List[str]:
+    # EXPLAIN QUERY PLAN rows are (id, parent, notused, detail); a bare "SCAN <table>"
+    # walks the whole table, "SCAN <table> USING INDEX" walks an index in order
+    scans = []
+    # Subqueries run as co-routines or temp tables are scanned too; their own plans are checked
+    subqueries = set()
+    for row in rows:
+        words = str(row[-1]).split()
+        if len(words) > 1 and words[0] in ("CO-ROUTINE", "MATERIALIZE"):
+            subqueries.add(words[1])
+    for row in rows:
+        detail = str(row[-1])
+        words = detail.split()
+        # An FTS table queried through MATCH shows as "SCAN <table> VIRTUAL TABLE INDEX 0:M5"
+        virtual_lookup = "VIRTUAL" in words and not words[-1].endswith(":")
+        if words and words[0] == "SCAN" and "USING" not in words and "CONSTANT" not in words and not virtual_lookup:
+            name = words[2] if len(words) > 2 and words[1] == "TABLE" else words[1]
+            if name not in subqueries:
+                scans.append(name)
+    return scans
+
+def _postgres_nodes(node: dict) -> Iterator[dict]:
+    yield node
+    for child in node.get("Plans", []):
+        yield from _postgres_nodes(child)
+
+def _postgres_scans(rows: List[Any]) -> List[str]:
+    plan = rows[0][0][0]["Plan"]
+    return [node["Relation Name"] for node in _postgres_nodes(plan) if node["Node Type"] == "Seq Scan"]
+
+def _explain(connection: Connection, shape: QueryShape) -> PlanResult:
+    dialect = connection.dialect.name
+    prefix = "EXPLAIN QUERY PLAN " if dialect == "sqlite" else "EXPLAIN (FORMAT JSON) "
+    captured: List[Any] = []
+
+    def before(conn, cursor, statement, parameters, context, executemany):
+        return prefix + statement, parameters
+
+    def after(conn, cursor, statement, parameters, context, executemany):
+        captured.extend(cursor.fetchall())
+
+    # Run the real compiled statement, with its bound parameters, under EXPLAIN
+    event.listen(connection, "before_cursor_execute", before, retval=True)
+    event.listen(connection, "after_cursor_execute", after)
+    try:
+        with Session(bind=connection) as db:
+            # Shapes build either an ORM Query or a Core select
+            query = shape.build(db)
+            connection.execute(getattr(query, "statement", query)).close()
+    finally:
+        event.remove(connection, "before_cursor_execute", before)
+        event.remove(connection, "after_cursor_execute", after)
+
+    if dialect == "sqlite":
+        return PlanResult(shape, _sqlite_scans(captured), [str(row[-1]) for row in captured])
+    return PlanResult(shape, _postgres_scans(captured), [str(captured[0][0])])
+
+def check_query_plans(bind: Engine) -> List[PlanResult]:
+    """EXPLAIN each endpoint query shape and report any that read a whole table."""
+    results = []
+    with bind.connect() as connection:
+        if connection.dialect.name == "postgresql":
+            # Tiny tables always favour a sequential scan; make the planner use an index if one fits
+            connection.execute(text("SET enable_seqscan = off"))
+        for shape in _shapes(connection.dialect.name):
+            results.append(_explain(connection, shape))
+        connection.rollback()
+    return results
@@ -0,0 +1,139 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Hashable, Optional, Tuple
+from fastapi import Response, status
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from ..config import settings
+from ..models.doctor import Doctor
+from ..models.user import User, UserRole
+from .pagination import NEXT_CURSOR_HEADER
+
+@dataclass(frozen=True)
+class CachedResponse:
+    body: bytes
+    etag: str
+    next_cursor: Optional[str] = None
+
+def make_etag(body: bytes) -> str:
+    # Strong validator: identical bytes, identical tag
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        # If-None-Match uses the weak comparison, so W/"x" matches "x"
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+def build_response(cached: CachedResponse, if_none_match: Optional[str]) -> Response:
+    headers = {"ETag": cached.etag, "Cache-Control": "no-cache"}
+    if cached.next_cursor:
+        headers[NEXT_CURSOR_HEADER] = cached.next_cursor
+    if etag_matches(if_none_match, cached.etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=cached.body, media_type="application/json", headers=headers)
+
+class ResponseCache:
+    """Bounded LRU cache of serialized responses with a TTL, cleared as a whole on invalidation."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._entries: "OrderedDict[Hashable, Tuple[float, CachedResponse]]" = OrderedDict()
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[CachedResponse]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def generation(self) -> int:
+        with self._lock:
+            return self._generation
+
+    def put(self, key: Hashable, response: CachedResponse, generation: int) -> None:
+        with self._lock:
+            # Data changed while this response was being built; it may be stale
+            if generation != self._generation or self.maxsize <= 0:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl, response)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self.invalidations += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+# Public GET /api/doctors/ pages, keyed by filter and page
+doctor_directory_cache = ResponseCache(
+    maxsize=settings.DOCTOR_DIRECTORY_CACHE_SIZE,
+    ttl=settings.DOCTOR_DIRECTORY_CACHE_TTL_SECONDS
+)
+
+# GET /api/doctors/specializations, keyed by prefix; invalidated with the directory
+specialization_cache = ResponseCache(
+    maxsize=settings.DOCTOR_DIRECTORY_CACHE_SIZE,
+    ttl=settings.DOCTOR_DIRECTORY_CACHE_TTL_SECONDS
+)
+
+# Cleared after commit, like the principal cache, so a concurrent read cannot re-cache old rows.
+# Each worker process clears its own copy; the TTL bounds how stale another worker can be.
+_PENDING_KEY = "doctor_directory_changed"
+
+def _mark_doctor_changed(mapper, connection, target) -> None:
+    session = Session.object_session(target)
+    if session is not None:
+        session.info[_PENDING_KEY] = True
+
+def _mark_user_changed(mapper, connection, target) -> None:
+    # Directory entries embed the doctor's user row
+    if target.role == UserRole.DOCTOR:
+        _mark_doctor_changed(mapper, connection, target)
+
+for _event in ("after_insert", "after_update", "after_delete"):
+    event.listen(Doctor, _event, _mark_doctor_changed)
+event.listen(User, "after_update", _mark_user_changed)
+event.listen(User, "after_delete", _mark_user_changed)
+
+@event.listens_for(Session, "after_commit")
+def _flush_directory_invalidation(session: Session) -> None:
+    if session.info.pop(_PENDING_KEY, False):
+        doctor_directory_cache.clear()
+        specialization_cache.clear()
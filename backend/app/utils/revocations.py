@@ -0,0 +1,122 @@
+"""Token revocation for stateless auth (STATELESS_AUTH).
+
+Stateless access tokens carry the user's `token_version`. Deactivating a user or
+changing their password bumps that column (the mapper event below), which
+revokes every token issued before. Requests do not read the column: each worker
+keeps {user_id: token_version} for the users whose version is above zero, the
+only ones with revoked tokens, and reloads it every REVOCATION_REFRESH_SECONDS.
+Bumps committed by this worker apply at once; other workers see them on their
+next reload, so a revoked token outlives its revocation by one interval at most.
+If reloads keep failing past REVOCATION_MAX_STALENESS_SECONDS, `fresh()` turns
+false and authentication falls back to the database.
+"""
+import asyncio
+import threading
+import time
+from typing import Dict, Optional
+from sqlalchemy import event, inspect, select
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+from ..config import settings
+from ..models.user import User
+
+class TokenRevocations:
+    def __init__(self, max_staleness: float):
+        self.max_staleness = max_staleness
+        self.refreshes = 0
+        self.failures = 0
+        self._versions: Dict[int, int] = {}
+        self._loaded_at: Optional[float] = None
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def is_revoked(self, user_id: int, version: int) -> bool:
+        return version < self._versions.get(user_id, 0)
+
+    def fresh(self) -> bool:
+        loaded_at = self._loaded_at
+        return loaded_at is not None and time.monotonic() - loaded_at <= self.max_staleness
+
+    def load(self, connection: Connection) -> int:
+        """Replace the set from `users`; returns how many users have revoked tokens."""
+        started = time.monotonic()
+        versions = dict(connection.execute(
+            select(User.id, User.token_version).where(User.token_version > 0)
+        ).all())
+        with self._lock:
+            # Bumps this worker committed while the query ran are newer than what it read
+            for user_id, version in self._versions.items():
+                if version > versions.get(user_id, 0):
+                    versions[user_id] = version
+            self._versions = versions
+            self._loaded_at = started
+            self.refreshes += 1
+        return len(versions)
+
+    def note(self, versions: Dict[int, int]) -> None:
+        with self._lock:
+            for user_id, version in versions.items():
+                if version > self._versions.get(user_id, 0):
+                    self._versions[user_id] = version
+
+    async def _refresh_forever(self, interval: float) -> None:
+        from ..database import async_engine
+
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                async with async_engine.connect() as connection:
+                    await connection.run_sync(self.load)
+            except Exception:
+                # Keep the old set; fresh() turns false if this goes on
+                self.failures += 1
+
+    def start(self, interval: float) -> None:
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._refresh_forever(interval))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                "revoked_users": len(self._versions),
+                "age_seconds": time.monotonic() - self._loaded_at if self._loaded_at is not None else None,
+                "fresh": self.fresh(),
+                "refreshes": self.refreshes,
+                "failures": self.failures,
+            }
+
+token_revocations = TokenRevocations(max_staleness=settings.REVOCATION_MAX_STALENESS_SECONDS)
+
+# Bump in the writing transaction; tell this worker's set once the bump commits
+_PENDING_KEY = "token_version_bumps"
+
+def _bump_token_version(mapper, connection, target: User) -> None:
+    # Login's rehash to the current bcrypt cost keeps the password and goes through a bulk UPDATE, unseen here
+    state = inspect(target)
+    if not (state.attrs.is_active.history.has_changes() or state.attrs.hashed_password.history.has_changes()):
+        return
+    target.token_version = (target.token_version or 0) + 1
+    session = Session.object_session(target)
+    if session is not None:
+        session.info.setdefault(_PENDING_KEY, {})[target.id] = target.token_version
+
+event.listen(User, "before_update", _bump_token_version)
+
+@event.listens_for(Session, "after_commit")
+def _note_bumps(session: Session) -> None:
+    versions = session.info.pop(_PENDING_KEY, None)
+    if versions:
+        token_revocations.note(versions)
+
+@event.listens_for(Session, "after_rollback")
+def _drop_bumps(session: Session) -> None:
+    session.info.pop(_PENDING_KEY, None)
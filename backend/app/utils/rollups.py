@@ -0,0 +1,235 @@
+"""Appointment rollups behind /api/analytics.
+
+`appointment_daily_rollups` holds one row per (doctor, day, starting hour) with a
+count column per AppointmentStatus; `appointment_monthly_rollups` sums those per
+(doctor, month, weekday, hour). The mapper events below move counts in both on the
+flush connection whenever an appointment is booked, deleted, or has its status,
+date or doctor changed. Reports read whole months from the monthly table and the
+partial months at either end of the range from the daily one, never appointments.
+`recompute_rollups` rebuilds a date range with INSERT ... SELECT ... GROUP BY, for
+the backfill and for corrections.
+"""
+from collections import Counter
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import Date, Integer, Select, String, case, cast, delete, event, extract, func, insert, select, text, union_all
+from sqlalchemy.engine import Connection
+from ..models.appointment import Appointment, AppointmentStatus
+from ..models.appointment_rollup import AppointmentMonthlyRollup, AppointmentRollup
+from .counters import before_and_after, upsert_counts
+from .scheduling import parse_available_days, parse_time, slot_length
+
+# Count columns, named after the status values
+STATUS_COLUMNS = [status.value for status in AppointmentStatus]
+
+_KEYS = ["doctor_id", "day", "hour"]
+_MONTHLY_KEYS = ["doctor_id", "month", "weekday", "hour"]
+_FIELDS = ("doctor_id", "status", "appointment_date")
+
+def rollup_counts(
+    doctor_id: Optional[int],
+    status: Optional[AppointmentStatus],
+    appointment_date: Optional[datetime]
+) -> Counter:
+    """{(doctor_id, day, hour, status column): 1} for one appointment; empty if it has no doctor or date."""
+    counts: Counter = Counter()
+    if doctor_id is not None and appointment_date is not None:
+        status = AppointmentStatus(status or AppointmentStatus.PENDING)
+        counts[(doctor_id, appointment_date.date(), appointment_date.hour, status.value)] += 1
+    return counts
+
+def month_start(day: date) -> date:
+    return day.replace(day=1)
+
+def next_month(day: date) -> date:
+    return (day.replace(day=1) + timedelta(days=32)).replace(day=1)
+
+def apply_rollup_deltas(connection: Connection, deltas: Counter) -> None:
+    daily: Dict[Tuple, Dict[str, Any]] = {}
+    monthly: Dict[Tuple, Dict[str, Any]] = {}
+    for (doctor_id, day, hour, column), delta in deltas.items():
+        if not delta:
+            continue
+        zero = {name: 0 for name in STATUS_COLUMNS}
+        row = daily.setdefault((doctor_id, day, hour), dict(
+            zero, doctor_id=doctor_id, day=day, hour=hour, weekday=day.weekday()
+        ))
+        row[column] += delta
+        row = monthly.setdefault((doctor_id, month_start(day), day.weekday(), hour), dict(
+            zero, doctor_id=doctor_id, month=month_start(day), weekday=day.weekday(), hour=hour
+        ))
+        row[column] += delta
+    # Sorted so concurrent writers take the row locks in the same order
+    upsert_counts(connection, AppointmentRollup, _KEYS, STATUS_COLUMNS, (daily[key] for key in sorted(daily)))
+    upsert_counts(
+        connection, AppointmentMonthlyRollup, _MONTHLY_KEYS, STATUS_COLUMNS, (monthly[key] for key in sorted(monthly))
+    )
+
+def _add_appointment(mapper, connection, target) -> None:
+    apply_rollup_deltas(connection, rollup_counts(*(getattr(target, field) for field in _FIELDS)))
+
+def _move_appointment(mapper, connection, target) -> None:
+    before, after = before_and_after(target, _FIELDS)
+    if before != after:
+        deltas = rollup_counts(*after)
+        deltas.subtract(rollup_counts(*before))
+        apply_rollup_deltas(connection, deltas)
+
+def _remove_appointment(mapper, connection, target) -> None:
+    deltas: Counter = Counter()
+    deltas.subtract(rollup_counts(*(getattr(target, field) for field in _FIELDS)))
+    apply_rollup_deltas(connection, deltas)
+
+event.listen(Appointment, "after_insert", _add_appointment)
+event.listen(Appointment, "after_update", _move_appointment)
+event.listen(Appointment, "after_delete", _remove_appointment)
+
+def _date_parts(dialect: str):
+    # (day, hour, weekday with Monday = 0) of appointment_date, computed by the database
+    column = Appointment.appointment_date
+    if dialect == "sqlite":
+        return (
+            func.date(column),
+            cast(func.strftime("%H", column), Integer),
+            (cast(func.strftime("%w", column), Integer) + 6) % 7,
+        )
+    return (
+        cast(column, Date),
+        cast(extract("hour", column), Integer),
+        cast(extract("isodow", column), Integer) - 1,
+    )
+
+def _month_of(dialect: str, column):
+    if dialect == "sqlite":
+        return func.date(column, "start of month")
+    return cast(func.date_trunc("month", column), Date)
+
+def _lock_rollups(connection: Connection) -> None:
+    # Incremental updates to the range wait until the rebuilt rows commit
+    if connection.dialect.name == "postgresql":
+        connection.execute(text(
+            "LOCK TABLE appointment_daily_rollups, appointment_monthly_rollups IN EXCLUSIVE MODE"
+        ))
+
+def recompute_rollups(connection: Connection, start: date, end: date) -> int:
+    """Rebuild the rollups for days in [start, end) from appointments; returns daily rows written.
+
+    The monthly rows of every month the range touches are then re-summed from the daily rows.
+    """
+    _lock_rollups(connection)
+    dialect = connection.dialect.name
+    # On SQLite the delete takes the write lock before the appointments are read
+    connection.execute(delete(AppointmentRollup).where(AppointmentRollup.day >= start, AppointmentRollup.day < end))
+    day, hour, weekday = _date_parts(dialect)
+    # Compared as text: PostgreSQL rejects an enum value as a literal in the transaction that added it,
+    # which is where a migration adding a status runs this backfill
+    status_name = cast(Appointment.status, String)
+    grouped = select(
+        Appointment.doctor_id,
+        day,
+        hour,
+        weekday,
+        *(func.sum(case((status_name == status.name, 1), else_=0)) for status in AppointmentStatus)
+    ).where(
+        Appointment.doctor_id.is_not(None),
+        Appointment.appointment_date >= datetime.combine(start, datetime.min.time()),
+        Appointment.appointment_date < datetime.combine(end, datetime.min.time())
+    ).group_by(Appointment.doctor_id, day, hour, weekday)
+    written = connection.execute(
+        insert(AppointmentRollup).from_select(_KEYS + ["weekday"] + STATUS_COLUMNS, grouped)
+    ).rowcount
+
+    first, last = month_start(start), next_month(end - timedelta(days=1))
+    connection.execute(delete(AppointmentMonthlyRollup).where(
+        AppointmentMonthlyRollup.month >= first, AppointmentMonthlyRollup.month < last
+    ))
+    month = _month_of(dialect, AppointmentRollup.day)
+    connection.execute(insert(AppointmentMonthlyRollup).from_select(
+        _MONTHLY_KEYS + STATUS_COLUMNS,
+        select(
+            AppointmentRollup.doctor_id, month, AppointmentRollup.weekday, AppointmentRollup.hour,
+            *(func.sum(getattr(AppointmentRollup, column)) for column in STATUS_COLUMNS)
+        ).where(
+            AppointmentRollup.day >= first, AppointmentRollup.day < last
+        ).group_by(AppointmentRollup.doctor_id, month, AppointmentRollup.weekday, AppointmentRollup.hour)
+    ))
+    return written
+
+def recompute_day(connection: Connection, day: date) -> int:
+    return recompute_rollups(connection, day, day + timedelta(days=1))
+
+def appointment_date_range(connection: Connection) -> Optional[Tuple[date, date]]:
+    # [first day, day after the last) with any appointment
+    first, last = connection.execute(
+        select(func.min(Appointment.appointment_date), func.max(Appointment.appointment_date))
+    ).one()
+    if first is None:
+        return None
+    return first.date(), last.date() + timedelta(days=1)
+
+def _rollup_rows(start: date, end: date, doctor_id: Optional[int]):
+    """Rows of (doctor_id, weekday, hour, status counts) that together cover [start, end)."""
+    parts = []
+    # Whole months come from the monthly table, the days either side from the daily one
+    months = (next_month(start - timedelta(days=1)), month_start(end))
+    if months[0] < months[1]:
+        head, tail = (start, months[0]), (months[1], end)
+        table = AppointmentMonthlyRollup
+        parts.append(select(
+            table.doctor_id, table.weekday, table.hour, *(getattr(table, column) for column in STATUS_COLUMNS)
+        ).where(table.month >= months[0], table.month < months[1]))
+        day_ranges = [head, tail]
+    else:
+        day_ranges = [(start, end)]
+    table = AppointmentRollup
+    for low, high in day_ranges:
+        if low < high:
+            parts.append(select(
+                table.doctor_id, table.weekday, table.hour, *(getattr(table, column) for column in STATUS_COLUMNS)
+            ).where(table.day >= low, table.day < high))
+    if doctor_id is not None:
+        parts = [part.where(part.selected_columns.doctor_id == doctor_id) for part in parts]
+    return union_all(*parts).subquery("rollup_rows") if len(parts) > 1 else parts[0].subquery("rollup_rows")
+
+def _sums(rows) -> List[Any]:
+    return [func.coalesce(func.sum(rows.c[column]), 0).label(column) for column in STATUS_COLUMNS]
+
+def doctor_totals_query(start: date, end: date, doctor_id: Optional[int] = None) -> Select:
+    rows = _rollup_rows(start, end, doctor_id)
+    return select(rows.c.doctor_id, *_sums(rows)).group_by(rows.c.doctor_id)
+
+def slot_totals_query(start: date, end: date, doctor_id: Optional[int] = None) -> Select:
+    rows = _rollup_rows(start, end, doctor_id)
+    return select(rows.c.weekday, rows.c.hour, *_sums(rows)).group_by(
+        rows.c.weekday, rows.c.hour
+    ).order_by(rows.c.weekday, rows.c.hour)
+
+def outcomes(counts: Dict[str, int]) -> Dict[str, Any]:
+    """Status counts plus totals and rates; rates are None when nothing was booked."""
+    result: Dict[str, Any] = {column: int(counts.get(column) or 0) for column in STATUS_COLUMNS}
+    result["total"] = sum(result[column] for column in STATUS_COLUMNS)
+    booked = result["total"] - result[AppointmentStatus.CANCELLED.value] - result[AppointmentStatus.EXPIRED.value]
+    result["booked"] = booked
+    result["completion_rate"] = result[AppointmentStatus.COMPLETED.value] / booked if booked else None
+    result["no_show_rate"] = result[AppointmentStatus.NO_SHOW.value] / booked if booked else None
+    return result
+
+def working_days(weekdays: List[int], start: date, end: date) -> int:
+    # Days in [start, end) falling on one of `weekdays`
+    weeks, rest = divmod(max((end - start).days, 0), 7)
+    return weeks * len(weekdays) + sum(1 for offset in range(rest) if (start.weekday() + offset) % 7 in weekdays)
+
+def slot_capacity(
+    available_days: Optional[str],
+    time_start: Optional[str],
+    time_end: Optional[str],
+    start: date,
+    end: date
+) -> int:
+    """Bookable slots in [start, end) under the doctor's current working hours."""
+    weekdays = parse_available_days(available_days)
+    opening, closing = parse_time(time_start), parse_time(time_end)
+    if not weekdays or opening is None or closing is None or opening >= closing:
+        return 0
+    per_day = (datetime.combine(start, closing) - datetime.combine(start, opening)) // slot_length()
+    return per_day * working_days(weekdays, start, end)
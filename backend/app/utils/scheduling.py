@@ -0,0 +1,134 @@
+import json
+from bisect import bisect_right
+from datetime import datetime, timedelta, time, timezone
+from typing import List, Optional, Tuple, cast
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..config import settings
+from ..models.appointment import RELEASED_STATUSES, Appointment
+from ..models.doctor import Doctor
+
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+def naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """`value` as the naive UTC datetime the database stores; naive values are taken as UTC already."""
+    if not isinstance(value, datetime) or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+def slot_length() -> timedelta:
+    return timedelta(minutes=settings.APPOINTMENT_SLOT_MINUTES)
+
+async def lock_doctor_schedule(db: AsyncSession, doctor_id: int) -> None:
+    """Hold off other bookings for this doctor until the transaction ends.
+
+    Call before find_conflicting_appointment, so the check and the write that follows
+    see every booking committed ahead of them. PostgreSQL locks the doctor's row.
+    SQLite ignores FOR UPDATE and its driver only opens the transaction at the first
+    write, so a no-op write takes the database's single write lock instead, before
+    the check reads anything (the equivalent of BEGIN IMMEDIATE).
+    """
+    if db.bind.dialect.name == "sqlite":
+        await db.execute(
+            update(Doctor).where(Doctor.id == doctor_id).values(id=Doctor.id)
+            .execution_options(synchronize_session=False)
+        )
+    else:
+        await db.execute(select(Doctor.id).where(Doctor.id == doctor_id).with_for_update())
+
+async def find_conflicting_appointment(
+    db: AsyncSession,
+    doctor_id: int,
+    start: datetime,
+    exclude_id: Optional[int] = None
+) -> Optional[int]:
+    """Return the id of an active booking overlapping a slot starting at `start`.
+
+    Every booking occupies one fixed-length slot, so two bookings overlap exactly
+    when their start times are less than one slot apart. That turns the check into
+    a bounded range scan on the (doctor_id, appointment_date) index.
+    """
+    length = slot_length()
+    query = select(Appointment.id).where(
+        Appointment.doctor_id == doctor_id,
+        Appointment.appointment_date > start - length,
+        Appointment.appointment_date < start + length,
+        Appointment.status.not_in(RELEASED_STATUSES)
+    )
+    if exclude_id is not None:
+        query = query.where(Appointment.id != exclude_id)
+    return await db.scalar(query.limit(1))
+
+def parse_available_days(value: Optional[str]) -> List[int]:
+    # Stored as a JSON list of day names; tolerate a plain comma-separated string too
+    if not value:
+        return []
+    try:
+        days = json.loads(value)
+    except ValueError:
+        days = value.split(",")
+    if isinstance(days, str):
+        days = [days]
+    lookup = {name.lower(): index for index, name in enumerate(WEEKDAYS)}
+    result = []
+    for day in days:
+        index = lookup.get(str(day).strip().lower())
+        if index is not None:
+            result.append(index)
+    return sorted(set(result))
+
+def parse_time(value: Optional[str]) -> Optional[time]:
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value.strip(), "%H:%M").time()
+    except ValueError:
+        return None
+
+async def get_booked_starts(db: AsyncSession, doctor_id: int, start: datetime, end: datetime) -> List[datetime]:
+    length = slot_length()
+    result = await db.scalars(
+        select(Appointment.appointment_date).where(
+            Appointment.doctor_id == doctor_id,
+            Appointment.appointment_date > start - length,
+            Appointment.appointment_date < end,
+            Appointment.status.not_in(RELEASED_STATUSES)
+        ).order_by(Appointment.appointment_date)
+    )
+    return list(result)
+
+def compute_free_slots(
+    doctor: Doctor,
+    booked: List[datetime],
+    start: datetime,
+    end: datetime,
+    now: Optional[datetime] = None
+) -> List[Tuple[datetime, datetime]]:
+    """Walk the doctor's working hours in [start, end) and drop slots that overlap a booking.
+
+    `booked` must be sorted ascending; each candidate slot is checked with a binary search.
+    """
+    days = parse_available_days(cast(Optional[str], doctor.available_days))
+    day_start = parse_time(cast(Optional[str], doctor.available_time_start))
+    day_end = parse_time(cast(Optional[str], doctor.available_time_end))
+    if not days or day_start is None or day_end is None or day_start >= day_end:
+        return []
+
+    length = slot_length()
+    earliest = max(start, now or datetime.utcnow())
+    slots: List[Tuple[datetime, datetime]] = []
+    current_day = start.date()
+    while current_day <= end.date():
+        if current_day.weekday() in days:
+            slot_start = datetime.combine(current_day, day_start)
+            closing = datetime.combine(current_day, day_end)
+            while slot_start + length <= closing and slot_start < end:
+                slot_end = slot_start + length
+                if slot_start >= earliest:
+                    # The nearest booking starting before slot_end is the only one that can overlap
+                    index = bisect_right(booked, slot_end - timedelta(microseconds=1))
+                    if index == 0 or booked[index - 1] <= slot_start - length:
+                        slots.append((slot_start, slot_end))
+                slot_start = slot_end
+        current_day += timedelta(days=1)
+    return slots
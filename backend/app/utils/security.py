@@ -1,22 +1,38 @@
+from dataclasses import dataclass
 from datetime import datetime, timedelta
-from typing import Optional, cast
+from typing import Any, Dict, Optional, Tuple, cast
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy import Select, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.attributes import set_committed_value
 from ..config import settings
 from ..database import get_db
-from ..models.user import User
+from ..models.user import User, UserRole
+from ..models.patient import Patient
+from ..models.doctor import Doctor
+from .principal_cache import CachedPrincipal, principal_cache
+from .passwords import password_hasher
+from .revocations import token_revocations
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/login")
 
+# The "typ" claim of stateless-mode tokens; tokens without one are access tokens
+ACCESS_TOKEN = "access"
+REFRESH_TOKEN = "refresh"
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    return password_hasher.verify(plain_password, hashed_password)
 
 def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+    return password_hasher.hash(password)
+
+async def verify_and_update_password_async(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    return await password_hasher.verify_and_update_async(plain_password, hashed_password)
+
+async def get_password_hash_async(password: str) -> str:
+    return await password_hasher.hash_async(password)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -28,29 +44,156 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> User:
-    credentials_exception = HTTPException(
+def principal_claims(user: User, patient_id: Optional[int], doctor_id: Optional[int]) -> Dict[str, Any]:
+    """Everything a stateless-mode request needs to know about its user, so it never asks the database."""
+    return {
+        "sub": user.email,
+        "uid": user.id,
+        "usr": user.username,
+        "name": user.full_name,
+        "role": UserRole(user.role).value,
+        "act": bool(user.is_active),
+        "ver": user.token_version or 0,
+        "pid": patient_id,
+        "did": doctor_id,
+        "typ": ACCESS_TOKEN,
+    }
+
+def create_token_pair(user: User, patient_id: Optional[int], doctor_id: Optional[int]) -> Dict[str, str]:
+    """A short-lived access token with the principal's claims, and a refresh token to renew it."""
+    access_token = create_access_token(
+        principal_claims(user, patient_id, doctor_id),
+        expires_delta=timedelta(minutes=settings.STATELESS_ACCESS_TOKEN_EXPIRE_MINUTES)
+    )
+    refresh_token = create_access_token(
+        {"sub": user.email, "uid": user.id, "ver": user.token_version or 0, "typ": REFRESH_TOKEN},
+        expires_delta=timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS)
+    )
+    return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer"}
+
+@dataclass
+class Actor:
+    """The authenticated user together with their patient or doctor profile, if any."""
+    user: User
+    patient: Optional[Patient] = None
+    doctor: Optional[Doctor] = None
+
+    @property
+    def role(self) -> UserRole:
+        return cast(UserRole, self.user.role)
+
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+def decode_token(token: str, token_type: str = ACCESS_TOKEN) -> Dict[str, Any]:
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        # payload.get may return None, so use Optional[str] to satisfy type checkers
-        email: Optional[str] = payload.get("sub")
-        if email is None:
-            raise credentials_exception
     except JWTError:
-        raise credentials_exception
-    
-    user = db.query(User).filter(User.email == email).first()
-    if user is None:
-        raise credentials_exception
-    return user
+        raise _credentials_exception()
+    # payload.get may return None, so use Optional[str] to satisfy type checkers
+    email: Optional[str] = payload.get("sub")
+    if email is None or payload.get("typ", ACCESS_TOKEN) != token_type:
+        raise _credentials_exception()
+    return payload
+
+def decode_token_subject(token: str) -> str:
+    return decode_token(token)["sub"]
+
+def check_token_version(payload: Dict[str, Any], current_version: Optional[int]) -> None:
+    # Tokens from before stateless mode carry no version and are not revocable this way
+    version = payload.get("ver")
+    if version is not None and version < (current_version or 0):
+        raise _credentials_exception()
 
-def get_current_active_user(current_user: User = Depends(get_current_user)) -> User:
+def _ensure_active(user: User) -> None:
     # cast ORM column to bool for the type checker
-    is_active = cast(bool, current_user.is_active)
+    is_active = cast(bool, user.is_active)
     if not is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
-    return current_user
\ No newline at end of file
+
+def _make_actor(user: User, patient: Optional[Patient], doctor: Optional[Doctor]) -> Actor:
+    # Link the profiles to their user up front: lazy loads cannot run once the response
+    # is being serialized outside the async session
+    if patient is not None:
+        set_committed_value(patient, "user", user)
+    if doctor is not None:
+        set_committed_value(doctor, "user", user)
+    return Actor(user=user, patient=patient, doctor=doctor)
+
+def _actor_from_claims(payload: Dict[str, Any]) -> Optional[Actor]:
+    # Older tokens, and a revocation set that stopped refreshing, take the database path
+    if "uid" not in payload or not token_revocations.fresh():
+        return None
+    if token_revocations.is_revoked(payload["uid"], payload.get("ver", 0)):
+        raise _credentials_exception()
+    # Transient rows holding only what the claims say; endpoints that return the
+    # stored profile depend on get_current_active_stored_actor instead
+    user = User(
+        id=payload["uid"],
+        email=payload["sub"],
+        username=payload.get("usr"),
+        full_name=payload.get("name"),
+        role=UserRole(payload["role"]),
+        is_active=payload.get("act", True),
+        token_version=payload.get("ver", 0)
+    )
+    patient = Patient(id=payload["pid"], user_id=user.id) if payload.get("pid") is not None else None
+    doctor = Doctor(id=payload["did"], user_id=user.id) if payload.get("did") is not None else None
+    return Actor(user=user, patient=patient, doctor=doctor)
+
+def principal_query(email: str) -> Select:
+    # One round trip: a user has at most one patient and one doctor profile (unique user_id)
+    return (
+        select(User, Patient, Doctor)
+        .outerjoin(Patient, Patient.user_id == User.id)
+        .outerjoin(Doctor, Doctor.user_id == User.id)
+        .where(User.email == email)
+        .limit(1)
+    )
+
+async def _load_actor(token: str, db: AsyncSession, use_claims: bool = True) -> Actor:
+    payload = decode_token(token)
+    if use_claims and settings.STATELESS_AUTH:
+        actor = _actor_from_claims(payload)
+        if actor is not None:
+            return actor
+    email = payload["sub"]
+    cached = principal_cache.get(email)
+    if cached is not None:
+        user, patient, doctor = cached.attach(db)
+        check_token_version(payload, user.token_version)
+        return _make_actor(user, patient, doctor)
+    
+    generation = principal_cache.generation()
+    result = await db.execute(principal_query(email))
+    row = result.first()
+    if row is None:
+        raise _credentials_exception()
+    user, patient, doctor = row
+    principal_cache.put(email, CachedPrincipal(user, patient, doctor), generation)
+    check_token_version(payload, user.token_version)
+    return _make_actor(user, patient, doctor)
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)) -> User:
+    return (await _load_actor(token, db)).user
+
+async def get_current_active_user(current_user: User = Depends(get_current_user)) -> User:
+    _ensure_active(current_user)
+    return current_user
+
+async def get_current_actor(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)) -> Actor:
+    return await _load_actor(token, db)
+
+async def get_current_active_actor(actor: Actor = Depends(get_current_actor)) -> Actor:
+    _ensure_active(actor.user)
+    return actor
+
+async def get_current_active_stored_actor(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)) -> Actor:
+    """get_current_active_actor with the stored user and profile rows, even in stateless mode."""
+    actor = await _load_actor(token, db, use_claims=False)
+    _ensure_active(actor.user)
+    return actor
@@ -0,0 +1,144 @@
+import os
+import threading
+from typing import List, Optional
+from sqlalchemy import Sequence, insert, select, update
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import DBAPIError, IntegrityError
+from ..config import settings
+from ..database import SYNC_DATABASE_URL, create_db_engine
+from ..models.appointment import Appointment
+from ..models.doctor import Doctor
+from ..models.patient import Patient
+from ..models.sequence import IdCounter
+
+_reservation_engine: Optional[Engine] = None
+_reservation_engine_lock = threading.Lock()
+
+def get_reservation_engine() -> Engine:
+    # Private pool: a reservation must never wait for a connection held by a request session
+    global _reservation_engine
+    with _reservation_engine_lock:
+        if _reservation_engine is None:
+            _reservation_engine = create_db_engine(
+                SYNC_DATABASE_URL,
+                # At most one reservation in flight per sequence below
+                pool_size=1,
+                max_overflow=2
+            )
+        return _reservation_engine
+
+class IdSequence:
+    """Hands out formatted hospital IDs such as APT-000042 from per-process blocks.
+
+    A block of `block_size` numbers is reserved with one round trip on its own
+    connection (a native sequence where the dialect has them, the `id_counters`
+    table otherwise) and then issued from memory. Blocks are never shared
+    between workers, so IDs cannot collide; numbers left in a block when a worker
+    exits are skipped. On SQLite the reservation needs the write lock, so take
+    IDs before the request's own session has flushed anything.
+    """
+
+    def __init__(self, name: str, column, prefix: str, width: int, block_size: Optional[int] = None):
+        self.name = name
+        self.column = column
+        self.prefix = prefix
+        self.width = width
+        self.block_size = block_size or settings.ID_BLOCK_SIZE
+        self._lock = threading.Lock()
+        self._next = 0
+        self._end = 0
+        self._pid = os.getpid()
+        self._sequence_ready = False
+
+    def next_id(self, bind: Optional[Engine] = None) -> str:
+        return f"{self.prefix}-{self.next_value(bind):0{self.width}d}"
+
+    def next_ids(self, count: int, bind: Optional[Engine] = None) -> List[str]:
+        return [self.next_id(bind) for _ in range(count)]
+
+    def reserve_ids(self, count: int, bind: Optional[Engine] = None) -> List[str]:
+        """`count` consecutive IDs in one round trip, for bulk loads; this worker's block is untouched.
+
+        Native sequences step by the block size they were created with, so there it is next_ids.
+        """
+        bind = bind or get_reservation_engine()
+        if bind.dialect.supports_sequences or count <= 0:
+            return self.next_ids(count, bind)
+        start = self._reserve_from_table(bind, count)
+        return [f"{self.prefix}-{value:0{self.width}d}" for value in range(start, start + count)]
+
+    def next_value(self, bind: Optional[Engine] = None) -> int:
+        with self._lock:
+            if self._pid != os.getpid():
+                # Forked worker: the parent's block belongs to the parent
+                self._pid = os.getpid()
+                self._next = self._end = 0
+                self._sequence_ready = False
+            if self._next >= self._end:
+                start = self._reserve_block(bind or get_reservation_engine())
+                self._next, self._end = start, start + self.block_size
+            value = self._next
+            self._next += 1
+            return value
+
+    def reset(self) -> None:
+        with self._lock:
+            self._next = self._end = 0
+            self._sequence_ready = False
+
+    def _reserve_block(self, bind: Engine) -> int:
+        if bind.dialect.supports_sequences:
+            return self._reserve_from_sequence(bind)
+        return self._reserve_from_table(bind)
+
+    def _seed(self, conn: Connection) -> int:
+        # First number after the highest ID already stored, so existing data is respected
+        last = conn.execute(
+            select(self.column).where(self.column.isnot(None)).order_by(self.column.class_.id.desc()).limit(1)
+        ).scalar()
+        if last:
+            return int(last.split("-")[1]) + 1
+        return 1
+
+    def _reserve_from_sequence(self, bind: Engine) -> int:
+        sequence = Sequence(f"{self.name}_seq", increment=self.block_size)
+        with bind.begin() as conn:
+            if not self._sequence_ready:
+                if not bind.dialect.has_sequence(conn, sequence.name):
+                    start = self._seed(conn)
+                    try:
+                        with conn.begin_nested():
+                            Sequence(sequence.name, start=start, increment=self.block_size).create(conn)
+                    except DBAPIError:
+                        # Another worker created it first
+                        pass
+                self._sequence_ready = True
+            return conn.execute(sequence.next_value()).scalar_one()
+
+    def _reserve_from_table(self, bind: Engine, size: Optional[int] = None) -> int:
+        size = size or self.block_size
+        table = IdCounter.__table__
+        while True:
+            try:
+                with bind.begin() as conn:
+                    # The UPDATE takes the write lock before the value is read back
+                    result = conn.execute(
+                        update(table)
+                        .where(table.c.name == self.name)
+                        .values(next_value=table.c.next_value + size)
+                    )
+                    if result.rowcount:
+                        end = conn.execute(
+                            select(table.c.next_value).where(table.c.name == self.name)
+                        ).scalar_one()
+                        return end - size
+                    start = self._seed(conn)
+                    conn.execute(insert(table).values(name=self.name, next_value=start + size))
+                    return start
+            except IntegrityError:
+                # Lost the race to create the counter row; retry as an UPDATE
+                continue
+
+appointment_numbers = IdSequence("appointment_number", Appointment.appointment_number, "APT", 6)
+patient_ids = IdSequence("patient_id", Patient.patient_id, "PAT", 5)
+doctor_ids = IdSequence("doctor_id", Doctor.doctor_id, "DOC", 5)
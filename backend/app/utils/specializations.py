@@ -0,0 +1,130 @@
+import re
+from typing import Dict, Optional, Tuple
+from sqlalchemy import Select, delete, event, false, func, insert, inspect, select
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Connection
+from ..models.doctor import Doctor
+from ..models.specialization import Specialization, doctor_specializations
+
+def normalize_key(name: str) -> str:
+    return " ".join(name.lower().split())
+
+def split_specializations(value: Optional[str]) -> Dict[str, str]:
+    # "Cardiology, Internal Medicine" lists two; returns key -> name as first written
+    names: Dict[str, str] = {}
+    for part in re.split(r"[,;/]", value or ""):
+        name = " ".join(part.split())
+        if name:
+            names.setdefault(normalize_key(name), name)
+    return names
+
+def prefix_range(prefix: str) -> Optional[Tuple[str, str]]:
+    """(low, high) bounds selecting every key that starts with `prefix`, for an index range scan.
+
+    LIKE 'x%' only uses an index under a matching collation (NOCASE on SQLite,
+    text_pattern_ops on PostgreSQL); a plain range walks the unique index on `key` as is.
+    """
+    key = normalize_key(prefix)
+    if not key:
+        return None
+    return key, key[:-1] + chr(ord(key[-1]) + 1)
+
+def doctor_filter(query: Select, specialization_ids: Select) -> Select:
+    # Semi-join through (specialization_id, doctor_id), never the free-text column
+    return query.where(Doctor.id.in_(
+        select(doctor_specializations.c.doctor_id).where(
+            doctor_specializations.c.specialization_id.in_(specialization_ids)
+        )
+    ))
+
+def ids_with_prefix(prefix: str) -> Select:
+    bounds = prefix_range(prefix)
+    if bounds is None:
+        return select(Specialization.id).where(false())
+    return select(Specialization.id).where(Specialization.key >= bounds[0], Specialization.key < bounds[1])
+
+def ids_containing(text: str) -> Select:
+    """Catalog entries whose name contains `text` anywhere, e.g. "ology" -> Cardiology, Neurology.
+
+    The catalog holds one row per distinct name, so this reads no doctor rows; on
+    PostgreSQL the pg_trgm index from revision 0012 serves the LIKE.
+    """
+    key = normalize_key(text)
+    if not key:
+        return select(Specialization.id).where(false())
+    return select(Specialization.id).where(Specialization.key.contains(key, autoescape=True))
+
+def counts_query(prefix: Optional[str] = None) -> Select:
+    # Specializations no doctor lists any more drop out through the inner join
+    query = select(
+        Specialization.id,
+        Specialization.name,
+        func.count(doctor_specializations.c.doctor_id).label("doctor_count")
+    ).join(doctor_specializations).group_by(Specialization.id, Specialization.name)
+    if prefix:
+        query = query.where(Specialization.id.in_(ids_with_prefix(prefix)))
+    return query.order_by(Specialization.name)
+
+def _insert_ignore(connection: Connection, names: Dict[str, str]) -> None:
+    rows = [{"key": key, "name": name} for key, name in names.items()]
+    if connection.dialect.name == "postgresql":
+        connection.execute(postgresql_insert(Specialization).on_conflict_do_nothing(index_elements=["key"]), rows)
+    elif connection.dialect.name == "sqlite":
+        connection.execute(sqlite_insert(Specialization).on_conflict_do_nothing(index_elements=["key"]), rows)
+    else:
+        existing = set(connection.execute(
+            select(Specialization.key).where(Specialization.key.in_(list(names)))
+        ).scalars())
+        missing = [row for row in rows if row["key"] not in existing]
+        if missing:
+            connection.execute(insert(Specialization), missing)
+
+def link_doctors(connection: Connection, doctors: Dict[int, Optional[str]]) -> None:
+    """Point each doctor's catalog links at the specializations named in its free text."""
+    if not doctors:
+        return
+    names_by_doctor = {doctor_id: split_specializations(value) for doctor_id, value in doctors.items()}
+    all_names: Dict[str, str] = {}
+    for names in names_by_doctor.values():
+        for key, name in names.items():
+            all_names.setdefault(key, name)
+    ids: Dict[str, int] = {}
+    if all_names:
+        _insert_ignore(connection, all_names)
+        ids = dict(connection.execute(
+            select(Specialization.key, Specialization.id).where(Specialization.key.in_(list(all_names)))
+        ).all())
+    connection.execute(delete(doctor_specializations).where(doctor_specializations.c.doctor_id.in_(list(doctors))))
+    links = [
+        {"doctor_id": doctor_id, "specialization_id": ids[key]}
+        for doctor_id, names in names_by_doctor.items()
+        for key in names
+    ]
+    if links:
+        connection.execute(insert(doctor_specializations), links)
+
+def rebuild_specializations(connection: Connection, batch_size: int = 1000) -> int:
+    """Re-link every doctor from its free-text specialization; returns how many were linked."""
+    count = 0
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            select(Doctor.id, Doctor.specialization).where(Doctor.id > last_id).order_by(Doctor.id).limit(batch_size)
+        ).all()
+        if not rows:
+            return count
+        link_doctors(connection, {doctor_id: value for doctor_id, value in rows})
+        count += len(rows)
+        last_id = rows[-1][0]
+
+# Keep the links in step with writes, in the writing transaction
+def _link_doctor(mapper, connection, target) -> None:
+    link_doctors(connection, {target.id: target.specialization})
+
+def _relink_doctor(mapper, connection, target) -> None:
+    if inspect(target).attrs.specialization.history.has_changes():
+        link_doctors(connection, {target.id: target.specialization})
+
+event.listen(Doctor, "after_insert", _link_doctor)
+event.listen(Doctor, "after_update", _relink_doctor)
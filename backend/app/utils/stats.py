@@ -0,0 +1,140 @@
+"""Counters behind GET /api/stats/summary.
+
+Each row of `stat_counters` is a running count for one scope: "all", "doctor:<id>"
+or "patient:<id>". The mapper events below apply the deltas from every appointment,
+doctor and patient write on the flush connection, so a counter commits or rolls
+back with the change it counts. On PostgreSQL the "all" rows are shared by every
+writer and serialize concurrent bookings at commit; they are single-row upserts.
+`reconcile_counters` recounts from the source tables and corrects any drift.
+"""
+from collections import Counter
+from datetime import date, datetime
+from typing import Dict, Optional, Tuple
+from sqlalchemy import delete, event, func, or_, select, text, update
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..models.appointment import RELEASED_STATUSES, Appointment, AppointmentStatus
+from ..models.doctor import Doctor
+from ..models.patient import Patient
+from ..models.stat_counter import StatCounter
+from .counters import before_and_after, upsert_counts
+
+GLOBAL_SCOPE = "all"
+DOCTORS = "doctors"
+PATIENTS = "patients"
+
+Key = Tuple[str, str]
+
+def doctor_scope(doctor_id: int) -> str:
+    return f"doctor:{doctor_id}"
+
+def patient_scope(patient_id: int) -> str:
+    return f"patient:{patient_id}"
+
+def status_name(status: AppointmentStatus) -> str:
+    return f"status:{AppointmentStatus(status).value}"
+
+def day_name(day: date) -> str:
+    return f"day:{day.isoformat()}"
+
+def appointment_counts(
+    patient_id: Optional[int],
+    doctor_id: Optional[int],
+    status: Optional[AppointmentStatus],
+    appointment_date: Optional[datetime]
+) -> Counter:
+    """The counters one appointment contributes to; a change is new counts minus old."""
+    counts: Counter = Counter()
+    scopes = [GLOBAL_SCOPE]
+    if doctor_id is not None:
+        scopes.append(doctor_scope(doctor_id))
+    if patient_id is not None:
+        scopes.append(patient_scope(patient_id))
+    status = status or AppointmentStatus.PENDING
+    for scope in scopes:
+        counts[(scope, status_name(status))] += 1
+        # Cancelled and expired bookings no longer take up the day
+        if appointment_date is not None and status not in RELEASED_STATUSES:
+            counts[(scope, day_name(appointment_date.date()))] += 1
+    return counts
+
+def apply_deltas(connection: Connection, deltas: Dict[Key, int]) -> None:
+    # Sorted so concurrent writers take the row locks in the same order
+    upsert_counts(connection, StatCounter, ["scope", "name"], ["value"], (
+        {"scope": scope, "name": name, "value": delta}
+        for (scope, name), delta in sorted(deltas.items()) if delta
+    ))
+
+_APPOINTMENT_FIELDS = ("patient_id", "doctor_id", "status", "appointment_date")
+
+def _count_appointment(mapper, connection, target) -> None:
+    apply_deltas(connection, appointment_counts(*(getattr(target, field) for field in _APPOINTMENT_FIELDS)))
+
+def _recount_appointment(mapper, connection, target) -> None:
+    before, after = before_and_after(target, _APPOINTMENT_FIELDS)
+    if before != after:
+        deltas = appointment_counts(*after)
+        deltas.subtract(appointment_counts(*before))
+        apply_deltas(connection, deltas)
+
+def _uncount_appointment(mapper, connection, target) -> None:
+    deltas: Counter = Counter()
+    deltas.subtract(appointment_counts(*(getattr(target, field) for field in _APPOINTMENT_FIELDS)))
+    apply_deltas(connection, deltas)
+
+def _counter(key: Key, delta: int):
+    def listener(mapper, connection, target) -> None:
+        apply_deltas(connection, {key: delta})
+    return listener
+
+event.listen(Appointment, "after_insert", _count_appointment)
+event.listen(Appointment, "after_update", _recount_appointment)
+event.listen(Appointment, "after_delete", _uncount_appointment)
+event.listen(Doctor, "after_insert", _counter((GLOBAL_SCOPE, DOCTORS), 1))
+event.listen(Doctor, "after_delete", _counter((GLOBAL_SCOPE, DOCTORS), -1))
+event.listen(Patient, "after_insert", _counter((GLOBAL_SCOPE, PATIENTS), 1))
+event.listen(Patient, "after_delete", _counter((GLOBAL_SCOPE, PATIENTS), -1))
+
+async def read_counters(db: AsyncSession, scope: str, today: date) -> Dict[str, int]:
+    """Status counts and today's count for `scope`, plus the global doctor and patient totals."""
+    result = await db.execute(
+        select(StatCounter.name, StatCounter.value).where(or_(
+            (StatCounter.scope == scope) & (StatCounter.name.like("status:%") | (StatCounter.name == day_name(today))),
+            (StatCounter.scope == GLOBAL_SCOPE) & StatCounter.name.in_([DOCTORS, PATIENTS])
+        ))
+    )
+    return dict(result.all())
+
+def _lock_counters(connection: Connection) -> None:
+    # Hold off counter writers, which hold off the writes they count, until the recount commits
+    if connection.dialect.name == "postgresql":
+        connection.execute(text("LOCK TABLE stat_counters IN EXCLUSIVE MODE"))
+    else:
+        # SQLite has one writer; a no-op write takes the lock before anything is read
+        connection.execute(update(StatCounter).where(StatCounter.scope.is_(None)).values(value=0))
+
+def reconcile_counters(connection: Connection, batch_size: int = 10000) -> int:
+    """Recount every counter from the source tables and correct drift; returns rows corrected."""
+    _lock_counters(connection)
+    expected: Counter = Counter()
+    rows = connection.execute(
+        select(*(getattr(Appointment, field) for field in _APPOINTMENT_FIELDS)).execution_options(yield_per=batch_size)
+    )
+    for row in rows:
+        expected.update(appointment_counts(*row))
+    expected[(GLOBAL_SCOPE, DOCTORS)] = connection.scalar(select(func.count()).select_from(Doctor)) or 0
+    expected[(GLOBAL_SCOPE, PATIENTS)] = connection.scalar(select(func.count()).select_from(Patient)) or 0
+
+    actual = {
+        (scope, name): value
+        for scope, name, value in connection.execute(select(StatCounter.scope, StatCounter.name, StatCounter.value))
+    }
+    wrong = [key for key, value in expected.items() if value and actual.get(key) != value]
+    # Counters for things that no longer exist go, rather than sit at zero
+    stale = [key for key in actual if not expected.get(key)]
+    upsert_counts(connection, StatCounter, ["scope", "name"], ["value"], (
+        {"scope": scope, "name": name, "value": expected[(scope, name)]} for scope, name in wrong
+    ), add=False)
+    for scope, name in stale:
+        connection.execute(delete(StatCounter).where(StatCounter.scope == scope, StatCounter.name == name))
+    return len(wrong) + len([key for key in stale if actual[key]])
@@ -0,0 +1,95 @@
+import itertools
+import os
+import tempfile
+
+# Settings are read at import, so point the app at a scratch database first
+_DB_DIR = tempfile.mkdtemp(prefix="hms-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_DB_DIR}/test.db"
+os.environ["PASSWORD_HASH_WORKERS"] = "0"
+os.environ["BCRYPT_ROUNDS"] = "4"
+
+from functools import partial
+from typing import Dict
+import httpx
+import pytest
+from sqlalchemy.orm import Session
+from app.main import app
+from app.database import async_engine, engine
+from app.models.user import User, UserRole
+from app.utils.query_counts import count_queries
+from app.utils.security import get_password_hash
+
+ADMIN_EMAIL = "admin@hospital.com"
+ADMIN_PASSWORD = "admin123"
+PASSWORD = "secret"
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+@pytest.fixture
+async def client():
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as test_client:
+        yield test_client
+    # Pooled aiosqlite connections belong to this test's event loop
+    await async_engine.dispose()
+
+@pytest.fixture
+def query_counter():
+    """Counts the statements the app runs: `with query_counter() as counter: ...`, then `counter.count`."""
+    return partial(count_queries, async_engine)
+
+class Hospital:
+    """Creates accounts through the API and logs in as them."""
+
+    _numbers = itertools.count(1)
+
+    def __init__(self, client: httpx.AsyncClient):
+        self.client = client
+
+    async def login(self, email: str, password: str = PASSWORD) -> Dict[str, str]:
+        response = await self.client.post("/api/auth/login", data={"username": email, "password": password})
+        assert response.status_code == 200, response.text
+        return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    async def admin(self) -> Dict[str, str]:
+        # The app's startup creates this account; tests run without the lifespan
+        with Session(engine) as db:
+            if db.query(User).filter(User.email == ADMIN_EMAIL).first() is None:
+                db.add(User(
+                    email=ADMIN_EMAIL, username="admin", full_name="System Administrator",
+                    hashed_password=get_password_hash(ADMIN_PASSWORD), role=UserRole.ADMIN, is_active=True
+                ))
+                db.commit()
+        return await self.login(ADMIN_EMAIL, ADMIN_PASSWORD)
+
+    async def doctor(self) -> Dict:
+        number = next(self._numbers)
+        response = await self.client.post("/api/doctors/register", headers=await self.admin(), json={
+            "specialization": "Cardiology", "qualification": "MD", "phone": "555-0100",
+            "license_number": f"LIC-{number}",
+            "available_days": '["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]',
+            "available_time_start": "09:00", "available_time_end": "17:00",
+            "user": {
+                "email": f"doctor{number}@example.com", "username": f"doctor{number}",
+                "full_name": f"Doctor {number}", "role": "doctor", "password": PASSWORD,
+            },
+        })
+        assert response.status_code == 201, response.text
+        return response.json()
+
+    async def patient(self) -> Dict:
+        number = next(self._numbers)
+        response = await self.client.post("/api/patients/register", json={
+            "date_of_birth": "1990-01-01", "gender": "female", "phone": "555-0200",
+            "user": {
+                "email": f"patient{number}@example.com", "username": f"patient{number}",
+                "full_name": f"Patient {number}", "role": "patient", "password": PASSWORD,
+            },
+        })
+        assert response.status_code == 201, response.text
+        return response.json()
+
+@pytest.fixture
+def hospital(client) -> Hospital:
+    return Hospital(client)
@@ -0,0 +1,76 @@
+"""A local SMTP server for the notification tests, on the standard library alone.
+
+Recipients containing "bounce" are refused with 550, "flaky" ones with 451;
+everything else is accepted and kept in `received` as (recipients, message).
+"""
+import socketserver
+import threading
+from email import message_from_bytes
+from email.message import Message
+from typing import List, Tuple
+
+class _Session(socketserver.StreamRequestHandler):
+    def reply(self, line: str) -> None:
+        self.wfile.write(line.encode() + b"\r\n")
+
+    def handle(self) -> None:
+        self.reply("220 stub ESMTP")
+        recipients: List[str] = []
+        for raw in self.rfile:
+            command = raw.decode().rstrip("\r\n")
+            verb = command[:4].upper()
+            if verb == "EHLO":
+                self.reply("250-stub")
+                self.reply("250 8BITMIME")
+            elif verb in ("HELO", "NOOP"):
+                self.reply("250 OK")
+            elif verb == "MAIL":
+                recipients = []
+                self.reply("250 OK")
+            elif verb == "RCPT":
+                address = command.partition(":")[2].strip().strip("<>")
+                if "bounce" in address:
+                    self.reply("550 No such user")
+                elif "flaky" in address:
+                    self.reply("451 Try again later")
+                else:
+                    recipients.append(address)
+                    self.reply("250 OK")
+            elif verb == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                lines = []
+                for line in self.rfile:
+                    if line == b".\r\n":
+                        break
+                    lines.append(line[1:] if line.startswith(b"..") else line)
+                self.server.received.append((recipients, message_from_bytes(b"".join(lines))))
+                self.reply("250 OK")
+            elif verb == "RSET":
+                recipients = []
+                self.reply("250 OK")
+            elif verb == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
+
+class SMTPStub(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _Session)
+        self.received: List[Tuple[List[str], Message]] = []
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+
+    @property
+    def port(self) -> int:
+        return self.server_address[1]
+
+    def __enter__(self) -> "SMTPStub":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.shutdown()
+        self.server_close()
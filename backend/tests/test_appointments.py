@@ -0,0 +1,67 @@
+import asyncio
+from datetime import datetime, timedelta
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+def next_weekday_at(hour: int) -> datetime:
+    day = datetime.utcnow().date() + timedelta(days=1)
+    while day.weekday() > 4:
+        day += timedelta(days=1)
+    return datetime.combine(day, datetime.min.time()).replace(hour=hour)
+
+async def test_concurrent_bookings_of_one_slot_admit_exactly_one(client, hospital):
+    doctor = await hospital.doctor()
+    patients = [await hospital.patient() for _ in range(6)]
+    headers = [await hospital.login(patient["user"]["email"]) for patient in patients]
+    slot = next_weekday_at(10).isoformat()
+
+    responses = await asyncio.gather(*(
+        client.post("/api/appointments/", headers=h, json={"doctor_id": doctor["id"], "appointment_date": slot})
+        for h in headers
+    ))
+
+    assert sorted(response.status_code for response in responses) == [201, 409, 409, 409, 409, 409]
+
+async def test_reactivating_a_cancelled_appointment_checks_for_conflicts(client, hospital):
+    doctor = await hospital.doctor()
+    first, second = await hospital.patient(), await hospital.patient()
+    first_headers = await hospital.login(first["user"]["email"])
+    second_headers = await hospital.login(second["user"]["email"])
+    slot = next_weekday_at(11).isoformat()
+    booking = {"doctor_id": doctor["id"], "appointment_date": slot}
+
+    response = await client.post("/api/appointments/", headers=first_headers, json=booking)
+    assert response.status_code == 201
+    appointment_id = response.json()["id"]
+    response = await client.put(f"/api/appointments/{appointment_id}", headers=first_headers, json={"status": "cancelled"})
+    assert response.status_code == 200
+    # The freed slot is taken by someone else
+    assert (await client.post("/api/appointments/", headers=second_headers, json=booking)).status_code == 201
+
+    response = await client.put(f"/api/appointments/{appointment_id}", headers=first_headers, json={"status": "pending"})
+    assert response.status_code == 409
+
+async def test_slots_accept_bounds_with_an_offset(client, hospital):
+    doctor = await hospital.doctor()
+    start = next_weekday_at(0)
+    response = await client.get(f"/api/doctors/{doctor['id']}/slots", params={
+        "from": start.isoformat() + "Z", "to": (start + timedelta(days=1)).isoformat() + "+00:00",
+    })
+    assert response.status_code == 200
+    assert response.json()[0]["start"] == start.replace(hour=9).isoformat()
+
+async def test_booking_with_an_offset_is_stored_as_utc(client, hospital):
+    doctor, patient = await hospital.doctor(), await hospital.patient()
+    headers = await hospital.login(patient["user"]["email"])
+    slot = next_weekday_at(14)
+    response = await client.post("/api/appointments/", headers=headers, json={
+        "doctor_id": doctor["id"], "appointment_date": slot.replace(hour=16).isoformat() + "+02:00",
+    })
+    assert response.status_code == 201
+    assert response.json()["appointment_date"] == slot.isoformat()
+    response = await client.put(f"/api/appointments/{response.json()['id']}", headers=headers, json={
+        "appointment_date": slot.replace(hour=10).isoformat() + "-05:00",
+    })
+    assert response.status_code == 200
+    assert response.json()["appointment_date"] == slot.replace(hour=15).isoformat()
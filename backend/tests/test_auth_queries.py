@@ -0,0 +1,30 @@
+import pytest
+from app.utils.principal_cache import principal_cache
+from .test_appointments import next_weekday_at
+
+pytestmark = pytest.mark.anyio
+
+async def test_statements_per_authenticated_request(client, hospital, query_counter):
+    doctor, patient = await hospital.doctor(), await hospital.patient()
+    headers = await hospital.login(patient["user"]["email"])
+    response = await client.post("/api/appointments/", headers=headers, json={
+        "doctor_id": doctor["id"], "appointment_date": next_weekday_at(13).isoformat(),
+    })
+    assert response.status_code == 201
+    requests = {
+        "/api/auth/me": 0,
+        "/api/patients/me": 0,
+        f"/api/appointments/{response.json()['id']}": 1,
+    }
+
+    async def count(path: str) -> int:
+        with query_counter() as counter:
+            assert (await client.get(path, headers=headers)).status_code == 200
+        return counter.count
+
+    for path, endpoint_queries in requests.items():
+        principal_cache.clear()
+        # The user and their patient and doctor profiles come back in one joined query...
+        assert await count(path) == 1 + endpoint_queries, path
+        # ...and from the principal cache after that
+        assert await count(path) == endpoint_queries, path
@@ -0,0 +1,55 @@
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+DIRECTORY = "/api/doctors/"
+PAGE = {"limit": 1000}
+
+async def test_unchanged_directory_page_revalidates_with_304(client, hospital):
+    await hospital.doctor()
+    first = await client.get(DIRECTORY, params=PAGE)
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+
+    again = await client.get(DIRECTORY, params=PAGE, headers={"If-None-Match": etag})
+
+    assert again.status_code == 304
+    assert again.content == b""
+    assert again.headers["ETag"] == etag
+    # A different validator gets the full page
+    assert (await client.get(DIRECTORY, params=PAGE, headers={"If-None-Match": '"stale"'})).status_code == 200
+
+async def test_registration_and_update_replace_cached_pages(client, hospital):
+    etag = (await client.get(DIRECTORY, params=PAGE)).headers["ETag"]
+
+    doctor = await hospital.doctor()
+    response = await client.get(DIRECTORY, params=PAGE, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert doctor["id"] in [entry["id"] for entry in response.json()]
+    etag = response.headers["ETag"]
+
+    response = await client.put(
+        f"/api/doctors/{doctor['id']}", headers=await hospital.admin(), json={"about": "Sees walk-ins on Fridays"}
+    )
+    assert response.status_code == 200
+    response = await client.get(DIRECTORY, params=PAGE, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    listed, = [entry for entry in response.json() if entry["id"] == doctor["id"]]
+    assert listed["about"] == "Sees walk-ins on Fridays"
+
+async def test_specialization_filter_matches_anywhere_in_the_name(client, hospital):
+    doctor = await hospital.doctor()
+
+    async def listed(text: str) -> bool:
+        response = await client.get(DIRECTORY, params={**PAGE, "specialization": text})
+        assert response.status_code == 200
+        return doctor["id"] in [entry["id"] for entry in response.json()]
+
+    # The doctor is a "Cardiology" specialist
+    assert await listed("cardio")
+    assert await listed("ology")
+    assert await listed("  DIOLOG ")
+    assert not await listed("neuro")
+    # Wildcards are plain characters
+    assert not await listed("%")
+    assert not await listed("c_rdio")
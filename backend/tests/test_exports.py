@@ -0,0 +1,27 @@
+from datetime import datetime, timedelta
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+async def test_export_range_with_an_offset_is_compared_as_utc(client, hospital):
+    doctor, patient = await hospital.doctor(), await hospital.patient()
+    headers = await hospital.login(patient["user"]["email"])
+    slot = (datetime.utcnow() + timedelta(days=2)).replace(hour=12, minute=0, second=0, microsecond=0)
+    response = await client.post("/api/appointments/", headers=headers, json={
+        "doctor_id": doctor["id"], "appointment_date": slot.isoformat(),
+    })
+    assert response.status_code == 201
+    number = response.json()["appointment_number"]
+
+    async def exported(date_from: str, date_to: str) -> str:
+        response = await client.get("/api/appointments/export", headers=headers, params={
+            "format": "ndjson", "date_from": date_from, "date_to": date_to,
+        })
+        assert response.status_code == 200
+        return response.text
+
+    # 13:00+02:00 is 11:00 UTC, before the 12:00 appointment; 13:00-02:00 is 15:00 UTC, after it
+    assert number in await exported(slot.replace(hour=13).isoformat() + "+02:00", slot.replace(hour=14).isoformat() + "+01:00")
+    assert number not in await exported(slot.replace(hour=13).isoformat() + "-02:00", (slot + timedelta(days=1)).isoformat() + "Z")
+    # A naive bound with an aware one
+    assert number in await exported(slot.replace(hour=11).isoformat(), slot.replace(hour=14).isoformat() + "+01:00")
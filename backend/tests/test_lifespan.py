@@ -0,0 +1,24 @@
+import os
+import subprocess
+import sys
+import textwrap
+from pathlib import Path
+
+BACKEND = Path(__file__).resolve().parent.parent
+
+SERVE_AND_EXIT = textwrap.dedent("""
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    if __name__ == "__main__":
+        with TestClient(app) as client:
+            assert client.get("/api/doctors/").status_code == 200
+""")
+
+def test_process_exits_after_shutdown(tmp_path):
+    # Runs in a fresh interpreter: a leftover pooled connection shows up as a hang at exit
+    env = dict(os.environ, PYTHONPATH=str(BACKEND), DATABASE_URL=f"sqlite:///{tmp_path}/lifespan.db")
+    script = tmp_path / "serve_and_exit.py"
+    script.write_text(SERVE_AND_EXIT)
+    result = subprocess.run([sys.executable, str(script)], cwd=BACKEND, env=env, timeout=30, capture_output=True)
+    assert result.returncode == 0, result.stderr.decode()
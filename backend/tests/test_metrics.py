@@ -0,0 +1,20 @@
+import pytest
+from app.config import settings
+
+pytestmark = pytest.mark.anyio
+
+async def test_metrics_need_the_static_token(client, hospital, monkeypatch):
+    monkeypatch.setattr(settings, "METRICS_TOKEN", "scrape-secret")
+
+    assert (await client.get("/metrics")).status_code == 401
+    assert (await client.get("/metrics", headers={"Authorization": "Bearer wrong"})).status_code == 401
+    # A user's login is no substitute, even an admin's
+    assert (await client.get("/metrics", headers=await hospital.admin())).status_code == 401
+    response = await client.get("/metrics", headers={"Authorization": "Bearer scrape-secret"})
+    assert response.status_code == 200
+    assert "text/plain" in response.headers["content-type"]
+
+async def test_metrics_are_not_served_without_a_token(client, monkeypatch):
+    monkeypatch.setattr(settings, "METRICS_TOKEN", None)
+
+    assert (await client.get("/metrics", headers={"Authorization": "Bearer "})).status_code == 404
@@ -0,0 +1,128 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import delete, insert, select
+from app.config import settings
+from app.database import engine
+from app.models.notification import Notification, NotificationStatus
+from app.utils.notifications import BOOKED, NotificationWorker, SMTPPool, claim_batch, outbox_rows, settle
+from .smtp_stub import SMTPStub
+
+LEASE = 60.0
+
+@pytest.fixture
+def outbox():
+    """Queues messages straight into an emptied outbox; returns their ids."""
+    def queue(*recipients: str, now: datetime):
+        with engine.begin() as connection:
+            rows = [
+                row for recipient in recipients
+                for row in outbox_rows(BOOKED, None, "APT-000001", now, (recipient, "A Patient"), None, now)
+            ]
+            return connection.scalars(insert(Notification).returning(Notification.id), rows).all()
+
+    with engine.begin() as connection:
+        connection.execute(delete(Notification))
+    yield queue
+    with engine.begin() as connection:
+        connection.execute(delete(Notification))
+
+@pytest.fixture
+def smtp():
+    with SMTPStub() as stub:
+        yield stub
+
+def _pool(stub: SMTPStub) -> SMTPPool:
+    return SMTPPool("127.0.0.1", stub.port, timeout=5.0)
+
+def _claim(now: datetime, limit: int = 50):
+    with engine.begin() as connection:
+        return claim_batch(connection, limit, LEASE, now)
+
+def _row(notification_id: int):
+    with engine.connect() as connection:
+        return connection.execute(select(Notification).where(Notification.id == notification_id)).one()
+
+def test_concurrent_claims_never_share_a_message(outbox):
+    now = datetime.utcnow()
+    ids = outbox(*(f"patient{number}@example.com" for number in range(40)), now=now)
+    start = threading.Barrier(4)
+
+    def claim(_):
+        start.wait()
+        return [message.id for message in _claim(now, limit=15)]
+
+    with ThreadPoolExecutor(4) as pool:
+        batches = list(pool.map(claim, range(4)))
+
+    claimed = [notification_id for batch in batches for notification_id in batch]
+    assert len(claimed) == len(set(claimed)) == len(ids)
+    # A claimed message is leased, not handed out again until the lease ends
+    assert _claim(now + timedelta(seconds=LEASE / 2)) == []
+
+def test_transient_failure_is_retried_with_backoff(outbox, smtp):
+    now = datetime.utcnow()
+    notification_id, = outbox("flaky@example.com", now=now)
+
+    batch = _claim(now)
+    outcomes = _pool(smtp).send_all(batch)
+    with engine.begin() as connection:
+        settle(connection, outcomes, max_attempts=3, now=now)
+
+    row = _row(notification_id)
+    assert row.status == NotificationStatus.PENDING and row.attempts == 1
+    assert "451" in row.last_error
+    # First retry: the base delay, jittered down by at most half
+    delay = (row.next_attempt_at - now).total_seconds()
+    assert settings.NOTIFICATION_BACKOFF_SECONDS / 2 <= delay <= settings.NOTIFICATION_BACKOFF_SECONDS
+    assert _claim(now + timedelta(seconds=delay / 2)) == []
+    assert [message.id for message in _claim(now + timedelta(seconds=delay))] == [notification_id]
+
+def test_failure_is_permanent_after_the_last_attempt(outbox, smtp):
+    now = datetime.utcnow()
+    flaky, bounced = outbox("flaky@example.com", "bounce@example.com", now=now)
+    pool = _pool(smtp)
+
+    for attempt in range(1, 4):
+        batch = _claim(now)
+        assert [message.attempts for message in batch if message.id == flaky] == [attempt]
+        with engine.begin() as connection:
+            settle(connection, pool.send_all(batch), max_attempts=3, now=now)
+        now += timedelta(seconds=settings.NOTIFICATION_BACKOFF_MAX_SECONDS)
+
+    assert (_row(flaky).status, _row(flaky).attempts) == (NotificationStatus.FAILED, 3)
+    # A 5xx reply is final on the first attempt
+    assert (_row(bounced).status, _row(bounced).attempts) == (NotificationStatus.FAILED, 1)
+    assert _claim(now) == []
+    assert smtp.received == []
+
+def test_messages_of_a_dead_worker_come_back_after_the_lease(outbox, smtp):
+    now = datetime.utcnow()
+    notification_id, = outbox("patient@example.com", now=now)
+    # Claimed, then the worker died before sending or settling
+    assert [message.id for message in _claim(now)] == [notification_id]
+
+    assert _claim(now + timedelta(seconds=LEASE - 1)) == []
+    later = now + timedelta(seconds=LEASE)
+    batch = _claim(later)
+    assert [(message.id, message.attempts) for message in batch] == [(notification_id, 2)]
+    with engine.begin() as connection:
+        settle(connection, _pool(smtp).send_all(batch), max_attempts=3, now=later)
+
+    assert _row(notification_id).status == NotificationStatus.SENT
+    recipients, message = smtp.received[0]
+    assert recipients == ["patient@example.com"]
+    assert message["Subject"] == "Appointment APT-000001 requested"
+
+def test_drain_sends_everything_due(outbox, smtp):
+    ids = outbox("one@example.com", "two@example.com", "bounce@example.com", now=datetime.utcnow())
+    worker = NotificationWorker(pool_factory=lambda: _pool(smtp))
+
+    stats = worker.drain(engine)
+
+    assert (stats.sent, stats.failed, stats.depth) == (2, 1, 0)
+    assert sorted(recipients[0] for recipients, _ in smtp.received) == ["one@example.com", "two@example.com"]
+    assert [_row(notification_id).status for notification_id in ids] == [
+        NotificationStatus.SENT, NotificationStatus.SENT, NotificationStatus.FAILED
+    ]
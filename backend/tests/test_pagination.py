@@ -0,0 +1,35 @@
+from datetime import datetime, timezone
+import pytest
+from app.utils.pagination import encode_cursor
+
+pytestmark = pytest.mark.anyio
+
+FORGED = {
+    "/api/doctors/": [["x"], [True], [1.5], [{"dt": "2030-01-01T00:00:00"}], [1, 2]],
+    "/api/patients/": [["x"], [None], [[1]]],
+    "/api/appointments/": [
+        ["x", 1],
+        [{"dt": "2030-01-01T00:00:00"}, "1"],
+        [1, 1],
+        [{"dt": 5}, 1],
+        [{"dt": "2030-01-01T00:00:00", "x": 1}, 1],
+        [{"dt": datetime(2030, 1, 1, tzinfo=timezone.utc).isoformat()}, 1],
+    ],
+}
+
+async def test_forged_cursor_values_are_rejected(client, hospital):
+    headers = await hospital.admin()
+    for path, cursors in FORGED.items():
+        for values in cursors:
+            response = await client.get(path, headers=headers, params={"cursor": encode_cursor(values)})
+            assert (response.status_code, response.json()["detail"]) == (400, "Invalid cursor"), (path, values)
+
+async def test_cursors_the_api_hands_out_are_accepted(client, hospital):
+    headers = await hospital.admin()
+    for path, values in (
+        ("/api/doctors/", [1]),
+        ("/api/patients/", [1]),
+        ("/api/appointments/", [datetime(2030, 1, 1, 9, 30), 1]),
+    ):
+        response = await client.get(path, headers=headers, params={"cursor": encode_cursor(values)})
+        assert response.status_code == 200, (path, response.text)
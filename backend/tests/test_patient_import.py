@@ -0,0 +1,31 @@
+import json
+import pytest
+from passlib.hash import bcrypt
+from sqlalchemy import select
+from app.database import engine
+from app.models.user import User
+from app.utils.passwords import password_hasher
+from .conftest import PASSWORD
+
+pytestmark = pytest.mark.anyio
+
+async def test_imported_passwords_get_the_full_bcrypt_cost(client, hospital, monkeypatch):
+    # One above the suite's minimal cost, so a cheaper import hash would show
+    monkeypatch.setattr(password_hasher, "rounds", password_hasher.rounds + 1)
+    emails = [f"imported{number}@example.com" for number in range(3)]
+    body = "\n".join(json.dumps({
+        "date_of_birth": "1985-06-15", "gender": "male", "phone": "555-0300",
+        "email": email, "username": email.split("@")[0], "full_name": "Imported Patient", "password": PASSWORD,
+    }) for email in emails)
+
+    response = await client.post(
+        "/api/patients/import", headers={**await hospital.admin(), "Content-Type": "application/x-ndjson"}, content=body
+    )
+
+    assert response.status_code == 200, response.text
+    assert response.json()["imported"] == len(emails)
+    with engine.connect() as connection:
+        hashes = connection.scalars(select(User.hashed_password).where(User.email.in_(emails))).all()
+    # Same cost as every other account, so nothing is left to upgrade at login
+    assert [bcrypt.from_string(hashed).rounds for hashed in hashes] == [password_hasher.rounds] * len(emails)
+    await hospital.login(emails[0])
@@ -0,0 +1,31 @@
+import pytest
+from app.utils.query_counts import check_query_counts
+from .test_appointments import next_weekday_at
+
+@pytest.mark.anyio
+async def test_appointment_pages_cost_the_same_statements_whatever_their_size(client, hospital, query_counter):
+    doctor, patient = await hospital.doctor(), await hospital.patient()
+    headers = await hospital.login(patient["user"]["email"])
+    for hour in range(9, 15):
+        response = await client.post("/api/appointments/", headers=headers, json={
+            "doctor_id": doctor["id"], "appointment_date": next_weekday_at(hour).isoformat(),
+        })
+        assert response.status_code == 201
+    # Loads the principal into the cache, so the pages below differ only in their size
+    assert (await client.get("/api/appointments/", headers=headers)).status_code == 200
+
+    counts = {}
+    for limit in (1, 6):
+        for expand in (None, "doctor,patient"):
+            params = {"limit": limit, **({"expand": expand} if expand else {})}
+            with query_counter() as counter:
+                response = await client.get("/api/appointments/", headers=headers, params=params)
+            assert len(response.json()) == limit
+            counts[limit, expand] = counter.count
+
+    assert counts[1, None] == counts[6, None]
+    assert counts[1, "doctor,patient"] == counts[6, "doctor,patient"]
+
+def test_check_query_counts_reports_no_growth():
+    results = check_query_counts((1, 10))
+    assert [result.endpoint for result in results if not result.ok] == []
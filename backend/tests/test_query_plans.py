@@ -0,0 +1,19 @@
+from app.database import engine
+from app.utils.query_plans import check_query_plans
+
+HOT_PATHS = (
+    "auth: principal by email",
+    "patients: list cursor",
+    "doctors: list cursor",
+    "appointments: patient list",
+    "appointments: doctor list cursor",
+    "appointments: admin list cursor",
+    "scheduling: conflict check",
+)
+
+def test_endpoint_queries_use_indexes():
+    # Builds every shape too, so a changed query builder signature fails here
+    results = {result.shape.name: result for result in check_query_plans(engine)}
+    assert [(name, result.scanned_tables) for name, result in results.items() if not result.ok] == []
+    # No allowance on these: each request runs one
+    assert {name: results[name].scanned_tables for name in HOT_PATHS} == {name: [] for name in HOT_PATHS}
@@ -0,0 +1,32 @@
+import pytest
+from passlib.hash import bcrypt
+from sqlalchemy import select, update
+from app.config import settings
+from app.database import engine
+from app.models.user import User
+from app.utils.principal_cache import principal_cache
+from .conftest import PASSWORD
+
+pytestmark = pytest.mark.anyio
+
+async def test_rehash_on_login_keeps_existing_tokens(client, hospital):
+    patient = await hospital.patient()
+    email = patient["user"]["email"]
+    headers = await hospital.login(email)
+    # A hash from before a cost change; written with Core so nothing is revoked here either
+    outdated = bcrypt.using(rounds=settings.BCRYPT_ROUNDS + 1).hash(PASSWORD)
+    with engine.begin() as connection:
+        version = connection.scalar(select(User.token_version).where(User.email == email))
+        connection.execute(update(User).where(User.email == email).values(hashed_password=outdated))
+    principal_cache.clear()
+
+    await hospital.login(email)
+
+    with engine.connect() as connection:
+        stored, stored_version = connection.execute(
+            select(User.hashed_password, User.token_version).where(User.email == email)
+        ).one()
+    assert stored != outdated and bcrypt.verify(PASSWORD, stored)
+    assert stored_version == version
+    principal_cache.clear()
+    assert (await client.get("/api/auth/me", headers=headers)).status_code == 200
@@ -0,0 +1,38 @@
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import update
+from app.database import engine
+from app.models.appointment import Appointment
+from app.utils.appointment_scheduler import appointment_scheduler
+from .test_appointments import next_weekday_at
+
+pytestmark = pytest.mark.anyio
+
+async def test_unconfirmed_appointments_expire_within_the_lookback(client, hospital):
+    doctor, patient = await hospital.doctor(), await hospital.patient()
+    headers = await hospital.login(patient["user"]["email"])
+    ids = []
+    for hour in (9, 10):
+        response = await client.post("/api/appointments/", headers=headers, json={
+            "doctor_id": doctor["id"], "appointment_date": next_weekday_at(hour).isoformat(),
+        })
+        assert response.status_code == 201
+        ids.append(response.json()["id"])
+    recent, old = ids
+    now = datetime.utcnow()
+    # Bookings are always made ahead; age them as if nobody confirmed them in time
+    with engine.begin() as connection:
+        for appointment_id, age in ((recent, timedelta(days=2)), (old, timedelta(days=30))):
+            connection.execute(
+                update(Appointment).where(Appointment.id == appointment_id).values(appointment_date=now - age)
+            )
+
+    report = appointment_scheduler.run_once(engine, now=now)
+
+    assert report.expired == 1
+    statuses = [
+        (await client.get(f"/api/appointments/{appointment_id}", headers=headers)).json()["status"]
+        for appointment_id in ids
+    ]
+    # Past SCHEDULER_LOOKBACK_DAYS the old one is left alone
+    assert statuses == ["expired", "pending"]
@@ -0,0 +1,62 @@
+import asyncio
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
+import pytest
+from app.database import SYNC_DATABASE_URL, create_db_engine
+from app.models.appointment import Appointment
+from app.utils.sequences import IdSequence, appointment_numbers
+from .test_appointments import next_weekday_at
+
+WORKERS = 4
+THREADS = 16
+IDS_PER_THREAD = 250
+
+@pytest.fixture
+def bind():
+    # One connection per thread, so the threads really contend for the SQLite write lock
+    reservation_engine = create_db_engine(SYNC_DATABASE_URL, pool_size=THREADS, max_overflow=0)
+    yield reservation_engine
+    reservation_engine.dispose()
+
+def test_parallel_allocations_never_repeat_an_id(bind):
+    assert bind.dialect.name == "sqlite" and not bind.dialect.supports_sequences
+    # Several instances stand in for worker processes, each with its own blocks;
+    # a small block makes them go back to the id_counters row hundreds of times
+    workers = [IdSequence("test_sequence", Appointment.appointment_number, "TST", 6, block_size=7) for _ in range(WORKERS)]
+
+    def allocate(thread: int):
+        sequence = workers[thread % WORKERS]
+        if thread % 5 == 0:
+            # Bulk reservations come out of the same counter
+            return sequence.reserve_ids(IDS_PER_THREAD, bind)
+        return [sequence.next_id(bind) for _ in range(IDS_PER_THREAD)]
+
+    with ThreadPoolExecutor(THREADS) as pool:
+        ids = list(chain.from_iterable(pool.map(allocate, range(THREADS))))
+
+    assert len(ids) == THREADS * IDS_PER_THREAD
+    assert len(set(ids)) == len(ids)
+
+@pytest.mark.anyio
+async def test_concurrent_bookings_get_unique_numbers_and_one_per_slot(client, hospital, monkeypatch):
+    # Small blocks, so the bookings also race for new id_counters reservations
+    monkeypatch.setattr(appointment_numbers, "block_size", 3)
+    doctors = [await hospital.doctor() for _ in range(3)]
+    patients = [await hospital.patient() for _ in range(4)]
+    headers = [await hospital.login(patient["user"]["email"]) for patient in patients]
+    slots = [next_weekday_at(hour).isoformat() for hour in range(9, 15)]
+    # Every patient asks for every doctor's every slot, all at once
+    attempts = [(doctor["id"], slot, h) for doctor in doctors for slot in slots for h in headers]
+
+    responses = await asyncio.gather(*(
+        client.post("/api/appointments/", headers=h, json={"doctor_id": doctor_id, "appointment_date": slot})
+        for doctor_id, slot, h in attempts
+    ))
+
+    assert {response.status_code for response in responses} <= {201, 409}
+    booked = [response.json() for response in responses if response.status_code == 201]
+    per_slot = Counter((booking["doctor_id"], booking["appointment_date"]) for booking in booked)
+    assert len(per_slot) == len(doctors) * len(slots) and set(per_slot.values()) == {1}
+    numbers = [booking["appointment_number"] for booking in booked]
+    assert len(set(numbers)) == len(numbers)
@@ -0,0 +1,74 @@
+import json
+from datetime import timedelta
+import pytest
+from sqlalchemy import func, select
+from app.database import engine
+from app.models.appointment import Appointment, AppointmentStatus
+from app.models.doctor import Doctor
+from app.models.patient import Patient
+from .conftest import PASSWORD
+from .test_appointments import next_weekday_at
+
+pytestmark = pytest.mark.anyio
+
+def _count(model, *where) -> int:
+    with engine.connect() as connection:
+        return connection.scalar(select(func.count()).select_from(model).where(*where))
+
+def _status_counts(*where):
+    return {status.value: _count(Appointment, Appointment.status == status, *where) for status in AppointmentStatus}
+
+async def test_dashboard_counts_match_the_tables(client, hospital):
+    admin = await hospital.admin()
+    doctor = await hospital.doctor()
+    doctor_headers = await hospital.login(doctor["user"]["email"])
+    patient = await hospital.patient()
+    patient_headers = await hospital.login(patient["user"]["email"])
+    # Imported patients are counted by the importer's bulk path, not the mapper events
+    body = "\n".join(json.dumps({
+        "date_of_birth": "1970-02-03", "gender": "female", "phone": "555-0400", "email": f"counted{number}@example.com",
+        "username": f"counted{number}", "full_name": "Counted Patient", "password": PASSWORD,
+    }) for number in range(2))
+    response = await client.post(
+        "/api/patients/import", headers={**admin, "Content-Type": "application/x-ndjson"}, content=body
+    )
+    assert response.json()["imported"] == 2
+
+    day = next_weekday_at(9)
+    ids = []
+    for hour in range(9, 14):
+        response = await client.post("/api/appointments/", headers=patient_headers, json={
+            "doctor_id": doctor["id"], "appointment_date": day.replace(hour=hour).isoformat(),
+        })
+        assert response.status_code == 201
+        ids.append(response.json()["id"])
+    changes = [
+        (doctor_headers, ids[0], {"status": "confirmed"}),
+        (doctor_headers, ids[1], {"status": "completed"}),
+        (patient_headers, ids[2], {"status": "cancelled"}),
+        # Rescheduled to the next day: moves between day counters and daily rollups
+        (patient_headers, ids[3], {"appointment_date": (day + timedelta(days=1)).replace(hour=15).isoformat()}),
+    ]
+    for headers, appointment_id, update in changes:
+        response = await client.put(f"/api/appointments/{appointment_id}", headers=headers, json=update)
+        assert response.status_code == 200, response.text
+    assert (await client.delete(f"/api/appointments/{ids[4]}", headers=patient_headers)).status_code == 200
+
+    summary = (await client.get("/api/stats/summary", headers=admin)).json()
+    assert summary["appointments_by_status"] == _status_counts()
+    assert summary["appointments_total"] == _count(Appointment)
+    assert (summary["doctors"], summary["patients"]) == (_count(Doctor), _count(Patient))
+
+    for headers, column, owner in ((doctor_headers, Appointment.doctor_id, doctor), (patient_headers, Appointment.patient_id, patient)):
+        summary = (await client.get("/api/stats/summary", headers=headers)).json()
+        assert summary["appointments_by_status"] == _status_counts(column == owner["id"])
+
+    response = await client.get("/api/analytics/doctors", headers=admin, params={
+        "doctor_id": doctor["id"], "date_from": day.date().isoformat(),
+        "date_to": (day.date() + timedelta(days=3)).isoformat(),
+    })
+    report, = response.json()
+    assert {status.value: report[status.value] for status in AppointmentStatus} == _status_counts(
+        Appointment.doctor_id == doctor["id"]
+    )
+    assert report["booked"] == 3
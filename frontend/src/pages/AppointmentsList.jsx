@@ -1,6 +1,7 @@
 import { useEffect, useState } from "react";
 import {
   getAppointments,
+  getAppointment,
   updateAppointment,
   deleteAppointment,
 } from "../services/api";
@@ -45,7 +46,8 @@ export default function AppointmentsList() {
 
   const loadAppointments = async () => {
     try {
-      const data = await getAppointments();
+      // Doctor and patient come embedded, in one query each for the whole list
+      const data = await getAppointments(null, null, "doctor,patient");
       setAppointments(data);
       setFilteredAppointments(data);
     } catch (error) {
@@ -87,6 +89,7 @@ export default function AppointmentsList() {
       completed: "bg-green-100 text-green-800 border-green-200",
       cancelled: "bg-red-100 text-red-800 border-red-200",
       no_show: "bg-gray-100 text-gray-800 border-gray-200",
+      expired: "bg-orange-100 text-orange-800 border-orange-200",
     };
     return colors[status] || "bg-gray-100 text-gray-800 border-gray-200";
   };
@@ -107,9 +110,16 @@ export default function AppointmentsList() {
     });
   };
 
-  const viewDetails = (appointment) => {
-    setSelectedAppointment(appointment);
-    setShowDetailsModal(true);
+  const viewDetails = async (appointment) => {
+    // The list leaves out notes, diagnosis and prescription; fetch them on demand
+    try {
+      const details = await getAppointment(appointment.id);
+      setSelectedAppointment(details);
+      setShowDetailsModal(true);
+    } catch (error) {
+      alert("Failed to load appointment details");
+      console.error(error);
+    }
   };
 
   return (
@@ -230,6 +240,38 @@ export default function AppointmentsList() {
                           </p>
                         </div>
                       </div>
+                      {user.role !== "doctor" && appointment.doctor && (
+                        <div className="flex items-start">
+                          <Stethoscope className="w-5 h-5 text-gray-400 mr-2 mt-0.5" />
+                          <div>
+                            <p className="text-xs text-gray-500 uppercase tracking-wide">
+                              Doctor
+                            </p>
+                            <p className="text-sm font-medium text-gray-900">
+                              Dr. {appointment.doctor.user.full_name}
+                            </p>
+                            <p className="text-xs text-gray-500">
+                              {appointment.doctor.specialization}
+                            </p>
+                          </div>
+                        </div>
+                      )}
+                      {user.role !== "patient" && appointment.patient && (
+                        <div className="flex items-start">
+                          <User className="w-5 h-5 text-gray-400 mr-2 mt-0.5" />
+                          <div>
+                            <p className="text-xs text-gray-500 uppercase tracking-wide">
+                              Patient
+                            </p>
+                            <p className="text-sm font-medium text-gray-900">
+                              {appointment.patient.user.full_name}
+                            </p>
+                            <p className="text-xs text-gray-500">
+                              {appointment.patient.patient_id}
+                            </p>
+                          </div>
+                        </div>
+                      )}
                     </div>
 
                     {/* Reason */}
@@ -246,9 +288,7 @@ export default function AppointmentsList() {
                     )}
 
                     {/* Doctor's Notes, Diagnosis, Prescription */}
-                    {(appointment.notes ||
-                      appointment.diagnosis ||
-                      appointment.prescription) && (
+                    {appointment.has_clinical_notes && (
                       <button
                         onClick={() => viewDetails(appointment)}
                         className="text-sm text-blue-600 hover:text-blue-700 font-medium"
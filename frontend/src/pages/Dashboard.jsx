@@ -1,7 +1,7 @@
 import { useEffect, useState } from "react";
 import { useAuth } from "../context/AuthContext";
 import { useNavigate } from "react-router-dom";
-import { getAppointments, getDoctors, getPatients } from "../services/api";
+import { getAppointments, getStatsSummary } from "../services/api";
 import {
   Calendar,
   Users,
@@ -28,19 +28,17 @@ export default function Dashboard() {
 
   const loadDashboardData = async () => {
     try {
-      const appointments = await getAppointments();
-      setRecentAppointments(appointments.slice(0, 5));
-      setStats((prev) => ({ ...prev, appointments: appointments.length }));
-
-      if (user.role === "admin") {
-        const doctors = await getDoctors();
-        const patients = await getPatients();
-        setStats((prev) => ({
-          ...prev,
-          doctors: doctors.length,
-          patients: patients.length,
-        }));
-      }
+      // Counts come from the server; only the five most recent rows are fetched
+      const [summary, appointments] = await Promise.all([
+        getStatsSummary(),
+        getAppointments(null, 5),
+      ]);
+      setRecentAppointments(appointments);
+      setStats({
+        appointments: summary.appointments_total,
+        doctors: summary.doctors,
+        patients: summary.patients ?? 0,
+      });
     } catch (error) {
       console.error("Failed to load dashboard data", error);
     } finally {
@@ -59,6 +57,7 @@ export default function Dashboard() {
       confirmed: "bg-blue-100 text-blue-800",
       completed: "bg-green-100 text-green-800",
       cancelled: "bg-red-100 text-red-800",
+      expired: "bg-orange-100 text-orange-800",
     };
     return colors[status] || "bg-gray-100 text-gray-800";
   };
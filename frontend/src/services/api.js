@@ -91,8 +91,10 @@ export const createAppointment = async (appointmentData) => {
   return response.data;
 };
 
-export const getAppointments = async (status = null) => {
+export const getAppointments = async (status = null, limit = null, expand = null) => {
   const params = status ? { status } : {};
+  if (limit) params.limit = limit;
+  if (expand) params.expand = expand;
   const response = await api.get('/appointments/', { params });
   return response.data;
 };
@@ -112,4 +114,10 @@ export const deleteAppointment = async (appointmentId) => {
   return response.data;
 };
 
+// Stats APIs
+export const getStatsSummary = async () => {
+  const response = await api.get('/stats/summary');
+  return response.data;
+};
+
 export default api;
\ No newline at end of file